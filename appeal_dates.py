@@ -0,0 +1,295 @@
+import json
+import os
+import re
+from collections import namedtuple
+from datetime import date, timedelta
+
+# ------------------ SETTINGS -------------------------
+# Optional JSON file with a list of rules in the DEADLINE_RULES format, used instead of the defaults
+DEADLINE_RULES_FILE = os.environ.get("APPEAL_DEADLINE_RULES", "")
+# Characters before a date, on its line, searched for its label ("Date of denial:", "Date of service:")
+LABEL_WINDOW = 48
+
+# Filing deadline rules. Each rule matches on insurer (case-insensitive substring),
+# plan_type and urgency, with "*" matching anything; the most specific matching
+# rule wins. An urgent claim shortens how long the plan has to decide, not how long
+# the member has to file: when a plan-type rule wins, its days stand and the urgent
+# note is added; the urgent rule's days apply only when no plan-type rule matched.
+# days counts calendar days from the notice date. The
+# defaults are conservative: plans often allow longer, but never less, so check the
+# notice. A window the letter states itself ("within 180 days") overrides them.
+DEADLINE_RULES = [
+    {"insurer": "*", "plan_type": "*", "urgency": "*", "days": 30,
+     "note": "Default window; your plan may allow longer - check the notice."},
+    {"insurer": "*", "plan_type": "employer", "urgency": "*", "days": 180,
+     "note": "Employer (ERISA) plans must allow at least 180 days for an internal appeal."},
+    {"insurer": "*", "plan_type": "marketplace", "urgency": "*", "days": 180,
+     "note": "Marketplace (ACA) plans must allow at least 180 days for an internal appeal."},
+    {"insurer": "*", "plan_type": "medicare", "urgency": "*", "days": 65,
+     "note": "Medicare Advantage reconsiderations are due within 65 days of the notice."},
+    {"insurer": "*", "plan_type": "*", "urgency": "urgent", "days": 30,
+     "note": "Ask for an expedited (urgent) review; the plan must decide within 72 hours."},
+]
+STATED_WINDOW_NOTE = "Your denial letter gives {days} days to appeal."
+
+DateMention = namedtuple("DateMention", ["date", "text", "label", "start", "score"])
+Deadline = namedtuple("Deadline", ["denial_date", "notice_date", "deadline", "days", "rule"])
+
+# ------------------ SCANNER --------------------------
+_MONTHS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+_MONTH_NAME = (r"(?:jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?"
+               r"|sept?(?:ember)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)")
+
+# Every supported format in one alternation, so the text is scanned once
+DATE_PATTERN = re.compile(
+    r"\b(?:"
+    r"(?P<iso_y>\d{4})-(?P<iso_m>\d{1,2})-(?P<iso_d>\d{1,2})"
+    r"|(?P<num_a>\d{1,2})(?P<sep>[-/.])(?P<num_b>\d{1,2})(?P=sep)(?P<num_y>\d{4}|\d{2})"
+    rf"|(?P<mdy_m>{_MONTH_NAME})\.?[ \t]+(?P<mdy_d>\d{{1,2}})(?:st|nd|rd|th)?,?[ \t]+(?P<mdy_y>\d{{4}})"
+    rf"|(?P<dmy_d>\d{{1,2}})(?:st|nd|rd|th)?[ \t]+(?:of[ \t]+)?(?P<dmy_m>{_MONTH_NAME})\.?,?[ \t]+(?P<dmy_y>\d{{4}})"
+    r")\b",
+    re.IGNORECASE,
+)
+
+# Label weights: positive for the notice date, negative for dates that are not it
+LABELS = [
+    ("notice", 3.0, r"(?:date[ \t]+of[ \t]+(?:denial|notice|determination|decision|letter)"
+                    r"|(?:denial|notice|determination|decision|letter)[ \t]+date|date[ \t]+issued|issued(?:[ \t]+on)?)"),
+    ("dated", 1.5, r"dated?[ \t]*:?[ \t]*$"),
+    ("service", -3.0, r"(?:date[ \t]*of[ \t]*service|service[ \t]+date|dos|rendered|performed|admission|admitted|discharge)"),
+    ("birth", -4.0, r"(?:birth|dob|born)"),
+    ("received", -1.5, r"(?:received|submitted|postmarked)"),
+    ("deadline", -2.0, r"(?:by|before|within|no[ \t]+later[ \t]+than|until|deadline|expires?)"),
+]
+_LABEL_PATTERN = re.compile(
+    r"\b(?:" + "|".join(f"(?P<{name}>{pattern})" for name, _, pattern in LABELS) + r")(?![a-z])",
+    re.IGNORECASE,
+)
+_LABEL_WEIGHTS = {name: weight for name, weight, _ in LABELS}
+
+PLAN_TYPE_PATTERN = re.compile(
+    r"\b(?:(?P<medicare>medicare(?:[ \t]+advantage)?|part[ \t]+[cd]\b)"
+    r"|(?P<medicaid>medicaid|medi-cal|chip)"
+    r"|(?P<employer>erisa|employer[- ]sponsored|group[ \t]+health[ \t]+plan|employee[ \t]+benefit)"
+    r"|(?P<marketplace>marketplace|affordable[ \t]+care[ \t]+act|healthcare\.gov)"
+    # An expedited determination ("expedited review decision", "urgent pre-service claim"),
+    # not the bare words, which every appeal-rights paragraph uses
+    r"|(?P<urgent>(?:expedited|urgent)(?:[ \t]+(?:appeal|review|pre-service|care|coverage)){0,2}"
+    r"[ \t]+(?:decision|determination|claim)s?))",
+    re.IGNORECASE,
+)
+# Words around an urgent mention, in its sentence, that make it a right rather than a fact
+# ("If your claim is an urgent care claim, you may ...", "An urgent care decision will be made ...")
+_CONDITIONAL_BEFORE = re.compile(r"\b(?:if|may|can|could|request|ask|whether|when|right|will|would)\b",
+                                 re.IGNORECASE)
+_CONDITIONAL_AFTER = re.compile(r"^[^.\n]*?\b(?:if|will|would)\b", re.IGNORECASE)
+
+
+_NUMBER_WORDS = {"thirty": 30, "forty five": 45, "sixty": 60, "ninety": 90, "one hundred eighty": 180}
+# "You may appeal within 180 days", "no later than sixty (60) calendar days after ..."
+STATED_WINDOW_PATTERN = re.compile(
+    r"\b(?:within|no\s+later\s+than|up\s+to)\s+"
+    r"(?:(?P<word>thirty|forty[- ]five|sixty|ninety|one\s+hundred(?:\s+and)?\s+eighty)\s*(?:\((?P<paren>\d{1,3})\))?"
+    r"|(?P<digits>\d{1,3}))\s+(?:calendar\s+)?days\b",
+    re.IGNORECASE,
+)
+# A sentence about the appeal the member files, not about when the plan answers it
+_APPEAL_SENTENCE = re.compile(r"\b(?:appeal|reconsideration|review|grievance)", re.IGNORECASE)
+_PLAN_PROMISE = re.compile(r"\bwe\s+(?:will|must|shall)\b|\b(?:respond|notify|resolve)", re.IGNORECASE)
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def _year(text):
+    year = int(text)
+    if len(text) == 2:
+        year += 2000 if year < 70 else 1900
+    return year
+
+
+def _to_date(match):
+    """The date a DATE_PATTERN match denotes, or None if it is not a real date."""
+    groups = match.groupdict()
+    if groups["iso_y"]:
+        year, month, day = int(groups["iso_y"]), int(groups["iso_m"]), int(groups["iso_d"])
+    elif groups["num_a"]:
+        month, day, year = int(groups["num_a"]), int(groups["num_b"]), _year(groups["num_y"])
+        if month > 12 >= day:
+            month, day = day, month  # 25/03/2024: day first
+    elif groups["mdy_m"]:
+        month, day, year = _MONTHS[groups["mdy_m"][:3].lower()], int(groups["mdy_d"]), int(groups["mdy_y"])
+    else:
+        month, day, year = _MONTHS[groups["dmy_m"][:3].lower()], int(groups["dmy_d"]), int(groups["dmy_y"])
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+def parse_date(value):
+    """Parse a single date in any supported format; None if value is not one."""
+    match = DATE_PATTERN.fullmatch((value or "").strip())
+    return _to_date(match) if match else None
+
+
+def _label(text, start):
+    """(label, weight) of the nearest label on the same line before position start."""
+    window_start = max(0, start - LABEL_WINDOW)
+    window_start = text.rfind("\n", window_start, start) + 1 or window_start
+    window = text[window_start:start]
+    best = None
+    for match in _LABEL_PATTERN.finditer(window):
+        best = match  # the last (closest) label wins
+    if best is None:
+        return "", 0.0
+    return best.lastgroup, _LABEL_WEIGHTS[best.lastgroup]
+
+
+def find_dates(text):
+    """
+    Every date in text, in order, as DateMention(date, text, label, start, score).
+    score ranks how likely the date is the notice date: its label ("Date of
+    denial:" up, "Date of service:" down) plus a bonus for sitting near the top of
+    the letter, where the notice date usually is. One regex pass over the text and
+    a bounded look-behind per date, so the cost grows linearly with the text.
+    """
+    text = text or ""
+    header_end = min(len(text), 600)
+    mentions = []
+    for match in DATE_PATTERN.finditer(text):
+        value = _to_date(match)
+        if value is None:
+            continue
+        label, score = _label(text, match.start())
+        if match.start() < header_end:
+            score += 1.0
+        mentions.append(DateMention(value, match.group(0), label, match.start(), score))
+    return mentions
+
+
+def notice_date(text):
+    """The DateMention most likely to be the date the denial was issued, or None."""
+    best = None
+    for mention in find_dates(text):
+        if best is None or mention.score > best.score:
+            best = mention
+    if best is None or best.score < 0:
+        return None
+    return best
+
+
+# ------------------ DEADLINE RULES -------------------
+def load_rules(path=DEADLINE_RULES_FILE):
+    """DEADLINE_RULES, or the rules in the JSON file at path when one is configured."""
+    if not path:
+        return DEADLINE_RULES
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return DEADLINE_RULES
+
+
+def stated_window(text):
+    """Days the letter itself gives to file an appeal ("within 180 days"), or None."""
+    for sentence in _SENTENCE_END.split(text or ""):
+        if not _APPEAL_SENTENCE.search(sentence) or _PLAN_PROMISE.search(sentence):
+            continue
+        match = STATED_WINDOW_PATTERN.search(sentence)
+        if match is None:
+            continue
+        if match.group("digits") or match.group("paren"):
+            return int(match.group("digits") or match.group("paren"))
+        words = match.group("word").lower().replace("-", " ").split()
+        return _NUMBER_WORDS.get(" ".join(w for w in words if w != "and"))
+    return None
+
+
+def detect_plan(text):
+    """
+    (plan_type, urgency) named in text: plan_type is "" when none is mentioned, and
+    urgency is "urgent" only when the letter is itself an expedited determination.
+    """
+    text = text or ""
+    plan_type, urgency = "", "standard"
+    for match in PLAN_TYPE_PATTERN.finditer(text):
+        if match.lastgroup == "urgent":
+            start, end = match.start(), match.end()
+            window_start = max(0, start - LABEL_WINDOW * 2)
+            window_start = max(text.rfind(".", window_start, start), text.rfind("\n", window_start, start)) + 1
+            if (not _CONDITIONAL_BEFORE.search(text, window_start, start)
+                    and not _CONDITIONAL_AFTER.match(text[end:end + LABEL_WINDOW * 2])):
+                urgency = "urgent"
+        elif not plan_type:
+            plan_type = match.lastgroup
+    return plan_type, urgency
+
+
+def match_rule(insurer="", plan_type="", urgency="standard", rules=None):
+    """The most specific rule matching insurer, plan type and urgency."""
+    best, best_specificity = None, -1
+    for rule in rules if rules is not None else load_rules():
+        specificity = 0
+        if rule.get("insurer", "*") != "*":
+            if rule["insurer"].lower() not in (insurer or "").lower():
+                continue
+            specificity += 4
+        if rule.get("plan_type", "*") != "*":
+            if rule["plan_type"] != plan_type:
+                continue
+            specificity += 2
+        if rule.get("urgency", "*") != "*":
+            if rule["urgency"] != urgency:
+                continue
+            specificity += 1
+        if specificity > best_specificity:
+            best, best_specificity = rule, specificity
+    return best
+
+
+def appeal_deadline(denial_text, case_details=None, rules=None):
+    """
+    Work out the notice date and the appeal deadline for a denial letter.
+    The extracted "Denial Date" is used when it parses, else the scanner's best
+    candidate (see notice_date). The window is the one the letter states, if it
+    states one (see stated_window); otherwise the plan type and urgency are read from
+    the letter and matched with the insurer against the rules table (see match_rule),
+    with a matching urgent rule adding its note to the plan's. Returns a Deadline;
+    deadline is None when no notice date could be found.
+    """
+    case_details = case_details or {}
+    extracted = case_details.get("Denial Date", "")
+    notice = parse_date(extracted)
+    denial_date = extracted if notice else ""
+    if notice is None:
+        mention = notice_date(denial_text)
+        if mention is not None:
+            notice, denial_date = mention.date, mention.text
+    insurer = case_details.get("Insurance Company Name", "")
+    plan_type, urgency = detect_plan(denial_text)
+    rules = rules if rules is not None else load_rules()
+    rule = match_rule(insurer, plan_type, urgency, rules)
+    if urgency == "urgent" and rule is not None and rule.get("urgency", "*") == "*":
+        # A plan-type rule outranks the urgent one and keeps its filing window; only the
+        # urgent note is added
+        urgent_rule = match_rule(insurer, plan_type, urgency, [r for r in rules if r.get("urgency") == "urgent"])
+        if urgent_rule is not None:
+            rule = dict(rule, urgency="urgent", note=f"{rule['note']} {urgent_rule['note']}")
+    window = stated_window(denial_text)
+    if window:
+        note = STATED_WINDOW_NOTE.format(days=window)
+        if urgency == "urgent":
+            note += " Ask for an expedited (urgent) review if waiting could harm your health."
+        rule = {"insurer": "*", "plan_type": plan_type or "*", "urgency": urgency, "days": window, "note": note}
+    days = rule["days"] if rule else 30
+    deadline = notice + timedelta(days=days) if notice else None
+    return Deadline(denial_date or None, notice, deadline, days, rule)
+
+
+def format_deadline(deadline):
+    """The deadline as shown to users, or the advice to check the policy."""
+    if deadline.deadline is None:
+        return "Unable to determine deadline - please check your policy"
+    return deadline.deadline.strftime('%B %d, %Y')
@@ -0,0 +1,259 @@
+from appeal_dates import appeal_deadline, format_deadline
+from case_extraction import extract_case_details
+from gemini_client import require_model
+from llm_cache import cached_generate, stream_generate
+from metrics import instrumented
+from near_duplicates import find_prior, grounded_in, quoted_in, remember_results
+from prompt_trimming import trim_text
+from resilience import CircuitOpenError, GeminiUnavailable
+from structured_output import StructuredOutputError, generate_structured
+from task_graph import GraphRun, TaskTimeout, UpstreamFailed, memoize_tasks
+
+# ------------------ AI FUNCTIONS ---------------------
+XAI_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "quoted_reason": {"type": "STRING"},
+        "explanation": {"type": "STRING"},
+        "required_evidence": {"type": "STRING"},
+    },
+    "required": ["quoted_reason", "explanation", "required_evidence"],
+}
+
+@instrumented("claim_summary")
+def get_claim_summary(claim_text):
+    """
+    Summarize the claim/doctor letter. Extract diagnosis, requested treatment, and justification.
+    """
+    model = require_model()
+
+    prompt = (
+        "You are a medical assistant AI. Read the claim letter below and summarize it into 3 parts:\n"
+        "1. Patient diagnosis\n"
+        "2. Requested treatment\n"
+        "3. Justification for the treatment\n\n"
+        f"{trim_text(claim_text, 'clinical_justification')}\n\n"
+        "Summary:"
+    )
+
+    response = cached_generate(model, prompt)
+    return response.text.strip()
+
+def appeal_letter_prompt(denial_reason, claim_summary, patient_info):
+    """
+    Build the appeal-letter prompt shared by draft_appeal_letter and stream_appeal_letter.
+    """
+    return f"""
+    Role: You are a highly skilled, professional Insurance Appeal Specialist and Medical Documentation Expert. Your core objective is to craft exceptionally persuasive and effective appeal letters for denied insurance claims.
+
+    Task: Generate a compelling appeal letter that directly addresses the denial and advocates for claim approval.
+
+    Patient Information:
+    - Name: {patient_info.get('Patient Name', 'Not provided')}
+    - Member ID: {patient_info.get('Member ID', 'Not provided')}
+
+    Denial Reason: {denial_reason}
+    Claim Summary: {claim_summary}
+
+    Key Requirements:
+    1. Clear Intent & Identification: Begin with direct statement of appeal, clearly identifying patient details
+    2. Medical Necessity & Justification: Articulate why treatment is essential for patient's health
+    3. Direct Refutation of Denial: Systematically address and refute the denial reason with specific facts
+    4. Timeliness: Acknowledge appeal timeframe compliance
+    5. Professional Tone: Maintain formal, clinical, and authoritative language
+    6. Supporting Documentation: Reference attached documents that substantiate medical necessity
+    7. Clear Call to Action: Conclude with firm request for reconsideration and approval
+
+    Generate a professional, persuasive appeal letter that follows these guidelines and directly addresses the specific denial reason provided.
+    """
+
+@instrumented("final_letter")
+def draft_appeal_letter(denial_reason, claim_summary, patient_info):
+    """
+    Use Google Generative AI to generate a professional appeal letter.
+    Enhanced with comprehensive prompting for better appeals.
+    """
+    model = require_model()
+    prompt = appeal_letter_prompt(denial_reason, claim_summary, patient_info)
+    response = cached_generate(model, prompt)
+    return response.text.strip()
+
+@instrumented("final_letter")
+def stream_appeal_letter(denial_reason, claim_summary, patient_info):
+    """
+    Same letter as draft_appeal_letter, yielded chunk by chunk as it is generated.
+    Shares its cache entry with draft_appeal_letter.
+    """
+    model = require_model()
+    prompt = appeal_letter_prompt(denial_reason, claim_summary, patient_info)
+    yield from stream_generate(model, prompt)
+
+@instrumented("xai_explanation")
+def generate_xai_explanation(denial_reason, denial_text):
+    """
+    Generate XAI (Explainable AI) explanation for the denial reason.
+    Reuses the explanation of a near-duplicate denial letter with the same reason, but
+    only when its quote occurs in this letter and the rest names nothing this letter
+    does not (see near_duplicates.grounded_in); otherwise Gemini is asked again.
+    The answer is requested in JSON mode with XAI_SCHEMA (see structured_output.py);
+    StructuredOutputError propagates, so the stage gets its fallback and is not memoized.
+    """
+    prior = find_prior(denial_text)
+    xai = prior.get("xai_explanation")
+    if (xai and prior.get("denial_reason") == denial_reason
+            and quoted_in(xai.get("quoted_reason"), denial_text)
+            and grounded_in(xai.get("explanation"), denial_text)
+            and grounded_in(xai.get("required_evidence"), denial_text)):
+        return dict(xai)
+    model = require_model()
+
+    prompt = f"""
+    Analyze the denial reason and provide an XAI explanation:
+
+    Denial Reason: {denial_reason}
+    Denial Text: {trim_text(denial_text, 'denial_rationale')}
+
+    Please provide:
+    1. The exact quote from the denial letter stating the reason
+    2. A clear explanation of what this means for the patient/provider
+    3. Specific evidence or actions needed to overcome this denial
+
+    Format as JSON with keys: "quoted_reason", "explanation", "required_evidence"
+    """
+
+    xai = generate_structured(model, prompt, XAI_SCHEMA)
+    remember_results(denial_text, denial_reason=denial_reason, xai_explanation=xai)
+    return xai
+
+@instrumented("confidence_prediction")
+def predict_confidence_level(denial_reason, claim_summary):
+    """
+    Predict the confidence level for appeal success.
+    """
+    model = require_model()
+
+    prompt = f"""
+    Based on the denial reason and claim summary, predict the likelihood of appeal success:
+
+    Denial Reason: {denial_reason}
+    Claim Summary: {claim_summary}
+
+    Rate the confidence level as High, Medium, or Low and provide a brief explanation.
+    Consider factors like:
+    - Strength of medical evidence
+    - Common success rates for this denial type
+    - Completeness of documentation
+    - Clarity of medical necessity
+
+    Return only: "High", "Medium", or "Low" followed by a brief explanation.
+    """
+
+    response = cached_generate(model, prompt)
+    return response.text.strip()
+
+# ------------------ PIPELINE -------------------------
+def failure_reason(error):
+    """Why a stage failed, in words fit to show the user."""
+    if isinstance(error, TaskTimeout):
+        return "request timed out"
+    if isinstance(error, UpstreamFailed):
+        return "an earlier step failed"
+    if isinstance(error, CircuitOpenError):
+        return "the AI service is paused after repeated failures, please try again shortly"
+    if isinstance(error, GeminiUnavailable):
+        return "the AI service is unavailable"
+    if isinstance(error, StructuredOutputError):
+        return "the AI response could not be read"
+    return f"unexpected error ({type(error).__name__})"
+
+
+# Values a failed stage returns instead (see GraphRun), worded after the error
+STAGE_FALLBACKS = {
+    "claim_summary": lambda e: f"Error extracting claim summary: {failure_reason(e)}",
+    "xai_explanation": lambda e: {"error": f"XAI generation failed: {failure_reason(e)}"},
+    "final_letter": lambda e: f"Error drafting appeal letter: {failure_reason(e)}",
+    "confidence_prediction": lambda e: f"Medium - Unable to assess: {failure_reason(e)}",
+}
+
+
+def appeal_stage_tasks(case_details, denial_text, claim_text, include_letter=True):
+    """
+    Task graph for everything after extraction: XAI alongside the claim summary,
+    then the letter and the confidence prediction alongside each other.
+    Pass include_letter=False when the caller streams the letter itself.
+    """
+    denial_reason = case_details["Denial Reason"]
+    tasks = {
+        "claim_summary": (lambda: get_claim_summary(claim_text), []),
+        "xai_explanation": (lambda: generate_xai_explanation(denial_reason, denial_text), []),
+        "confidence_prediction": (lambda summary: predict_confidence_level(denial_reason, summary),
+                                  ["claim_summary"]),
+    }
+    if include_letter:
+        tasks["final_letter"] = (lambda summary: draft_appeal_letter(denial_reason, summary, case_details),
+                                 ["claim_summary"])
+    return tasks
+
+
+def stage_inputs(case_details, denial_text, claim_text):
+    """
+    The upstream inputs each stage depends on, directly or through the claim summary;
+    a memoized stage is recomputed only when these change.
+    """
+    denial_reason = case_details["Denial Reason"]
+    return {
+        "claim_summary": (claim_text,),
+        "xai_explanation": (denial_reason, denial_text),
+        "confidence_prediction": (denial_reason, claim_text),
+        "final_letter": (denial_reason, claim_text, case_details),
+    }
+
+
+def start_appeal_stages(case_details, denial_text, claim_text, include_letter=True, memo=None):
+    """
+    Start the post-extraction stages in the background and return the GraphRun.
+    With a StageMemo, stages whose inputs are unchanged reuse their last result.
+    """
+    tasks = appeal_stage_tasks(case_details, denial_text, claim_text, include_letter)
+    if memo is not None:
+        tasks = memoize_tasks(tasks, memo, stage_inputs(case_details, denial_text, claim_text))
+    return GraphRun(tasks, fallbacks=STAGE_FALLBACKS)
+
+
+def run_appeal_stages(case_details, denial_text, claim_text, memo=None):
+    """
+    Run the post-extraction stages. Returns (results, errors) keyed by stage name;
+    a failed stage holds its STAGE_FALLBACKS value and its exception in errors.
+    """
+    return start_appeal_stages(case_details, denial_text, claim_text, memo=memo).wait()
+
+
+def process_case(denial_text, claim_text):
+    """
+    Run the whole pipeline (extraction -> classification -> drafting) for one case.
+    Returns a JSON-serializable dict. Letters that fail validation stop after extraction
+    with status "rejected"; otherwise the stage results are included and status is "ok",
+    or "error" (with per-stage messages under "errors") if any stage failed.
+    Raises GeminiUnavailable if the extraction call itself cannot be made, and
+    StructuredOutputError if its answer stays unreadable for a letter the local
+    screen could not judge.
+    """
+    case_details = extract_case_details(denial_text, claim_text)
+    deadline = appeal_deadline(denial_text, case_details)
+    result = {
+        "status": "ok",
+        "case_details": case_details,
+        "denial_date": deadline.denial_date,
+        "appeal_deadline": format_deadline(deadline),
+        "deadline_days": deadline.days,
+        "deadline_note": deadline.rule["note"] if deadline.rule else "",
+    }
+    if not (case_details["Denial Is Genuine"] and case_details["Claim Is Genuine"]):
+        result["status"] = "rejected"
+        return result
+    results, errors = run_appeal_stages(case_details, denial_text, claim_text)
+    result.update(results)
+    if errors:
+        result["status"] = "error"
+        result["errors"] = {stage: str(e) for stage, e in errors.items()}
+    return result
@@ -0,0 +1,374 @@
+import argparse
+import base64
+import binascii
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+# Served by uvicorn with a Starlette app: pip install -r requirements.txt
+import uvicorn
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse, PlainTextResponse, Response
+from starlette.routing import Route
+
+from appeal_pipeline import process_case
+from document_text import extract_text
+from gemini_client import install_reload_signal
+from letter_export import DOCX_MIME, PDF_MIME, export_letter
+from metrics import registry, trace
+
+# ------------------ SETTINGS -------------------------
+SERVICE_DB = os.environ.get("APPEAL_SERVICE_DB", "appeal_jobs.sqlite3")
+SERVICE_WORKERS = int(os.environ.get("APPEAL_SERVICE_WORKERS", "4"))
+# Submissions are refused with 429 once this many jobs are waiting
+SERVICE_QUEUE_SIZE = int(os.environ.get("APPEAL_SERVICE_QUEUE_SIZE", "100"))
+SERVICE_MAX_BODY_MB = float(os.environ.get("APPEAL_SERVICE_MAX_BODY_MB", "20"))
+# Idle keep-alive connections are closed after this many seconds
+SERVICE_IDLE_TIMEOUT = float(os.environ.get("APPEAL_SERVICE_IDLE_TIMEOUT", "30"))
+
+QUEUED, RUNNING, SUCCEEDED, REJECTED, FAILED = "queued", "running", "succeeded", "rejected", "failed"
+FINISHED = (SUCCEEDED, REJECTED, FAILED)
+
+
+class QueueFull(Exception):
+    """Raised by submit() when SERVICE_QUEUE_SIZE jobs are already waiting."""
+
+
+class BadRequest(Exception):
+    """Raised for a submission that cannot be processed."""
+
+
+# ------------------ JOB STORE ------------------------
+# The jobs table is the queue, so queued and interrupted jobs survive a restart
+class JobStore:
+    """Job rows in SQLite: the submitted documents, status, result and timings."""
+
+    def __init__(self, path=SERVICE_DB):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, status TEXT, request BLOB, result TEXT, error TEXT,"
+            " created REAL, started REAL, finished REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)")
+        self._lock = threading.Lock()
+
+    def create(self, request):
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._db.execute("INSERT INTO jobs (id, status, request, created) VALUES (?, ?, ?, ?)",
+                             (job_id, QUEUED, json.dumps(request).encode("utf-8"), time.time()))
+        return job_id
+
+    def claim_next(self):
+        """Mark the oldest queued job running and return (id, request), or None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, request FROM jobs WHERE status = ? ORDER BY created LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE jobs SET status = ?, started = ? WHERE id = ?", (RUNNING, time.time(), row[0]))
+        return row[0], json.loads(row[1])
+
+    def finish(self, job_id, status, result=None, error=None):
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished = ?, request = NULL WHERE id = ?",
+                (status, json.dumps(result, default=str) if result is not None else None, error, time.time(), job_id)
+            )
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, status, result, error, created, started, finished FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"job_id": row[0], "status": row[1], "result": json.loads(row[2]) if row[2] else None,
+                "error": row[3], "created": row[4], "started": row[5], "finished": row[6]}
+
+    def counts(self):
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+    def requeue_running(self):
+        """Put jobs left running by a previous process back in the queue."""
+        with self._lock:
+            return self._db.execute("UPDATE jobs SET status = ?, started = NULL WHERE status = ?",
+                                    (QUEUED, RUNNING)).rowcount
+
+
+# ------------------ WORKERS --------------------------
+def parse_submission(body):
+    """
+    Validate a POST /jobs body. Each of "denial" and "claim" is either plain text
+    ("denial_text": "...") or a document:
+    "denial": {"filename": "denial.pdf", "content_type": "application/pdf", "data": "<base64>"}.
+    """
+    try:
+        payload = json.loads(body or b"{}")
+    except ValueError:
+        raise BadRequest("Body must be JSON.")
+    if not isinstance(payload, dict):
+        raise BadRequest("Body must be a JSON object.")
+    request = {}
+    for name in ("denial", "claim"):
+        if isinstance(payload.get(f"{name}_text"), str) and payload[f"{name}_text"].strip():
+            request[name] = {"text": payload[f"{name}_text"]}
+            continue
+        document = payload.get(name)
+        if not isinstance(document, dict) or not isinstance(document.get("data"), str):
+            raise BadRequest(f"Provide '{name}_text' or a '{name}' document with base64 'data'.")
+        try:
+            base64.b64decode(document["data"], validate=True)
+        except (binascii.Error, ValueError):
+            raise BadRequest(f"'{name}.data' is not valid base64.")
+        request[name] = {"filename": str(document.get("filename") or name),
+                         "content_type": str(document.get("content_type") or ""),
+                         "data": document["data"]}
+    return request
+
+
+def _document_text(document):
+    if "text" in document:
+        return document["text"]
+    return extract_text(base64.b64decode(document["data"]), document["filename"], document["content_type"])
+
+
+class AppealService:
+    """
+    A bounded job queue (the JobStore) drained by a fixed pool of worker threads,
+    so throughput follows the number of workers, not the number of clients.
+    """
+
+    def __init__(self, store, workers=SERVICE_WORKERS, queue_size=SERVICE_QUEUE_SIZE):
+        self.store = store
+        self.workers = workers
+        self.queue_size = queue_size
+        self._wakeup = threading.Condition()
+        self._stop = threading.Event()
+        self._threads = []
+        self._queued = 0
+        self._average_seconds = None  # moving average of job run time, for Retry-After
+
+    def start(self):
+        requeued = self.store.requeue_running()
+        self._queued = self.store.counts().get(QUEUED, 0)
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"appeal-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return requeued
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def submit(self, request):
+        """Queue a parsed submission and return its job id; raises QueueFull."""
+        with self._wakeup:
+            if self._queued >= self.queue_size:
+                raise QueueFull(f"{self._queued} jobs are already queued")
+            job_id = self.store.create(request)
+            self._queued += 1
+            self._wakeup.notify()
+        return job_id
+
+    def retry_after(self):
+        """Seconds a refused client should wait: about how often a worker frees up."""
+        average = self._average_seconds or 30.0
+        return max(1, int(average / max(1, self.workers)))
+
+    def health(self):
+        return {"workers": self.workers, "queue_size": self.queue_size, "queued": self._queued,
+                "average_job_seconds": self._average_seconds, "jobs": self.store.counts()}
+
+    def _work(self):
+        while not self._stop.is_set():
+            with self._wakeup:
+                job = self.store.claim_next()
+                if job is None:
+                    self._wakeup.wait(timeout=1.0)
+                    continue
+                self._queued = max(0, self._queued - 1)
+            self._run(*job)
+
+    def _run(self, job_id, request):
+        started = time.monotonic()
+        try:
+            with trace(f"job:{job_id}") as job_trace:
+                result = process_case(_document_text(request["denial"]), _document_text(request["claim"]))
+            result["usage"] = job_trace.totals()
+            status = {"ok": SUCCEEDED, "rejected": REJECTED}.get(result["status"], FAILED)
+            self.store.finish(job_id, status, result, error=json.dumps(result.get("errors")) if status == FAILED else None)
+        except Exception as e:
+            self.store.finish(job_id, FAILED, error=f"{type(e).__name__}: {e}")
+        seconds = time.monotonic() - started
+        self._average_seconds = seconds if self._average_seconds is None else 0.8 * self._average_seconds + 0.2 * seconds
+
+
+# ------------------ HTTP -----------------------------
+# POST /jobs, GET /jobs/<id>[/result|/letter|/letter.docx|/letter.pdf], /health, /metrics.
+# The event loop only moves request and response bodies; the rest runs in the thread pool.
+def _job_summary(job):
+    summary = {key: job[key] for key in ("job_id", "status", "error", "created", "started", "finished")}
+    result = job["result"] or {}
+    for key in ("case_details", "denial_date", "appeal_deadline", "deadline_note", "errors", "usage"):
+        if key in result:
+            summary[key] = result[key]
+    summary["links"] = {name: f"/jobs/{job['job_id']}/{name}"
+                        for name in ("result", "letter", "letter.docx", "letter.pdf")}
+    return summary
+
+
+async def _read_body(request, max_body):
+    """The request body, or None once it passes max_body (declared or streamed, e.g. chunked)."""
+    length = request.headers.get("content-length")
+    if length is not None and length.isdigit() and int(length) > max_body:
+        return None
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > max_body:
+            return None
+    return bytes(body)
+
+
+def _finished_job(request):
+    """The job named in the path once it has finished; raises HTTPException otherwise."""
+    service = request.app.state.service
+    job = service.store.get(request.path_params["job_id"])
+    if job is None:
+        raise HTTPException(404, "No such job.")
+    if job["status"] not in FINISHED:
+        raise HTTPException(409, f"Job is {job['status']}.", headers={"Retry-After": str(service.retry_after())})
+    return job
+
+
+def _job_letter(request):
+    job = _finished_job(request)
+    letter = (job["result"] or {}).get("final_letter")
+    if job["status"] != SUCCEEDED or not letter:
+        raise HTTPException(409, "This job produced no letter.")
+    return letter
+
+
+# Async endpoints only read the body; the rest are plain functions, which Starlette runs
+# on its thread pool, so SQLite and letter rendering never block the event loop
+async def submit_job(request):
+    body = await _read_body(request, request.app.state.max_body)
+    if body is None:
+        return JSONResponse({"error": "Body too large."}, 413, headers={"Connection": "close"})
+    service = request.app.state.service
+    try:
+        submission = await run_in_threadpool(parse_submission, body)
+        job_id = await run_in_threadpool(service.submit, submission)
+    except BadRequest as e:
+        return JSONResponse({"error": str(e)}, 400)
+    except QueueFull as e:
+        return JSONResponse({"error": str(e)}, 429, headers={"Retry-After": str(service.retry_after())})
+    return JSONResponse({"job_id": job_id, "status": QUEUED, "links": {"status": f"/jobs/{job_id}"}}, 202,
+                        headers={"Location": f"/jobs/{job_id}"})
+
+
+def job_status(request):
+    job = request.app.state.service.store.get(request.path_params["job_id"])
+    if job is None:
+        raise HTTPException(404, "No such job.")
+    return JSONResponse(_job_summary(job))
+
+
+def job_result(request):
+    job = _finished_job(request)
+    return JSONResponse(job["result"] or {"error": job["error"]})
+
+
+def job_letter(request):
+    return PlainTextResponse(_job_letter(request))
+
+
+def job_letter_file(request):
+    fmt = request.path_params["fmt"]
+    if fmt not in ("docx", "pdf"):
+        raise HTTPException(404, "No such format.")
+    return Response(export_letter(_job_letter(request), fmt), media_type=DOCX_MIME if fmt == "docx" else PDF_MIME,
+                    headers={"Content-Disposition": f'attachment; filename="appeal_letter.{fmt}"'})
+
+
+def health(request):
+    return JSONResponse(request.app.state.service.health())
+
+
+def metrics(request):
+    return Response(registry.prometheus_text(), media_type="text/plain; version=0.0.4")
+
+
+async def _http_error(request, exc):
+    """Errors as JSON like every other answer, including Starlette's own 404 and 405."""
+    return JSONResponse({"error": exc.detail}, exc.status_code, headers=exc.headers)
+
+
+def create_app(service, max_body_mb=SERVICE_MAX_BODY_MB):
+    """The Starlette app serving service."""
+    app = Starlette(
+        routes=[
+            Route("/jobs", submit_job, methods=["POST"]),
+            Route("/jobs/{job_id}", job_status, methods=["GET"]),
+            Route("/jobs/{job_id}/result", job_result, methods=["GET"]),
+            Route("/jobs/{job_id}/letter", job_letter, methods=["GET"]),
+            Route("/jobs/{job_id}/letter.{fmt}", job_letter_file, methods=["GET"]),
+            Route("/health", health, methods=["GET"]),
+            Route("/metrics", metrics, methods=["GET"]),
+        ],
+        exception_handlers={HTTPException: _http_error},
+    )
+    app.state.service = service
+    app.state.max_body = int(max_body_mb * 1024 * 1024)
+    return app
+
+
+def serve(service, host="127.0.0.1", port=8080, max_body_mb=SERVICE_MAX_BODY_MB,
+          idle_timeout=SERVICE_IDLE_TIMEOUT):
+    """Run the HTTP API under uvicorn until interrupted."""
+    config = uvicorn.Config(create_app(service, max_body_mb), host=host, port=port,
+                            timeout_keep_alive=int(idle_timeout), log_level="warning")
+    uvicorn.Server(config).run()
+
+
+# ------------------ CLI ------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the appeal pipeline over HTTP with a job queue.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("-w", "--workers", type=int, default=SERVICE_WORKERS, help="cases processed in parallel")
+    parser.add_argument("-q", "--queue-size", type=int, default=SERVICE_QUEUE_SIZE,
+                        help="queued jobs before submissions get 429")
+    parser.add_argument("--db", default=SERVICE_DB, help="SQLite file holding job state")
+    args = parser.parse_args(argv)
+
+    install_reload_signal()
+    service = AppealService(JobStore(args.db), workers=args.workers, queue_size=args.queue_size)
+    requeued = service.start()
+    print(f"Serving on http://{args.host}:{args.port} with {args.workers} workers"
+          + (f" ({requeued} interrupted jobs requeued)" if requeued else ""))
+    try:
+        serve(service, args.host, args.port)
+    finally:
+        service.stop(timeout=5)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+import argparse
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from appeal_pipeline import process_case
+from document_text import extract_text
+from gemini_client import install_reload_signal
+from letter_export import export_letter
+from metrics import registry, trace
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.txt', '.jpg', '.jpeg', '.png')
+RESULTS_FILE = "results.jsonl"
+# Stage latency, token and cost metrics for the run, in Prometheus text format
+METRICS_FILE = "metrics.prom"
+
+
+# ------------------ CASE DISCOVERY -------------------
+def _find_document(folder, prefix):
+    for name in sorted(os.listdir(folder)):
+        if name.lower().startswith(prefix) and name.lower().endswith(SUPPORTED_EXTENSIONS):
+            return os.path.join(folder, name)
+    return None
+
+
+def load_cases(source):
+    """
+    Return a list of {"case_id", "denial", "claim"} dicts from a JSONL manifest or a directory.
+
+    Manifest lines look like {"case_id": "...", "denial": "path", "claim": "path"}, with
+    paths relative to the manifest. A directory holds one sub-folder per case containing
+    files named denial.* and claim.*; the sub-folder name is the case ID.
+    """
+    cases = []
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            folder = os.path.join(source, name)
+            if not os.path.isdir(folder):
+                continue
+            denial = _find_document(folder, "denial")
+            claim = _find_document(folder, "claim")
+            if denial and claim:
+                cases.append({"case_id": name, "denial": denial, "claim": claim})
+        return cases
+
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            missing = [k for k in ("denial", "claim") if not entry.get(k)]
+            if missing:
+                raise ValueError(f"{source}:{line_no}: missing {', '.join(missing)}")
+            cases.append({
+                "case_id": str(entry.get("case_id") or line_no),
+                "denial": os.path.join(base, entry["denial"]),
+                "claim": os.path.join(base, entry["claim"]),
+            })
+    return cases
+
+
+def load_checkpoint(output_dir):
+    """
+    Return the IDs of cases already finished in a previous run. Errored cases are retried.
+    """
+    done = set()
+    path = os.path.join(output_dir, RESULTS_FILE)
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # torn last line from a crash
+            if record.get("status") in ("ok", "rejected"):
+                done.add(record["case_id"])
+    return done
+
+
+# ------------------ CASE PROCESSING ------------------
+def read_document(path):
+    """Extract text from a document on disk, streamed from the file rather than read whole."""
+    file_type = mimetypes.guess_type(path)[0] or ""
+    with open(path, "rb") as f:
+        return extract_text(f, os.path.basename(path), file_type)
+
+
+def save_letter_docx(letter, path):
+    """Write the letter to a .docx file (see letter_export.render_docx)."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(export_letter(letter, "docx"))
+    os.replace(tmp_path, path)
+
+
+def letter_filename(case_id):
+    """
+    File name for a case's DOCX. IDs with characters unsafe in file names are
+    sanitized and suffixed with a short hash of the ID, so "A/1" and "A 1" do not
+    overwrite each other's letter.
+    """
+    safe_id = re.sub(r'[^\w.-]', '_', case_id)
+    if safe_id != case_id:
+        safe_id += "-" + hashlib.sha256(case_id.encode("utf-8")).hexdigest()[:8]
+    return f"{safe_id}.docx"
+
+
+def run_case(case, output_dir):
+    """Process one case and write its DOCX; returns the JSONL record."""
+    started = time.monotonic()
+    with trace(f"batch_case:{case['case_id']}") as case_trace:
+        record = _run_case(case, output_dir)
+    record["seconds"] = round(time.monotonic() - started, 3)
+    record["trace_id"] = case_trace.trace_id
+    record["usage"] = case_trace.totals()
+    return record
+
+
+def _run_case(case, output_dir):
+    try:
+        result = process_case(read_document(case["denial"]), read_document(case["claim"]))
+        record = {"case_id": case["case_id"], **result}
+        if result["status"] == "ok":
+            docx_path = os.path.join(output_dir, letter_filename(case["case_id"]))
+            save_letter_docx(result["final_letter"], docx_path)
+            record["docx"] = os.path.basename(docx_path)
+    except Exception as e:
+        record = {"case_id": case["case_id"], "status": "error", "error": str(e)}
+    return record
+
+
+def _end_torn_line(path):
+    """Terminate a line left half-written by a crash, so the next record starts on its own line."""
+    if not os.path.exists(path) or not os.path.getsize(path):
+        return
+    with open(path, "rb+") as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+            f.write(b"\n")
+
+
+def run_batch(cases, output_dir, workers=4, log=sys.stderr):
+    """
+    Process cases on a worker pool, appending each result to results.jsonl as it finishes.
+    Cases recorded as done in an earlier run are skipped, so a crashed run resumes.
+    Stage metrics for the run are written to metrics.prom at the end.
+    Returns a summary dict with counts and throughput.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    done = load_checkpoint(output_dir)
+    todo = [case for case in cases if case["case_id"] not in done]
+    counts = {"ok": 0, "rejected": 0, "error": 0}
+    started = time.monotonic()
+
+    print(f"{len(cases)} cases, {len(done)} already done, {len(todo)} to process", file=log)
+    results_path = os.path.join(output_dir, RESULTS_FILE)
+    _end_torn_line(results_path)
+    with open(results_path, "a", encoding="utf-8") as results_file, \
+            ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_case, case, output_dir) for case in todo]
+        for finished, future in enumerate(as_completed(futures), 1):
+            record = future.result()
+            results_file.write(json.dumps(record, default=str) + "\n")
+            results_file.flush()
+            os.fsync(results_file.fileno())
+            counts[record["status"]] += 1
+            elapsed = time.monotonic() - started
+            rate = finished / elapsed * 60 if elapsed else 0.0
+            print(f"[{finished}/{len(todo)}] {record['case_id']}: {record['status']} "
+                  f"({rate:.1f} cases/min)", file=log)
+
+    elapsed = time.monotonic() - started
+    summary = dict(counts, processed=len(todo), skipped=len(done), seconds=round(elapsed, 1),
+                   cases_per_minute=round(len(todo) / elapsed * 60, 2) if elapsed and todo else 0.0)
+    registry.write_prometheus(os.path.join(output_dir, METRICS_FILE))
+    print(f"Done: {summary}", file=log)
+    return summary
+
+
+# ------------------ CLI ------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate appeal letters for a batch of denial/claim pairs.")
+    parser.add_argument("source", help="directory with one sub-folder per case, or a JSONL manifest")
+    parser.add_argument("-o", "--output", default="appeal_output", help="output directory (default: appeal_output)")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="cases processed in parallel (default: 4)")
+    args = parser.parse_args(argv)
+
+    install_reload_signal()
+    summary = run_batch(load_cases(args.source), args.output, workers=args.workers)
+    return 1 if summary["error"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""
+Calibration of the local denial reason classifier (denial_classifier.py) on
+held-out denial letters: synthetic letters (corpus.py) whose reason sentences are
+worded differently from SEED_EXAMPLES, including reasons no seed covers (timely
+filing, duplicates, eligibility ...), which must come out as "Other" or go to Gemini.
+
+    python benchmarks/classifier.py                  # fit and report
+    python benchmarks/classifier.py --precision 0.95
+
+Fits the softmax temperature (DenialReasonClassifier.calibrate), then reports, for
+each threshold and margin, how many letters are decided locally and how many of
+those are right, and picks the lowest threshold and margin whose local decisions
+reach --precision. Copy the chosen values into denial_classifier.py.
+"""
+import argparse
+import os
+import random
+import sys
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import corpus  # noqa: E402
+from denial_classifier import DenialReasonClassifier, SEED_EXAMPLES  # noqa: E402
+
+# Reason sentences not used for training, by category
+HELD_OUT = {
+    "Not Medically Necessary": [
+        "the documentation does not show that the requested level of care is required for your condition",
+        "our medical director determined the admission was not medically required",
+        "conservative treatment has not been tried, so the surgery does not meet our criteria",
+        "the service does not meet the plan's definition of medically necessary care",
+    ],
+    "Experimental Treatment": [
+        "the therapy has not been shown to improve health outcomes and remains investigational",
+        "this use of the drug is off-label and considered experimental",
+        "the device is still under study and is not an accepted standard of care",
+        "the procedure is considered unproven for your diagnosis",
+    ],
+    "Coverage Exclusion": [
+        "hearing aids are not a covered benefit under your plan",
+        "your policy excludes weight loss surgery",
+        "the service falls under a plan exclusion listed in your certificate of coverage",
+        "routine foot care is not covered by your benefit plan",
+    ],
+    "Incomplete Documentation": [
+        "the operative report and progress notes were not included with the claim",
+        "we requested additional information from your provider and did not receive it",
+        "the claim could not be reviewed because required records are missing",
+        "your provider has not sent the test results we asked for",
+    ],
+    "Out of Network": [
+        "the facility does not participate in your plan's network",
+        "your HMO plan does not cover care from providers outside the network except emergencies",
+        "the surgeon is not a contracted provider for your plan",
+        "out-of-network services are not a benefit of your EPO plan",
+    ],
+    "Pre-Authorization Required": [
+        "the imaging was performed without the required prior approval",
+        "we have no record of an authorization request for this admission",
+        "the service needed precertification, which was not requested in advance",
+        "the provider did not request authorization before scheduling the surgery",
+    ],
+    "Benefit Maximum Reached": [
+        "you have used all 20 physical therapy visits allowed this calendar year",
+        "the dollar limit for durable medical equipment has already been paid",
+        "your plan's annual limit for chiropractic care has been met",
+        "no further sessions are available because the yearly visit maximum was reached",
+    ],
+    "Other": [
+        "the claim was not submitted within the timely filing limit of 90 days",
+        "this claim is a duplicate of a claim already processed",
+        "the patient was not eligible for coverage on the date of service",
+        "another health plan is primary, so this claim must be billed to them first",
+        "the procedure code billed is not valid for the diagnosis reported",
+        "your coverage was terminated before the date of service",
+        "the charges are the responsibility of the auto insurer under third party liability",
+        "the claim was filed more than one year after the service date",
+        "the rendering provider's license could not be verified",
+        "payment for this service was included in another procedure billed on the same day",
+    ],
+}
+
+
+def held_out_letters(seed=0, variants=3):
+    """(denial letter text, category) pairs built around the HELD_OUT reason sentences."""
+    rng = random.Random(seed)
+    examples = []
+    for category, reasons in HELD_OUT.items():
+        for reason in reasons:
+            for _ in range(variants):
+                case = corpus.make_case(rng)
+                case["reason"] = reason
+                examples.append(("\n".join(corpus.denial_lines(case, rng)), category))
+    return examples
+
+
+def decisions(classifier, examples):
+    """(predicted category, probability, margin over the runner-up, correct) per example."""
+    probabilities = classifier.predict_proba([classifier.statement(text) for text, _ in examples])
+    ranked = np.sort(probabilities, axis=1)
+    best = probabilities.argmax(axis=1)
+    return [(classifier.categories[b], ranked[i, -1], ranked[i, -1] - ranked[i, -2],
+             classifier.categories[b] == category)
+            for i, (b, (_, category)) in enumerate(zip(best, examples))]
+
+
+def sweep(rows, thresholds, margins):
+    """(threshold, margin, share decided locally, precision of those) for every pair."""
+    table = []
+    for threshold in thresholds:
+        for margin in margins:
+            kept = [correct for _, probability, gap, correct in rows if probability >= threshold and gap >= margin]
+            precision = sum(kept) / len(kept) if kept else 1.0
+            table.append((threshold, margin, len(kept) / len(rows), precision))
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate the local denial reason classifier on held-out letters.")
+    parser.add_argument("--precision", type=float, default=0.95, help="required precision of local decisions")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    classifier = DenialReasonClassifier.train(
+        [(text, category) for category, texts in SEED_EXAMPLES.items() for text in texts]
+    )
+    # Fit the temperature on one half of the letters, choose the cut-offs on the other
+    examples = held_out_letters(args.seed)
+    random.Random(args.seed).shuffle(examples)
+    fit, test = examples[::2], examples[1::2]
+    temperature = classifier.calibrate(fit)
+    rows = decisions(classifier, test)
+    print(f"temperature {temperature:.2f}, top-1 accuracy {sum(r[3] for r in rows) / len(rows):.2f} "
+          f"on {len(rows)} held-out letters")
+
+    table = sweep(rows, thresholds=np.round(np.arange(0.3, 0.95, 0.05), 2), margins=(0.0, 0.1, 0.2, 0.3))
+    for threshold, margin, coverage, precision in table:
+        print(f"  threshold {threshold:.2f} margin {margin:.1f}: local {coverage:5.1%}, precision {precision:5.1%}")
+    good = [row for row in table if row[3] >= args.precision and row[2] > 0]
+    if not good:
+        print(f"No setting reaches {args.precision:.0%} precision; leave every letter to Gemini.")
+        return
+    threshold, margin, coverage, precision = max(good, key=lambda row: (row[2], -row[0], -row[1]))
+    print(f"Chosen: threshold {threshold:.2f}, margin {margin:.1f} "
+          f"({coverage:.1%} decided locally at {precision:.1%} precision)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""
+Synthetic denial and claim letters for the benchmarks, written as plain text,
+digital PDFs (with a text layer), scanned PDFs and PNG images (rendered pages,
+no text layer, so they go through OCR).
+
+    python benchmarks/corpus.py out_dir --cases 20 --pages 1,3,10 --formats txt,pdf,scan_pdf,png
+
+The output directory has one folder per case (denial.<ext>, claim.<ext>), the
+layout batch_appeals.py reads.
+"""
+import argparse
+import io
+import os
+import random
+
+from PIL import Image, ImageDraw, ImageFont
+
+FORMATS = ("txt", "pdf", "scan_pdf", "png")
+PAGE_LINES = 48
+
+FIRST_NAMES = ["Jordan", "Avery", "Morgan", "Riley", "Casey", "Taylor", "Quinn", "Parker", "Reese", "Rowan"]
+LAST_NAMES = ["Avery", "Bennett", "Castillo", "Dubois", "Ellis", "Fischer", "Garcia", "Hughes", "Iqbal", "Jensen"]
+INSURERS = ["Northwind Health Plan", "Blue Meadow Insurance", "Summit Care Mutual", "Harbor Life & Health"]
+DENIAL_REASONS = [
+    "the requested service is not medically necessary under our clinical guidelines",
+    "the treatment is considered experimental or investigational",
+    "prior authorization was not obtained before the service was provided",
+    "the provider is not in network for your plan",
+    "we did not receive the medical records needed to review this claim",
+]
+TREATMENTS = ["an MRI of the lumbar spine", "physical therapy sessions", "a knee arthroscopy",
+              "an insulin pump", "a sleep study"]
+FILLER = [
+    "Coverage is subject to the terms, limitations and exclusions described in your evidence of coverage.",
+    "Our reviewers apply nationally recognized clinical criteria when reviewing requests for services.",
+    "The patient reports persistent symptoms despite medication and home exercise over several weeks.",
+    "Examination notes document reduced range of motion and tenderness on palpation.",
+    "Prior imaging from the previous year showed mild degenerative changes without acute findings.",
+    "You may request copies of documents relevant to your claim free of charge.",
+]
+
+
+# ------------------ LETTERS --------------------------
+def make_case(rng):
+    name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+    return {
+        "name": name,
+        "member_id": f"MBR{rng.randrange(10**6, 10**7)}",
+        "policy": f"POL-{rng.randrange(10**5, 10**6)}",
+        "claim": f"CLM-2024-{rng.randrange(10**5, 10**6)}",
+        "date": f"{rng.randint(1, 12):02d}/{rng.randint(1, 28):02d}/2024",
+        "insurer": rng.choice(INSURERS),
+        "reason": rng.choice(DENIAL_REASONS),
+        "treatment": rng.choice(TREATMENTS),
+    }
+
+
+def _filler_pages(rng, pages):
+    lines = []
+    for _ in range((pages - 1) * PAGE_LINES // 2):
+        lines += [rng.choice(FILLER), ""]
+    return lines
+
+
+def denial_lines(case, rng, pages=1):
+    lines = [
+        case["insurer"],
+        "100 Harbor Way, Springfield, IL 62701",
+        "",
+        f"Date of denial: {case['date']}",
+        f"Re: {case['name']}",
+        f"Member ID: {case['member_id']}",
+        f"Policy Number: {case['policy']}",
+        f"Claim Number: {case['claim']}",
+        "",
+        f"Dear {case['name']},",
+        "",
+        f"We have reviewed the claim submitted for {case['treatment']}. Your claim has been denied because",
+        f"{case['reason']}. This determination was made after review of the information provided by your",
+        "provider and the terms of your plan coverage and benefits.",
+        "",
+        "You have the right to appeal this decision within 180 days of the date of this notice. To appeal,",
+        "send a written request with any additional records to the address above.",
+        "",
+        "Sincerely,",
+        "Utilization Review Department",
+    ]
+    return lines + _filler_pages(rng, pages)
+
+
+def claim_lines(case, rng, pages=1):
+    lines = [
+        "Springfield Orthopedic Associates",
+        "",
+        f"Patient: {case['name']}",
+        f"Member ID: {case['member_id']}",
+        "",
+        "To whom it may concern,",
+        "",
+        "I am writing on behalf of my patient, who has a history of chronic pain and symptoms that have not",
+        "responded to treatment. The patient failed a six week trial of physical therapy and medication.",
+        f"I recommend {case['treatment']}, which is medically necessary to confirm the diagnosis and guide",
+        "further care. Delaying treatment risks progression of the condition and loss of function.",
+        "",
+        "Sincerely,",
+        "Dr. Alex Morgan, MD",
+    ]
+    return lines + _filler_pages(rng, pages)
+
+
+def paginate(lines):
+    return [lines[i:i + PAGE_LINES] for i in range(0, len(lines), PAGE_LINES)] or [[]]
+
+
+# ------------------ WRITERS --------------------------
+def _pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def text_pdf_bytes(pages):
+    """A minimal PDF with one Helvetica text page per list of lines."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None,
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for lines in pages:
+        body = "BT /F1 10 Tf 14 TL 60 750 Td " + " ".join(f"({_pdf_escape(line)}) Tj T*" for line in lines) + " ET"
+        objects.append(f"<< /Length {len(body.encode('latin-1'))} >>\nstream\n{body}\nendstream")
+        page_ids.append(len(objects) + 1)
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {len(page_ids)} >>"
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(out.tell())
+        out.write(f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1"))
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1"))
+    out.write("".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1"))
+    out.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1"))
+    return out.getvalue()
+
+
+def _font(size):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # Pillow < 10.1 has a single bitmap size
+        return ImageFont.load_default()
+
+
+def render_page(lines, dpi=150, skew=0.0):
+    """Render lines onto a US Letter page at dpi, optionally rotated like a crooked scan."""
+    width, height = int(8.5 * dpi), int(11 * dpi)
+    image = Image.new("L", (width, height), 255)
+    draw = ImageDraw.Draw(image)
+    font = _font(int(dpi / 7))
+    line_height = int(dpi / 5)
+    for row, line in enumerate(lines):
+        draw.text((dpi * 0.8, dpi * 0.8 + row * line_height), line, fill=0, font=font)
+    if skew:
+        image = image.rotate(skew, resample=Image.BILINEAR, expand=True, fillcolor=255)
+    return image
+
+
+def write_document(path_base, lines, fmt, rng):
+    """Write lines as path_base.<ext> in fmt; returns the path written."""
+    pages = paginate(lines)
+    if fmt == "txt":
+        path = path_base + ".txt"
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines))
+    elif fmt == "pdf":
+        path = path_base + ".pdf"
+        with open(path, "wb") as f:
+            f.write(text_pdf_bytes(pages))
+    elif fmt == "scan_pdf":
+        path = path_base + ".pdf"
+        images = [render_page(page, skew=rng.uniform(-2, 2)).convert("RGB") for page in pages]
+        images[0].save(path, "PDF", resolution=150, save_all=True, append_images=images[1:])
+    elif fmt == "png":
+        # A photo of the first page; images are single-page by nature
+        path = path_base + ".png"
+        render_page(pages[0], skew=rng.uniform(-2, 2)).save(path, dpi=(150, 150))
+    else:
+        raise ValueError(f"Unknown format: {fmt}")
+    return path
+
+
+def generate_corpus(out_dir, cases=10, pages=(1,), formats=("txt", "pdf"), seed=0):
+    """
+    Write cases x pages x formats case folders under out_dir. Returns a list of
+    {"case_id", "denial", "claim", "format", "pages"} dicts.
+    """
+    rng = random.Random(seed)
+    manifest = []
+    for index in range(cases):
+        case = make_case(rng)
+        for page_count in pages:
+            for fmt in formats:
+                case_id = f"case{index:03d}-{fmt}-{page_count}p"
+                folder = os.path.join(out_dir, case_id)
+                os.makedirs(folder, exist_ok=True)
+                manifest.append({
+                    "case_id": case_id,
+                    "denial": write_document(os.path.join(folder, "denial"), denial_lines(case, rng, page_count), fmt, rng),
+                    "claim": write_document(os.path.join(folder, "claim"), claim_lines(case, rng, page_count), fmt, rng),
+                    "format": fmt,
+                    "pages": page_count,
+                })
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic corpus of denial and claim letters.")
+    parser.add_argument("out_dir")
+    parser.add_argument("--cases", type=int, default=10)
+    parser.add_argument("--pages", default="1,3", help="comma-separated page counts")
+    parser.add_argument("--formats", default="txt,pdf", help=f"comma-separated, from {', '.join(FORMATS)}")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    manifest = generate_corpus(args.out_dir, args.cases, [int(p) for p in args.pages.split(",")],
+                               args.formats.split(","), args.seed)
+    print(f"Wrote {len(manifest)} cases to {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+A local stand-in for google.generativeai.GenerativeModel, so the pipeline can be
+benchmarked offline: calls sleep for a configurable latency and return canned
+responses shaped like the real ones (structured JSON when a response_schema is
+given, plain text otherwise), including usage metadata and streaming.
+
+    import fake_gemini
+    fake_gemini.install(fake_gemini.LatencyModel(median=0.8, sigma=0.4))
+"""
+import json
+import random
+import threading
+import time
+
+SUMMARY_TEXT = (
+    "1. Patient diagnosis: lumbar disc herniation with radiculopathy.\n"
+    "2. Requested treatment: MRI of the lumbar spine.\n"
+    "3. Justification: six weeks of failed conservative therapy and progressive symptoms."
+)
+XAI_RESPONSE = {
+    "quoted_reason": "The requested service is not medically necessary.",
+    "explanation": "The insurer does not think the records show the imaging is needed yet.",
+    "required_evidence": "Physical therapy notes and the neurological examination findings.",
+}
+CONFIDENCE_TEXT = "Medium - The clinical history is documented but conservative care notes are thin."
+LETTER_PARAGRAPH = (
+    "I am writing to formally appeal the denial of coverage for the services described below. "
+    "The enclosed records document the patient's diagnosis, the conservative treatment already tried, "
+    "and the clinical reasoning of the treating physician. "
+)
+# Canned values for the structured extraction, by schema property
+CASE_VALUES = {
+    "patient_name": "Jordan Avery",
+    "member_id": "MBR4821937",
+    "insurance_company_name": "Northwind Health Plan",
+    "insurance_company_address": "100 Harbor Way, Springfield, IL 62701",
+    "policy_number": "POL-558201",
+    "claim_number": "CLM-2024-118734",
+    "denial_date": "03/14/2024",
+    "denial_reason": "Not Medically Necessary",
+    "denial_explanation": "The plan found the imaging was not yet needed under its guidelines.",
+    "denial_is_genuine": True,
+    "claim_is_genuine": True,
+}
+
+
+class LatencyModel:
+    """
+    Call latency: a log-normal base (median seconds, sigma) plus output tokens at
+    tokens_per_second, with an optional error_rate of transient 503s.
+    """
+
+    def __init__(self, median=0.8, sigma=0.4, tokens_per_second=200.0, error_rate=0.0, seed=None):
+        self.median = median
+        self.sigma = sigma
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self, output_tokens):
+        with self._lock:
+            base = self.median * self._random.lognormvariate(0.0, self.sigma) if self.median else 0.0
+            failed = self._random.random() < self.error_rate
+        return base + output_tokens / self.tokens_per_second, failed
+
+
+class UsageMetadata:
+    def __init__(self, prompt_token_count, candidates_token_count):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+
+
+class FakeChunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeResponse:
+    """A finished response, iterable as a single chunk like a streamed one."""
+
+    def __init__(self, text, usage_metadata):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+    def __iter__(self):
+        yield FakeChunk(self.text)
+
+
+class FakeStream:
+    """A streamed response: the text arrives in chunks spread over the latency."""
+
+    def __init__(self, text, usage_metadata, seconds, chunk_words=12):
+        self.usage_metadata = usage_metadata
+        words = text.split(" ")
+        self._chunks = [" ".join(words[i:i + chunk_words]) + " " for i in range(0, len(words), chunk_words)]
+        self._delay = seconds / max(1, len(self._chunks))
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            time.sleep(self._delay)
+            yield FakeChunk(chunk)
+
+
+def count_tokens(text):
+    return (len(text) + 3) // 4
+
+
+def canned_response(prompt, generation_config=None):
+    """The response text a real model would plausibly give to one of the app's prompts."""
+    schema = (generation_config or {}).get("response_schema")
+    if schema:
+        values = dict(CASE_VALUES, **XAI_RESPONSE)
+        return json.dumps({prop: values.get(prop, "") for prop in schema.get("properties", {})})
+    if "quoted_reason" in prompt:
+        return json.dumps(XAI_RESPONSE)
+    if "likelihood of appeal success" in prompt:
+        return CONFIDENCE_TEXT
+    if prompt.rstrip().endswith("Summary:"):
+        return SUMMARY_TEXT
+    return "Dear Appeals Department,\n\n" + "\n\n".join([LETTER_PARAGRAPH * 3] * 4) + "\n\nSincerely,\nJordan Avery"
+
+
+# ------------------ FAKE MODEL -----------------------
+class FakeGenerativeModel:
+    """Drop-in for genai.GenerativeModel; counts calls in FakeGenerativeModel.stats."""
+
+    latency = LatencyModel()
+    stats = {"calls": 0, "errors": 0, "input_tokens": 0, "output_tokens": 0}
+    _stats_lock = threading.Lock()
+
+    def __init__(self, model_name="gemini-2.0-flash", **kwargs):
+        self.model_name = model_name
+
+    def generate_content(self, prompt, generation_config=None, stream=False, **kwargs):
+        text = canned_response(prompt, generation_config)
+        usage = UsageMetadata(count_tokens(prompt), count_tokens(text))
+        seconds, failed = self.latency.sample(usage.candidates_token_count)
+        with self._stats_lock:
+            self.stats["calls"] += 1
+            self.stats["errors"] += int(failed)
+            self.stats["input_tokens"] += usage.prompt_token_count
+            self.stats["output_tokens"] += usage.candidates_token_count
+        if failed:
+            from google.api_core import exceptions
+            time.sleep(seconds / 4)
+            raise exceptions.ServiceUnavailable("fake Gemini: service unavailable")
+        if stream:
+            return FakeStream(text, usage, seconds)
+        time.sleep(seconds)
+        return FakeResponse(text, usage)
+
+    @classmethod
+    def reset_stats(cls):
+        with cls._stats_lock:
+            for key in cls.stats:
+                cls.stats[key] = 0
+
+
+def install(latency=None):
+    """
+    Replace genai.GenerativeModel (and genai.configure) with the fake, and make
+    gemini_client hand out fake models even without an API key.
+    """
+    import google.generativeai as genai
+    import gemini_client
+
+    if latency is not None:
+        FakeGenerativeModel.latency = latency
+    genai.GenerativeModel = FakeGenerativeModel
+    genai.configure = lambda **kwargs: None
+    with gemini_client._lock:
+        gemini_client._loaded = True
+        gemini_client._api_key = "offline-benchmark"
+        gemini_client._models.clear()
+        # Never re-read .env, which would replace the fake key with the real (or no) one
+        gemini_client._next_env_check = float("inf")
+        gemini_client._reload_requested.clear()
@@ -0,0 +1,249 @@
+"""
+Offline end-to-end benchmark of the appeal pipeline. Gemini is replaced by the
+local stand-in in fake_gemini.py, a synthetic corpus is generated (corpus.py),
+and N concurrent sessions push the cases through text extraction and
+process_case, the same path batch_appeals.py takes.
+
+    python benchmarks/pipeline.py                              # 40 cases: 10 x pages 1,3 x txt,pdf; 4 sessions
+    python benchmarks/pipeline.py --sessions 8 --pages 1,5,20 --latency 1.2
+    python benchmarks/pipeline.py --formats txt,pdf,scan_pdf,png   # OCR formats need easyocr
+
+Reported: end-to-end and per-stage latency (p50/p95), throughput, Gemini calls and
+tokens, and peak memory. Each run is saved as benchmarks/results/pipeline-<time>.json
+and summarized in benchmarks/results/history.jsonl (git-ignored, so results stay
+local); the summary is compared with the previous run of the same configuration.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+RESULTS_DIR = os.path.join(HERE, "results")
+HISTORY_FILE = "history.jsonl"
+
+
+def configure_environment(cache_dir, rpm):
+    """
+    Settings the app modules read at import time: a private response cache, so every
+    run starts cold, and the fake's request rate instead of the free-tier quota.
+    """
+    os.environ.setdefault("APPEAL_CACHE_DIR", cache_dir)
+    os.environ.setdefault("APPEAL_GEMINI_RPM", str(rpm))
+    os.environ.setdefault("APPEAL_GEMINI_BACKOFF_BASE", "0.05")
+    os.environ.setdefault("APPEAL_GEMINI_BACKOFF_MAX", "0.5")
+    sys.path[:0] = [ROOT, HERE]
+
+
+def available_formats(formats):
+    """Drop the OCR formats when easyocr (or pypdfium2, for scanned PDFs) is missing."""
+    missing = {name for name in ("easyocr", "pypdfium2") if importlib.util.find_spec(name) is None}
+    keep = []
+    for fmt in formats:
+        if fmt in ("png", "scan_pdf") and "easyocr" in missing or fmt == "scan_pdf" and "pypdfium2" in missing:
+            print(f"Skipping {fmt}: {', '.join(sorted(missing))} not installed", file=sys.stderr)
+            continue
+        keep.append(fmt)
+    return keep
+
+
+def percentiles(values):
+    if not values:
+        return {}
+    ordered = sorted(values)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {"count": len(values), "mean": statistics.fmean(values), "p50": pick(0.5),
+            "p95": pick(0.95), "max": ordered[-1]}
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+# ------------------ RUN ------------------------------
+def run_case(case):
+    from appeal_pipeline import process_case
+    from batch_appeals import read_document
+    from metrics import trace
+
+    started = time.perf_counter()
+    with trace(case["case_id"]) as case_trace:
+        try:
+            status = process_case(read_document(case["denial"]), read_document(case["claim"]))["status"]
+        except Exception as e:
+            status = f"error: {e}"
+    return {
+        "case_id": case["case_id"],
+        "format": case["format"],
+        "pages": case["pages"],
+        "status": status,
+        "seconds": time.perf_counter() - started,
+        "spans": case_trace.breakdown(),
+    }
+
+
+def run_sessions(cases, sessions):
+    """Split cases round-robin over sessions, each working through its share in order."""
+    shares = [cases[i::sessions] for i in range(sessions)]
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        return [record for share in pool.map(lambda share: [run_case(c) for c in share], shares)
+                for record in share]
+
+
+def summarize(records, wall_seconds):
+    stages = {}
+    for record in records:
+        for span in record["spans"]:
+            stages.setdefault(span["stage"], []).append(span["seconds"])
+    by_format = {}
+    for record in records:
+        by_format.setdefault(f"{record['format']}/{record['pages']}p", []).append(record["seconds"])
+    return {
+        "cases": len(records),
+        "errors": sum(record["status"] not in ("ok", "rejected") for record in records),
+        "rejected": sum(record["status"] == "rejected" for record in records),
+        "wall_seconds": wall_seconds,
+        "cases_per_minute": len(records) / wall_seconds * 60 if wall_seconds else 0.0,
+        "end_to_end": percentiles([record["seconds"] for record in records]),
+        "end_to_end_by_format": {key: percentiles(values) for key, values in sorted(by_format.items())},
+        "stages": {name: percentiles(values) for name, values in sorted(stages.items())},
+    }
+
+
+def run(args):
+    cache_dir = tempfile.mkdtemp(prefix="appeal-bench-")
+    configure_environment(cache_dir, args.rpm)
+    import corpus
+    import fake_gemini
+
+    fake_gemini.install(fake_gemini.LatencyModel(args.latency, args.sigma, args.tokens_per_second,
+                                                 args.error_rate, seed=args.seed))
+    formats = available_formats(args.formats.split(","))
+    pages = [int(p) for p in args.pages.split(",")]
+    corpus_dir = args.corpus_dir or os.path.join(cache_dir, "corpus")
+    cases = corpus.generate_corpus(corpus_dir, args.cases, pages, formats, args.seed)
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    started = time.perf_counter()
+    records = run_sessions(cases, args.sessions)
+    wall_seconds = time.perf_counter() - started
+
+    summary = summarize(records, wall_seconds)
+    summary["gemini"] = dict(fake_gemini.FakeGenerativeModel.stats)
+    summary["peak_rss_mb"] = peak_rss_mb()
+    if args.tracemalloc:
+        summary["tracemalloc_peak_mb"] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+    config = {"cases": args.cases, "sessions": args.sessions, "pages": pages, "formats": formats,
+              "latency": args.latency, "sigma": args.sigma, "tokens_per_second": args.tokens_per_second,
+              "error_rate": args.error_rate, "rpm": args.rpm, "seed": args.seed}
+    return {
+        "benchmark": "pipeline",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "revision": git_revision(),
+        "python": sys.version.split()[0],
+        "config": config,
+        "summary": summary,
+        "cases": records,
+    }
+
+
+# ------------------ RESULTS --------------------------
+def save(result, results_dir):
+    os.makedirs(results_dir, exist_ok=True)
+    stamp = result["timestamp"].replace(":", "").replace("-", "")
+    path = os.path.join(results_dir, f"pipeline-{stamp}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=1)
+    entry = {key: result[key] for key in ("benchmark", "timestamp", "revision", "config", "summary")}
+    previous = None
+    history_path = os.path.join(results_dir, HISTORY_FILE)
+    if os.path.exists(history_path):
+        with open(history_path, encoding="utf-8") as f:
+            for line in f:
+                past = json.loads(line)
+                if past.get("config") == entry["config"]:
+                    previous = past
+    with open(history_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry) + "\n")
+    return path, previous
+
+
+def _change(now, before):
+    if not before:
+        return ""
+    return f" ({(now - before) / before * 100:+.1f}% vs {before:.3f})"
+
+
+def report(result, previous=None):
+    summary = result["summary"]
+    before = previous["summary"] if previous else {}
+    print(f"{summary['cases']} cases over {result['config']['sessions']} sessions in {summary['wall_seconds']:.2f}s, "
+          f"{summary['errors']} errors, {summary['rejected']} rejected")
+    print(f"  throughput  {summary['cases_per_minute']:.1f} cases/min"
+          f"{_change(summary['cases_per_minute'], before.get('cases_per_minute'))}")
+    e2e, e2e_before = summary["end_to_end"], before.get("end_to_end", {})
+    print(f"  end-to-end  p50 {e2e['p50']:.3f}s{_change(e2e['p50'], e2e_before.get('p50'))}  "
+          f"p95 {e2e['p95']:.3f}s{_change(e2e['p95'], e2e_before.get('p95'))}")
+    for key, stats in summary["end_to_end_by_format"].items():
+        print(f"    {key:16s} p50 {stats['p50']:.3f}s  p95 {stats['p95']:.3f}s")
+    print("  stages")
+    for name, stats in summary["stages"].items():
+        print(f"    {name:22s} n={stats['count']:<4d} p50 {stats['p50']:.4f}s  p95 {stats['p95']:.4f}s")
+    gemini = summary["gemini"]
+    print(f"  gemini      {gemini['calls']} calls, {gemini['errors']} injected errors, "
+          f"{gemini['input_tokens']} input / {gemini['output_tokens']} output tokens")
+    if summary["peak_rss_mb"] is not None:
+        print(f"  peak RSS    {summary['peak_rss_mb']:.1f} MB")
+    if "tracemalloc_peak_mb" in summary:
+        print(f"  peak heap   {summary['tracemalloc_peak_mb']:.1f} MB (tracemalloc)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the appeal pipeline offline against a fake Gemini.")
+    parser.add_argument("--cases", type=int, default=10, help="synthetic cases per page count and format")
+    parser.add_argument("--sessions", type=int, default=4, help="concurrent sessions")
+    parser.add_argument("--pages", default="1,3", help="comma-separated page counts")
+    parser.add_argument("--formats", default="txt,pdf", help="comma-separated: txt, pdf, scan_pdf, png")
+    parser.add_argument("--latency", type=float, default=0.8, help="median fake call latency, seconds")
+    parser.add_argument("--sigma", type=float, default=0.4, help="log-normal spread of the latency")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0, help="fake output speed")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of calls failing with a 503")
+    parser.add_argument("--rpm", type=float, default=100000, help="client-side request rate limit")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--corpus-dir", help="where to write the corpus (default: a temporary directory)")
+    parser.add_argument("--tracemalloc", action="store_true", help="also measure peak Python heap (slower)")
+    parser.add_argument("-o", "--results-dir", default=RESULTS_DIR)
+    args = parser.parse_args()
+
+    result = run(args)
+    path, previous = save(result, args.results_dir)
+    report(result, previous)
+    print(f"Saved {path}")
+
+
+if __name__ == "__main__":
+    main()
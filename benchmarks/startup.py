@@ -0,0 +1,130 @@
+"""
+Cold-start benchmark: how long the app's modules take to import, and how long the
+first request of each kind takes, each measured in a fresh interpreter.
+
+    python benchmarks/startup.py                 # 5 runs, median of each timing
+    python benchmarks/startup.py -n 10 --ocr     # also time loading the OCR reader
+    python benchmarks/startup.py -o benchmarks/results/startup.jsonl
+
+Everything runs offline: no Gemini calls are made.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Imported in this order, so each timing covers only what the earlier ones did not load
+MODULES = [
+    "document_text",
+    "gemini_client",
+    "case_extraction",
+    "appeal_pipeline",
+]
+
+SAMPLE_DENIAL = """Member ID: ABC123456
+Claim Number: CLM-2024-0001
+
+Your claim has been denied because the requested service is not medically necessary
+under our clinical guidelines.
+"""
+
+
+# ------------------ CHILD ----------------------------
+def _timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def measure(ocr=False):
+    """
+    Timings in seconds for this (fresh) process: per-module import, then first
+    requests. Heavy modules that were imported along the way are listed, so a
+    regression that reintroduces an eager import shows up here.
+    """
+    sys.path.insert(0, ROOT)
+    os.environ.setdefault("APPEAL_CACHE_DIR", os.path.join(ROOT, ".appeal_cache", "benchmark"))
+    timings = {}
+    for name in MODULES:
+        timings[f"import:{name}"] = _timed(lambda: __import__(name))
+
+    from denial_classifier import classify_denial
+    from document_text import extract_text
+    from identifiers import extract_identifiers
+    from prompt_trimming import trim_text
+
+    # Unique bytes, so the text cache cannot answer
+    data = (SAMPLE_DENIAL + f"\nRun {time.time_ns()}\n").encode("utf-8")
+    timings["first:extract_text_txt"] = _timed(lambda: extract_text(data, "denial.txt", "text/plain"))
+    timings["first:extract_identifiers"] = _timed(lambda: extract_identifiers(SAMPLE_DENIAL))
+    timings["first:classify_denial"] = _timed(lambda: classify_denial(SAMPLE_DENIAL))
+    timings["first:trim_text"] = _timed(lambda: trim_text(SAMPLE_DENIAL * 400, "denial_rationale"))
+    if ocr:
+        from document_text import load_ocr_model
+        timings["first:load_ocr_model"] = _timed(load_ocr_model)
+
+    heavy = [m for m in ("easyocr", "torch", "google.generativeai", "pypdfium2") if m in sys.modules]
+    return {"timings": timings, "heavy_modules_loaded": heavy}
+
+
+# ------------------ PARENT ---------------------------
+def run(runs=5, ocr=False):
+    """Run measure() in runs fresh interpreters and summarize each timing."""
+    samples = []
+    for _ in range(runs):
+        command = [sys.executable, os.path.abspath(__file__), "--child"] + (["--ocr"] if ocr else [])
+        start = time.perf_counter()
+        output = subprocess.run(command, capture_output=True, text=True, check=True, cwd=ROOT).stdout
+        sample = json.loads(output.strip().splitlines()[-1])
+        sample["timings"]["process:total"] = time.perf_counter() - start
+        samples.append(sample)
+
+    summary = {}
+    for key in samples[0]["timings"]:
+        values = [sample["timings"][key] for sample in samples]
+        summary[key] = {"median": statistics.median(values), "min": min(values), "max": max(values)}
+    return {
+        "benchmark": "startup",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "runs": runs,
+        "timings": summary,
+        "heavy_modules_loaded": samples[-1]["heavy_modules_loaded"],
+    }
+
+
+def report(result):
+    print(f"Startup benchmark, {result['runs']} runs (seconds)")
+    for key, stats in result["timings"].items():
+        print(f"  {key:32s} median {stats['median']:.4f}  min {stats['min']:.4f}  max {stats['max']:.4f}")
+    print(f"  heavy modules loaded: {', '.join(result['heavy_modules_loaded']) or 'none'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start import and first-request latency.")
+    parser.add_argument("-n", "--runs", type=int, default=5, help="fresh interpreters to measure")
+    parser.add_argument("--ocr", action="store_true", help="also time loading the EasyOCR reader")
+    parser.add_argument("-o", "--output", help="append the result as a JSON line to this file")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.ocr)))
+        return
+
+    result = run(args.runs, args.ocr)
+    report(result)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "a", encoding="utf-8") as f:
+            f.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+from denial_classifier import COMMON_REASONS, classify_denial
+from gemini_client import require_model
+from identifiers import confident_identifiers
+from letter_screen import screen_letter
+from metrics import instrumented
+from near_duplicates import find_prior, grounded_in, remember_results
+from prompt_trimming import trim_text
+from structured_output import StructuredOutputError, generate_structured
+
+# ------------------ EXTRACTION SCHEMA ----------------
+# Schema property -> display key used throughout the apps (and by draft_appeal_letter)
+CASE_FIELDS = {
+    "patient_name": "Patient Name",
+    "member_id": "Member ID",
+    "insurance_company_name": "Insurance Company Name",
+    "insurance_company_address": "Insurance Company Address",
+    "policy_number": "Policy Number",
+    "claim_number": "Claim Number",
+    "denial_date": "Denial Date",
+    "denial_reason": "Denial Reason",
+    "denial_explanation": "Denial Explanation",
+    "denial_is_genuine": "Denial Is Genuine",
+    "claim_is_genuine": "Claim Is Genuine",
+}
+
+FIELD_TYPES = {
+    "patient_name": {"type": "STRING"},
+    "member_id": {"type": "STRING"},
+    "insurance_company_name": {"type": "STRING"},
+    "insurance_company_address": {"type": "STRING"},
+    "policy_number": {"type": "STRING"},
+    "claim_number": {"type": "STRING"},
+    "denial_date": {"type": "STRING"},
+    "denial_reason": {"type": "STRING", "format": "enum", "enum": COMMON_REASONS},
+    "denial_explanation": {"type": "STRING"},
+    "denial_is_genuine": {"type": "BOOLEAN"},
+    "claim_is_genuine": {"type": "BOOLEAN"},
+}
+
+# Identifier fields come from the denial letter; the rest have their own instructions
+IDENTIFIER_PROPERTIES = [
+    "patient_name", "member_id", "insurance_company_name", "insurance_company_address",
+    "policy_number", "claim_number", "denial_date",
+]
+FIELD_INSTRUCTIONS = {
+    "denial_date": "denial_date is the date the denial notice was issued (not a date of service), formatted MM/DD/YYYY.",
+    "denial_reason": "denial_reason is the primary reason for denial, chosen from the allowed categories.",
+    "denial_explanation": "denial_explanation is a short, plain-language summary (1-2 sentences) of why the claim "
+                          "was denied. Do not quote the letter.",
+    "denial_is_genuine": "denial_is_genuine is false if the denial text is a random string, a test, or does not "
+                         "look like a real insurance denial letter.",
+    "claim_is_genuine": "claim_is_genuine is false if the claim text is a random string, a test, or does not "
+                        "look like a real doctor's claim letter.",
+}
+
+
+def case_schema(properties):
+    """
+    Build the response schema for the given subset of CASE_FIELDS properties.
+    """
+    return {
+        "type": "OBJECT",
+        "properties": {prop: FIELD_TYPES[prop] for prop in properties},
+        "required": list(properties),
+    }
+
+
+CASE_SCHEMA = case_schema(CASE_FIELDS)
+
+
+def empty_case_details():
+    """
+    Return a case-details dict with every field blank and both letters marked not genuine.
+    """
+    details = {key: "" for key in CASE_FIELDS.values()}
+    details["Denial Is Genuine"] = False
+    details["Claim Is Genuine"] = False
+    return details
+
+
+def parse_case_details(data):
+    """
+    Map a schema-shaped dict onto the display keys, filling in anything missing.
+    """
+    details = empty_case_details()
+    for prop, key in CASE_FIELDS.items():
+        value = data.get(prop)
+        if value is None:
+            continue
+        if isinstance(details[key], bool):
+            details[key] = bool(value)
+        else:
+            details[key] = str(value).strip()
+    if details["Denial Reason"] not in COMMON_REASONS:
+        details["Denial Reason"] = "Other" if details["Denial Reason"] else ""
+    return details
+
+
+# ------------------ FUSED EXTRACTION -----------------
+def case_prompt(properties, denial_text, claim_text):
+    """
+    Build the extraction prompt for the requested schema properties.
+    """
+    lines = [
+        "You are a medical insurance analyst. Read the insurance denial letter and the doctor's claim letter below "
+        "and fill in every field of the JSON schema."
+    ]
+    identifiers = [prop for prop in properties if prop in IDENTIFIER_PROPERTIES]
+    if identifiers:
+        lines.append(f"- {', '.join(identifiers)} come from the denial letter; leave a value empty if it is missing.")
+    lines.extend(f"- {FIELD_INSTRUCTIONS[prop]}" for prop in properties if prop in FIELD_INSTRUCTIONS)
+    return (
+        "\n".join(lines) + "\n\n"
+        f"Denial Letter:\n{denial_text}\n\n"
+        f"Claim Letter:\n{claim_text}\n"
+    )
+
+
+@instrumented("case_extraction")
+def extract_case_details(denial_text, claim_text=""):
+    """
+    Extract every field the apps need from the denial and claim letters in one Gemini call.
+    Returns a dict keyed by the CASE_FIELDS display names; the patient and insurance
+    keys match what extract_patient_info / extract_insurance_details used to return.
+    Labelled identifiers found locally with high confidence (see identifiers.py) and a
+    confident local denial-reason classification (see denial_classifier.py) are left out
+    of the schema, so Gemini is only asked for what the local passes missed. Long
+    letters are trimmed to their most relevant paragraphs (see prompt_trimming.py).
+    Both letters are pre-screened locally first (see letter_screen.py): a letter that is
+    clearly not genuine returns at once without any Gemini call, a clearly genuine one
+    drops its check from the schema, and only ambiguous ones are judged by the model.
+    When a near-duplicate of the denial letter was processed before (see
+    near_duplicates.py), its denial reason is reused, and its explanation too when that
+    names nothing this letter does not; Gemini is asked for the rest.
+    The response is parsed tolerantly and validated against the schema, with one
+    repair call if it is unusable (see structured_output.py); if it stays unusable, the
+    local fields are returned when both letters were accepted by the screen, and
+    StructuredOutputError is raised otherwise.
+    Raises GeminiUnavailable when the API cannot be reached, rather than returning blanks.
+    """
+    denial_screen = screen_letter(denial_text, "denial")
+    claim_screen = screen_letter(claim_text, "claim")
+    if "reject" in (denial_screen.verdict, claim_screen.verdict):
+        details = empty_case_details()
+        details["Denial Is Genuine"] = denial_screen.verdict != "reject"
+        details["Claim Is Genuine"] = claim_screen.verdict != "reject"
+        return details
+
+    local_fields = confident_identifiers(denial_text)
+    if denial_screen.verdict == "accept":
+        local_fields["Denial Is Genuine"] = True
+    if claim_screen.verdict == "accept":
+        local_fields["Claim Is Genuine"] = True
+    denial_reason, _ = classify_denial(denial_text)
+    prior = find_prior(denial_text)
+    if prior.get("denial_reason") and denial_reason in (None, prior["denial_reason"]):
+        denial_reason = prior["denial_reason"]
+        # Reused only if it names nothing this letter does not (another member's details)
+        if prior.get("denial_explanation") and grounded_in(prior["denial_explanation"], denial_text):
+            local_fields["Denial Explanation"] = prior["denial_explanation"]
+    if denial_reason:
+        local_fields["Denial Reason"] = denial_reason
+    properties = [prop for prop, key in CASE_FIELDS.items() if key not in local_fields]
+
+    model = require_model()
+    prompt = case_prompt(
+        properties,
+        trim_text(denial_text, ["identifiers", "denial_rationale"]),
+        trim_text(claim_text, "clinical_justification")
+    )
+    try:
+        details = parse_case_details(generate_structured(model, prompt, case_schema(properties)))
+    except StructuredOutputError:
+        # An unreadable response must not block letters that both passed the local
+        # screen; one the model still had to judge is not let through unchecked
+        if "ambiguous" in (denial_screen.verdict, claim_screen.verdict):
+            raise
+        details = empty_case_details()
+        details.update(local_fields)
+        return details
+    details.update(local_fields)
+    if details["Denial Is Genuine"] and details["Denial Reason"] and details["Denial Explanation"]:
+        remember_results(denial_text, denial_reason=details["Denial Reason"],
+                         denial_explanation=details["Denial Explanation"])
+    return details
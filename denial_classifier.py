@@ -0,0 +1,258 @@
+import os
+import re
+import threading
+
+import numpy as np
+
+# ------------------ DENIAL CATEGORIES ----------------
+COMMON_REASONS = [
+    "Not Medically Necessary",
+    "Experimental Treatment",
+    "Coverage Exclusion",
+    "Incomplete Documentation",
+    "Out of Network",
+    "Pre-Authorization Required",
+    "Benefit Maximum Reached",
+    "Other"
+]
+
+# ------------------ SETTINGS -------------------------
+# Below this probability, or this lead over the runner-up, the category is left to Gemini.
+# Both were chosen with benchmarks/classifier.py on held-out letters, including reasons
+# no seed covers, for 95% precision on the letters decided locally.
+CLASSIFIER_THRESHOLD = float(os.environ.get("APPEAL_CLASSIFIER_THRESHOLD", "0.8"))
+# (the margin only matters below a threshold of 0.5; 0 disables it)
+CLASSIFIER_MARGIN = float(os.environ.get("APPEAL_CLASSIFIER_MARGIN", "0.0"))
+# Optional trained model (see DenialReasonClassifier.save); the seed model is used otherwise
+CLASSIFIER_MODEL_PATH = os.environ.get("APPEAL_CLASSIFIER_MODEL", "")
+# Softmax temperature over cosine similarities, fitted by calibrate() in benchmarks/classifier.py
+DEFAULT_TEMPERATURE = 15.1
+
+# Typical denial wording per category, used to build the default model
+SEED_EXAMPLES = {
+    "Not Medically Necessary": [
+        "the requested service is not medically necessary",
+        "does not meet medical necessity criteria",
+        "medical necessity has not been established for this treatment",
+        "the clinical information does not support the medical necessity of the procedure",
+        "services were determined to be not medically necessary based on our clinical guidelines",
+        "a less intensive level of care would be appropriate",
+    ],
+    "Experimental Treatment": [
+        "the treatment is considered experimental or investigational",
+        "this procedure is investigational and not proven effective",
+        "the service is experimental and not approved by the FDA for this indication",
+        "insufficient evidence in peer-reviewed literature to support efficacy, considered investigational",
+        "clinical trial or unproven therapy is not covered",
+    ],
+    "Coverage Exclusion": [
+        "this service is excluded under your plan",
+        "the benefit is not covered under the terms of your policy",
+        "your plan specifically excludes coverage for this service",
+        "non-covered service per the exclusions section of the evidence of coverage",
+        "cosmetic procedures are excluded from coverage",
+    ],
+    "Incomplete Documentation": [
+        "we did not receive the medical records needed to review this claim",
+        "insufficient documentation was submitted",
+        "missing information required to process the claim",
+        "please submit the requested clinical notes and records",
+        "the claim lacks supporting documentation",
+    ],
+    "Out of Network": [
+        "the provider is not in network for your plan",
+        "services from an out-of-network provider are not covered",
+        "non-participating provider, out of network benefits do not apply",
+        "you received care from a provider outside your plan network",
+    ],
+    "Pre-Authorization Required": [
+        "prior authorization was not obtained before the service",
+        "this service requires pre-authorization",
+        "no precertification on file for this procedure",
+        "the required prior approval was not requested",
+        "authorization was not obtained prior to admission",
+    ],
+    "Benefit Maximum Reached": [
+        "the annual benefit maximum has been reached",
+        "you have exhausted the benefit limit for this service",
+        "visit limit reached for the plan year",
+        "the lifetime maximum for this benefit has been met",
+        "maximum number of covered sessions has been used",
+    ],
+    # Administrative denials none of the categories above describe
+    "Other": [
+        "the claim was received after the filing deadline",
+        "this is a duplicate of a previously processed claim",
+        "coverage was not in effect for the member on that date",
+        "another insurer is primary under coordination of benefits",
+        "the billing code submitted is invalid or does not match the diagnosis",
+        "the member is not enrolled in this plan",
+    ],
+}
+
+_TOKEN = re.compile(r"[a-z]+")
+_SENTENCE = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
+# Words of the sentence that states why the claim was denied
+_REASON_CUE = re.compile(
+    r"\b(?:den(?:ied|ial|y|ying)|because|reason|due[ \t]+to|determined|unable[ \t]+to[ \t]+(?:pay|approve|cover))\b",
+    re.IGNORECASE,
+)
+_STOPWORDS = frozenset(
+    "a an and are as at be been by for from has have in is it of on or our the this to was we were with you your".split()
+)
+
+
+def tokenize(text):
+    """Lower-cased unigrams and bigrams, stopwords removed."""
+    words = [w for w in _TOKEN.findall(text.lower()) if w not in _STOPWORDS]
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+# ------------------ CLASSIFIER -----------------------
+class DenialReasonClassifier:
+    """
+    TF-IDF nearest-centroid classifier over the COMMON_REASONS categories.
+    Scores are cosine similarities to each category centroid, turned into
+    probabilities with a temperature-scaled softmax.
+    """
+
+    def __init__(self, vocabulary, idf, centroids, categories, temperature=DEFAULT_TEMPERATURE):
+        self.vocabulary = vocabulary  # term -> column
+        self.idf = idf
+        self.centroids = centroids  # (categories, terms), rows L2-normalized
+        self.categories = list(categories)
+        self.temperature = temperature
+
+    @classmethod
+    def train(cls, examples, temperature=DEFAULT_TEMPERATURE):
+        """
+        Fit from (text, category) pairs; categories must be in COMMON_REASONS.
+        """
+        unknown = {category for _, category in examples} - set(COMMON_REASONS)
+        if unknown:
+            raise ValueError(f"Unknown categories: {', '.join(sorted(unknown))}")
+        documents = [tokenize(text) for text, _ in examples]
+        vocabulary = {}
+        for tokens in documents:
+            for token in tokens:
+                vocabulary.setdefault(token, len(vocabulary))
+        counts = cls._count_matrix(documents, vocabulary)
+        document_frequency = (counts > 0).sum(axis=0)
+        idf = np.log((1 + len(documents)) / (1 + document_frequency)) + 1.0
+
+        categories = [c for c in COMMON_REASONS if any(label == c for _, label in examples)]
+        labels = np.array([categories.index(category) for _, category in examples])
+        vectors = cls._normalize(np.log1p(counts) * idf)
+        centroids = np.vstack([vectors[labels == k].mean(axis=0) for k in range(len(categories))])
+        return cls(vocabulary, idf, cls._normalize(centroids), categories, temperature)
+
+    @staticmethod
+    def _count_matrix(documents, vocabulary):
+        counts = np.zeros((len(documents), len(vocabulary)))
+        for row, tokens in enumerate(documents):
+            columns = [vocabulary[t] for t in tokens if t in vocabulary]
+            np.add.at(counts[row], columns, 1.0)
+        return counts
+
+    @staticmethod
+    def _normalize(matrix):
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1.0, norms)
+
+    def vectorize(self, texts):
+        """L2-normalized TF-IDF rows for texts, over the training vocabulary."""
+        counts = self._count_matrix([tokenize(t) for t in texts], self.vocabulary)
+        return self._normalize(np.log1p(counts) * self.idf)
+
+    def predict_proba(self, texts, temperature=None):
+        """(len(texts), len(categories)) matrix of category probabilities."""
+        logits = self.vectorize(texts) @ self.centroids.T * (temperature or self.temperature)
+        logits -= logits.max(axis=1, keepdims=True)
+        weights = np.exp(logits)
+        return weights / weights.sum(axis=1, keepdims=True)
+
+    def statement(self, text):
+        """
+        The sentence of a letter that states the denial reason: of the sentences with a
+        reason cue ("denied because ...", or all of them when none has one), the one
+        closest to a category. Scoring the whole letter would let its boilerplate
+        (claim numbers, appeal rights, "send any additional records") decide.
+        """
+        sentences = [" ".join(s.split()) for s in _SENTENCE.split(text or "") if s.strip()]
+        if len(sentences) <= 1:
+            return text or ""
+        candidates = [s for s in sentences if _REASON_CUE.search(s)] or sentences
+        similarities = self.vectorize(candidates) @ self.centroids.T
+        return candidates[int(similarities.max(axis=1).argmax())]
+
+    def rank(self, text):
+        """[(category, probability), ...] for one letter, most likely first."""
+        probabilities = self.predict_proba([self.statement(text)])[0]
+        order = np.argsort(probabilities)[::-1]
+        return [(self.categories[i], float(probabilities[i])) for i in order]
+
+    def classify(self, text):
+        """Return (category, probability) for one letter."""
+        return self.rank(text)[0]
+
+    def calibrate(self, examples, temperatures=None):
+        """
+        Pick the softmax temperature that minimizes log-loss on held-out (text, category)
+        pairs, so classify() probabilities can be compared against a threshold.
+        """
+        temperatures = np.geomspace(1, 100, 40) if temperatures is None else temperatures
+        texts = [self.statement(text) for text, _ in examples]
+        labels = np.array([self.categories.index(category) for _, category in examples])
+        similarities = self.vectorize(texts) @ self.centroids.T
+        losses = []
+        for temperature in temperatures:
+            logits = similarities * temperature
+            logits -= logits.max(axis=1, keepdims=True)
+            log_probabilities = logits - np.log(np.exp(logits).sum(axis=1, keepdims=True))
+            losses.append(-log_probabilities[np.arange(len(labels)), labels].mean())
+        self.temperature = float(temperatures[int(np.argmin(losses))])
+        return self.temperature
+
+    def save(self, path):
+        terms = sorted(self.vocabulary, key=self.vocabulary.get)
+        np.savez_compressed(path, terms=np.array(terms), idf=self.idf, centroids=self.centroids,
+                            categories=np.array(self.categories), temperature=self.temperature)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path, allow_pickle=False)
+        vocabulary = {term: i for i, term in enumerate(data["terms"].tolist())}
+        return cls(vocabulary, data["idf"], data["centroids"], data["categories"].tolist(),
+                   float(data["temperature"]))
+
+
+# ------------------ DEFAULT MODEL --------------------
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_classifier():
+    """The process-wide classifier: APPEAL_CLASSIFIER_MODEL if set, else the seed model."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            if CLASSIFIER_MODEL_PATH:
+                _default = DenialReasonClassifier.load(CLASSIFIER_MODEL_PATH)
+            else:
+                _default = DenialReasonClassifier.train(
+                    [(text, category) for category, texts in SEED_EXAMPLES.items() for text in texts]
+                )
+    return _default
+
+
+def classify_denial(denial_text, threshold=CLASSIFIER_THRESHOLD, margin=CLASSIFIER_MARGIN):
+    """
+    Classify the denial reason locally. Returns (category, probability) when the
+    probability reaches threshold and leads the runner-up by margin, or
+    (None, probability) when Gemini should decide.
+    """
+    ranked = default_classifier().rank(denial_text)
+    (category, probability), runner_up = ranked[0], ranked[1][1] if len(ranked) > 1 else 0.0
+    if probability < threshold or probability - runner_up < margin:
+        return None, probability
+    return category, probability
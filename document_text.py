@@ -0,0 +1,340 @@
+import codecs
+import hashlib
+import io
+import mmap
+import multiprocessing
+import os
+import contextvars
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from itertools import repeat
+
+import PyPDF2
+
+from metrics import record_cache, stage
+from ocr import OCR_TARGET_DPI, decoded_bytes, deskew, ocr_array, ocr_image_bytes
+from tiered_cache import TieredCache
+from upload_limits import SpooledUpload, UploadRejected, content_digest, memory_budget
+
+# ------------------ SETTINGS -------------------------
+# Bump whenever extraction output changes so stale cached text is not reused
+EXTRACTOR_VERSION = "3"
+TEXT_CACHE_ENTRIES = int(os.environ.get("APPEAL_TEXT_CACHE_ENTRIES", "128"))
+# Optional disk spill, e.g. APPEAL_TEXT_CACHE_DIR=.appeal_cache
+TEXT_CACHE_DIR = os.environ.get("APPEAL_TEXT_CACHE_DIR", "")
+
+# Set APPEAL_OCR_WARMUP=1 to load the OCR reader in the background at startup
+OCR_WARMUP = os.environ.get("APPEAL_OCR_WARMUP", "0") == "1"
+
+# Pages beyond this are not extracted
+PDF_MAX_PAGES = int(os.environ.get("APPEAL_PDF_MAX_PAGES", "100"))
+# Processes reading the text layer of large PDFs (OCR always runs in the app process)
+PDF_WORKERS = int(os.environ.get("APPEAL_PDF_WORKERS", str(os.cpu_count() or 1)))
+# Threads OCR'ing the scanned pages of one PDF at once, sharing the one OCR reader
+OCR_WORKERS = int(os.environ.get("APPEAL_OCR_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Pages handed to one pool task; PDFs with a single task's worth are extracted in-process
+PDF_PAGES_PER_TASK = 4
+# A page with fewer characters than this is treated as scanned and OCR'd
+MIN_PAGE_CHARS = 20
+# Working memory of one scanned page: a US Letter page rendered at the OCR
+# resolution, plus the deskewed copy and OCR temporaries
+PAGE_WORKING_BYTES = int(8.5 * OCR_TARGET_DPI) * int(11 * OCR_TARGET_DPI) * 4
+
+# Process-wide, so every Streamlit session shares the same extractions
+text_cache = TieredCache(
+    path=os.path.join(TEXT_CACHE_DIR, "cache.sqlite3") if TEXT_CACHE_DIR else None,
+    namespace="text",
+    max_entries=TEXT_CACHE_ENTRIES,
+)
+
+# ------------------ OCR LOADER -----------------------
+_ocr_reader = None
+_ocr_lock = threading.Lock()
+_warmup_thread = None
+_warmup_lock = threading.Lock()
+
+
+def load_ocr_model():
+    """
+    Load the EasyOCR reader once per process. easyocr (and torch with it) is only
+    imported here, so text files and digital PDFs never pay for it.
+    """
+    global _ocr_reader
+    with _ocr_lock:
+        if _ocr_reader is None:
+            with stage("ocr_model_load"):
+                import easyocr
+                _ocr_reader = easyocr.Reader(['en'])
+    return _ocr_reader
+
+
+def warm_up_ocr(force=False):
+    """
+    Start loading the OCR reader in a daemon thread, if APPEAL_OCR_WARMUP is set (or
+    force), so the first scanned upload does not wait for it. Safe to call on every
+    Streamlit rerun; returns the warm-up thread, or None when warm-up is off.
+    """
+    global _warmup_thread
+    if not (OCR_WARMUP or force):
+        return None
+    with _warmup_lock:  # not _ocr_lock, which is held for the whole model load
+        if _warmup_thread is None:
+            _warmup_thread = threading.Thread(target=_warm_up, name="ocr-warmup", daemon=True)
+            _warmup_thread.start()
+    return _warmup_thread
+
+
+def _warm_up():
+    try:
+        load_ocr_model()
+    except Exception:
+        pass  # OCR is retried, and its error surfaced, on first real use
+
+
+def _pdfium():
+    """pypdfium2, or None if it is not installed (pages with no text layer stay empty)."""
+    try:
+        import pypdfium2
+    except ImportError:
+        return None
+    return pypdfium2
+
+
+# ------------------ PDF PAGES ------------------------
+_pdf_pool = None
+_pdf_pool_lock = threading.Lock()
+_ocr_pool = None
+# pdfium is not thread-safe: pages are rendered one at a time, then OCR'd in parallel
+_pdfium_lock = threading.Lock()
+
+
+def _get_pdf_pool():
+    # spawn, not fork: the Streamlit server process is multi-threaded
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            _pdf_pool = ProcessPoolExecutor(max_workers=PDF_WORKERS,
+                                            mp_context=multiprocessing.get_context("spawn"))
+    return _pdf_pool
+
+
+def _get_ocr_pool():
+    # Threads, not processes: EasyOCR inference releases the GIL, and every worker
+    # process would load its own model outside the memory budget
+    global _ocr_pool
+    with _pdf_pool_lock:
+        if _ocr_pool is None:
+            _ocr_pool = ThreadPoolExecutor(max_workers=OCR_WORKERS, thread_name_prefix="appeal-ocr")
+    return _ocr_pool
+
+
+@contextmanager
+def _pdf_reader(source):
+    """
+    A PyPDF2 reader over PDF bytes or a file path. A file is memory-mapped rather
+    than read in (PdfReader(path) would load it whole), so pages are paged in from
+    disk as they are parsed.
+    """
+    if isinstance(source, bytes):
+        yield PyPDF2.PdfReader(io.BytesIO(source))
+        return
+    with open(source, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+        yield PyPDF2.PdfReader(view)
+
+
+def _ocr_pdf_page(source, index):
+    """Rasterize one PDF page and OCR it; returns "" if pypdfium2 is not installed."""
+    pdfium = _pdfium()
+    if pdfium is None:
+        return ""
+    with _pdfium_lock:
+        pdf = pdfium.PdfDocument(source)  # reads a path incrementally, page by page
+        try:
+            # Rendered straight at the OCR resolution, so only deskewing is left to do
+            image = pdf[index].render(scale=OCR_TARGET_DPI / 72, grayscale=True).to_numpy()
+        finally:
+            pdf.close()
+    reader = load_ocr_model()
+    with stage("ocr_pdf_page"):
+        return ocr_array(reader, deskew(image)).text
+
+
+def _text_layer_pages(source, indices):
+    """Text layer of the given pages; "" (or next to nothing) for scanned ones."""
+    with _pdf_reader(source) as pdf_reader:
+        return [pdf_reader.pages[index].extract_text() or "" for index in indices]
+
+
+def _ocr_pdf_pages(source, indices, parallel=1):
+    if parallel <= 1 or len(indices) <= 1:
+        return [_ocr_pdf_page(source, index) for index in indices]
+    # At most parallel pages in flight, so no more renders exist than were reserved
+    results = [None] * len(indices)
+    pool = _get_ocr_pool()
+    for start in range(0, len(indices), parallel):
+        batch = indices[start:start + parallel]
+        futures = [pool.submit(contextvars.copy_context().run, _ocr_pdf_page, source, index)
+                   for index in batch]
+        for offset, future in enumerate(futures):
+            results[start + offset] = future.result()
+    return results
+
+
+def _page_chunks(indices, source):
+    """
+    Page ranges for the pool. A path is cheap to send, so ranges are small and keep
+    every worker busy; bytes are split into one range per worker, so a worker is sent
+    the document once rather than with every range.
+    """
+    size = PDF_PAGES_PER_TASK
+    if isinstance(source, bytes):
+        workers = min(PDF_WORKERS, -(-len(indices) // PDF_PAGES_PER_TASK))
+        size = -(-len(indices) // workers)
+    return [indices[i:i + size] for i in range(0, len(indices), size)]
+
+
+@contextmanager
+def _reserve_renders(count, session):
+    """
+    Reserve the working memory of count page renders at once, or of one when the
+    budget cannot spare that many. Yields how many pages may be OCR'd in parallel.
+    """
+    with ExitStack() as stack:
+        try:
+            stack.enter_context(memory_budget.reserve(PAGE_WORKING_BYTES * count, session))
+        except UploadRejected:
+            if count <= 1:
+                raise
+            count = 1
+            stack.enter_context(memory_budget.reserve(PAGE_WORKING_BYTES, session))
+        yield count
+
+
+def extract_pdf_text(source, session=None):
+    """
+    Extract text from the first PDF_MAX_PAGES pages of a PDF (bytes or a file path).
+    The text layer is read first, with the page ranges of larger PDFs spread over
+    a process pool, which is handed the path of a spooled upload rather than its
+    bytes. Pages without one are then rasterized and OCR'd on up to OCR_WORKERS
+    threads in this process, sharing its one OCR reader, with the memory for those
+    renders reserved against the budget (see upload_limits.memory_budget) only
+    while OCR runs.
+    """
+    with _pdf_reader(source) as pdf_reader:
+        page_count = min(len(pdf_reader.pages), PDF_MAX_PAGES)
+    indices = list(range(page_count))
+    in_process = page_count <= PDF_PAGES_PER_TASK or PDF_WORKERS <= 1
+    if in_process:
+        texts = _text_layer_pages(source, indices)
+    else:
+        results = _get_pdf_pool().map(_text_layer_pages, repeat(source), _page_chunks(indices, source))
+        texts = [text for chunk in results for text in chunk]
+
+    scanned = [index for index, text in enumerate(texts) if len(text.strip()) < MIN_PAGE_CHARS]
+    if scanned and _pdfium() is not None:
+        with _reserve_renders(min(OCR_WORKERS, len(scanned)), session) as parallel:
+            ocr_texts = _ocr_pdf_pages(source, scanned, parallel)
+        for index, text in zip(scanned, ocr_texts):
+            texts[index] = text or texts[index]
+    return "\n".join(texts)
+
+
+# ------------------ FILE PROCESSOR -------------------
+def text_cache_key(content_digest, filename, file_type):
+    """
+    Hash of the file's SHA-256 content digest plus everything that selects the
+    extraction branch.
+    """
+    extension = os.path.splitext(filename.lower())[1]
+    key = f"{EXTRACTOR_VERSION}\0{file_type}\0{extension}\0{content_digest}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def _is_pdf(filename, file_type):
+    return file_type == 'application/pdf' or filename.lower().endswith('.pdf')
+
+
+def _is_text(filename, file_type):
+    return file_type == 'text/plain' or filename.lower().endswith('.txt')
+
+
+def working_bytes(upload, filename, file_type):
+    """
+    Estimated peak memory to extract a SpooledUpload: what it holds in memory plus,
+    for an image, its decoded pixels (from the header alone) and their preprocessed
+    copies; for text, the decoded string. PDFs reserve page renders separately, and
+    only for pages that need OCR (see extract_pdf_text).
+    """
+    if file_type.startswith('image/'):
+        return upload.memory_bytes + 3 * decoded_bytes(upload.open())
+    if _is_text(filename, file_type):
+        return upload.memory_bytes + 2 * upload.size
+    return upload.memory_bytes
+
+
+def extract_text(source, filename, file_type, session=None):
+    """
+    Extract text from a PDF, image, or plain text file, given as bytes or a binary
+    file object. The content is hashed in chunks and the text cache checked first;
+    only on a miss is a file object spooled (to disk past APPEAL_SPOOL_MEMORY_MB,
+    see upload_limits.SpooledUpload), so a Streamlit rerun with a cached upload
+    copies nothing. Extraction reserves
+    its estimated working memory against the per-session and global budgets, so
+    UploadRejected is raised for files over the upload limit or when the budget is
+    used up.
+    Results are memoized by content hash, so re-uploads and reruns skip PDF parsing and OCR.
+    """
+    with stage("extract_text"):
+        digest = content_digest(source)
+        if digest is not None:
+            key = text_cache_key(digest, filename, file_type)
+            cached = text_cache.get(key)
+            record_cache(cached is not None)
+            if cached is not None:
+                return cached
+        with SpooledUpload(source, digest=digest) as upload:
+            if digest is None:  # a stream that cannot be rewound: hashed while spooling
+                key = text_cache_key(upload.digest, filename, file_type)
+                cached = text_cache.get(key)
+                record_cache(cached is not None)
+                if cached is not None:
+                    return cached
+            with memory_budget.reserve(working_bytes(upload, filename, file_type), session):
+                text = _extract_uncached(upload, filename, file_type, session)
+        text_cache.set(key, text)
+        return text
+
+
+def _extract_uncached(upload, filename, file_type, session=None):
+    # Handle PDF files: a path when spooled, so nothing loads the whole file
+    if _is_pdf(filename, file_type):
+        with stage("pdf_extract"):
+            return extract_pdf_text(upload.source(), session)
+
+    # Handle image files (jpg, jpeg, png): downsampled, deskewed, in reading order
+    elif file_type.startswith('image/'):
+        reader = load_ocr_model()
+        with stage("ocr_image"):
+            return ocr_image_bytes(reader, upload.open()).text
+
+    # Handle plain text files, decoded chunk by chunk
+    elif _is_text(filename, file_type):
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        parts = [decoder.decode(chunk) for chunk in upload.chunks()]
+        parts.append(decoder.decode(b"", final=True))
+        return "".join(parts)
+
+    # Unsupported format
+    return "Unsupported file type."
+
+
+def extract_text_from_file(uploaded_file, session=None):
+    """
+    Extract text from an uploaded PDF, image, or plain text file, streaming it from
+    the upload rather than copying it (see extract_text). Raises UploadRejected.
+    """
+    if uploaded_file is None:
+        return ""
+    uploaded_file.seek(0)
+    return extract_text(uploaded_file, uploaded_file.name, uploaded_file.type or "", session=session)
@@ -0,0 +1,127 @@
+import os
+import signal
+import threading
+import time
+
+from dotenv import load_dotenv, find_dotenv
+
+from resilience import GeminiUnavailable
+
+DEFAULT_MODEL = 'gemini-2.0-flash'
+# Seconds between checks of the .env file's modification time (see get_api_key)
+ENV_CHECK_INTERVAL = float(os.environ.get("APPEAL_ENV_CHECK_INTERVAL", "5"))
+
+# ------------------ CLIENT REGISTRY ------------------
+# .env is read and genai configured once per process; the configured client (and its
+# underlying channel) is then shared by every model handed out below. It is read again
+# when the file changes (checked every ENV_CHECK_INTERVAL seconds, which is how the
+# Streamlit apps pick up a new key) or on SIGHUP in the CLIs (install_reload_signal).
+_lock = threading.Lock()
+_loaded = False
+_api_key = None
+_models = {}
+# Set by the reload signal handler; the reload itself happens on the next lookup,
+# outside the handler, so a signal arriving while _lock is held cannot deadlock
+_reload_requested = threading.Event()
+_env_path = ""
+_env_mtime = None
+_next_env_check = 0.0
+
+
+def _env_file_mtime(path):
+    try:
+        return os.stat(path).st_mtime if path else None
+    except OSError:
+        return None
+
+
+def _env_changed():
+    """True when the .env file was created, edited or removed since it was last read."""
+    global _next_env_check
+    now = time.monotonic()
+    if now < _next_env_check:
+        return False
+    _next_env_check = now + ENV_CHECK_INTERVAL
+    return _env_file_mtime(_env_path or find_dotenv()) != _env_mtime
+
+
+def _load_locked():
+    global _loaded, _api_key, _env_path, _env_mtime, _next_env_check
+    _env_path = find_dotenv()
+    _env_mtime = _env_file_mtime(_env_path)
+    _next_env_check = time.monotonic() + ENV_CHECK_INTERVAL
+    load_dotenv(_env_path, override=True)
+    _api_key = os.environ.get("GOOGLE_API_KEY")
+    if _api_key:
+        # Imported here: google.generativeai takes most of a second to import
+        import google.generativeai as genai
+        genai.configure(api_key=_api_key)
+    _models.clear()
+    _loaded = True
+
+
+def get_api_key():
+    """
+    Return the Google API key, loading .env and configuring genai on first use, and
+    again after a reload signal or a change to the .env file.
+    """
+    if _loaded and _env_changed():
+        _reload_requested.set()
+    if not _loaded or _reload_requested.is_set():
+        with _lock:
+            if _reload_requested.is_set():
+                _reload_requested.clear()
+                _load_locked()
+            elif not _loaded:
+                _load_locked()
+    return _api_key
+
+
+def get_model(model_name=DEFAULT_MODEL):
+    """
+    Return the shared GenerativeModel for model_name, or None if no API key is configured.
+    """
+    if not get_api_key():
+        return None
+    model = _models.get(model_name)
+    if model is not None:
+        return model
+    with _lock:
+        model = _models.get(model_name)
+        if model is None:
+            import google.generativeai as genai
+            model = genai.GenerativeModel(model_name)
+            _models[model_name] = model
+    return model
+
+
+def require_model(model_name=DEFAULT_MODEL):
+    """
+    Like get_model, but raise GeminiUnavailable when no API key is configured.
+    """
+    model = get_model(model_name)
+    if model is None:
+        raise GeminiUnavailable("Google API key not found in environment.")
+    return model
+
+
+def reload_config():
+    """
+    Re-read .env and reconfigure genai. Models created before the reload are dropped.
+    This is the only way the configuration changes after first use.
+    """
+    with _lock:
+        _load_locked()
+
+
+def install_reload_signal(signum=getattr(signal, "SIGHUP", None)):
+    """
+    Reload the configuration when the process receives signum (SIGHUP by default).
+    The handler only flags the reload; it is carried out by the next get_model or
+    get_api_key call. Returns False where signals are unavailable (Windows, or off the main thread,
+    e.g. inside a Streamlit script run).
+    """
+    if signum is None or threading.current_thread() is not threading.main_thread():
+        return False
+    signal.signal(signum, lambda *_: _reload_requested.set())
+    return True
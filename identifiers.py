@@ -0,0 +1,101 @@
+import re
+
+# ------------------ LABEL PATTERNS -------------------
+# Accept a field found locally (and skip asking Gemini for it) at or above this confidence
+CONFIDENCE_THRESHOLD = 0.8
+
+# A colon may be followed by one line break, as faxed forms often put the value on the
+# next line, unless that line is another "Label: value" (an empty field)
+_SEP = r"[ \t]*(?:[:#]|\bno\b\.?|\bnumber\b)?[ \t]*(?:[:#][ \t]*(?:\r?\n[ \t]*(?![^\r\n:]*:))?)?"
+_ID_VALUE = r"(?P<{}>[A-Z0-9][A-Z0-9\-/]{{2,29}})\b"
+# Words that end a name: the next label on the line ("John Smith DOB 01/02/1980")
+_NAME_STOP = r"(?!(?:dob|d\.o\.b|id|member|mrn|ssn|date|policy|claim|group|account|birth|acct)\b)"
+_NAME_VALUE = (r"(?P<{}>" + _NAME_STOP + r"[A-Z][A-Za-z'\-]+"
+               r"(?:[ \t]+" + _NAME_STOP + r"[A-Z][A-Za-z'\-]*\.?){{1,3}})")
+_DATE_VALUE = (r"(?P<{}>\d{{1,2}}[-/]\d{{1,2}}[-/]\d{{2,4}}"
+               r"|[A-Z][a-z]{{2,8}}\.?[ \t]+\d{{1,2}},?[ \t]+\d{{4}}"
+               r"|\d{{1,2}}[ \t]+[A-Z][a-z]{{2,8}}[ \t]+\d{{4}})")
+
+# (field, label alternatives, value pattern, label confidence); a field may have several
+_FIELDS = [
+    ("Member ID", r"member[ \t]*id(?:entification)?|subscriber[ \t]*id|member[ \t]*(?:no\b\.?|number|#)|id[ \t]*(?:no\b\.?|number|#)",
+     _ID_VALUE, 0.95),
+    ("Policy Number", r"policy(?:[ \t]*(?:no\b\.?|number|#|id))?",
+     _ID_VALUE, 0.9),
+    ("Claim Number", r"claim(?:[ \t]*(?:no\b\.?|number|#|id|reference))|reference[ \t]*(?:no\b\.?|number|#)",
+     _ID_VALUE, 0.95),
+    ("Patient Name", r"patient(?:[ \t]*name)?|member[ \t]*name",
+     _NAME_VALUE, 0.85),
+    # "RE:" is as often a subject line ("RE: Notice of Adverse Benefit Determination") as
+    # a name, so it stays below CONFIDENCE_THRESHOLD and Gemini is still asked
+    ("Patient Name", r"re",
+     _NAME_VALUE, 0.6),
+    ("Denial Date", r"date[ \t]*of[ \t]*(?:denial|notice|determination|decision|letter)|(?:denial|notice|determination|decision)[ \t]*date",
+     _DATE_VALUE, 0.9),
+]
+
+_GROUPS = {}  # regex group name -> (field, label confidence)
+_parts = []
+for _index, (_field, _labels, _value, _confidence) in enumerate(_FIELDS):
+    _group = f"f{_index}"
+    _GROUPS[_group] = (_field, _confidence)
+    _parts.append(rf"\b(?:{_labels}){_SEP}{_value.format(_group)}")
+
+# One alternation over every labelled field, so the text is scanned once
+IDENTIFIER_PATTERN = re.compile("|".join(f"(?:{part})" for part in _parts), re.IGNORECASE)
+_NAME_CHECK = re.compile(r"[A-Z][A-Za-z'\-]+(?:[ \t]+[A-Z][A-Za-z'\-]*\.?){1,3}")
+_STOPWORDS = {"INFORMATION", "DETAILS", "NAME", "NUMBER", "DATE", "SERVICE", "CLAIM", "POLICY", "MEMBER"}
+
+
+def _value_confidence(field, value):
+    """Adjust for how much the captured value looks like the field it claims to be."""
+    if field == "Patient Name":
+        # The value group is case-insensitive; require real capitalisation
+        if not _NAME_CHECK.fullmatch(value) or value.split()[0].upper() in _STOPWORDS:
+            return 0.0
+        return 1.0
+    if field == "Denial Date":
+        return 1.0
+    if value.upper() in _STOPWORDS or not any(ch.isdigit() for ch in value):
+        return 0.3
+    return 1.0 if len(value) >= 5 else 0.7
+
+
+# ------------------ EXTRACTION -----------------------
+def extract_identifiers(text):
+    """
+    Pull labelled identifiers ("Member ID:", "Claim #", "Policy No." ...) out of text in a
+    single regex pass. Returns {field: (value, confidence)} for every field found; when a
+    field appears with conflicting values the first is kept at reduced confidence, unless
+    it came from a weak label ("RE:") and the later one is confident.
+    """
+    found = {}
+    conflicted = set()
+    for match in IDENTIFIER_PATTERN.finditer(text or ""):
+        group = match.lastgroup
+        field, label_confidence = _GROUPS[group]
+        value = match.group(group).strip().rstrip(".,;")
+        confidence = label_confidence * _value_confidence(field, value)
+        if confidence < 0.5:
+            continue  # label followed by something that is not a value ("Policy number: see enclosed")
+        if field not in found:
+            found[field] = (value, confidence)
+        elif found[field][0].upper() == value.upper():
+            if field not in conflicted and confidence > found[field][1]:
+                found[field] = (found[field][0], confidence)
+        else:
+            first_value, first_confidence = found[field]
+            if field not in conflicted and first_confidence < CONFIDENCE_THRESHOLD <= confidence:
+                found[field] = (value, confidence)
+            else:
+                conflicted.add(field)
+                found[field] = (first_value, min(first_confidence, 0.6))
+    return found
+
+
+def confident_identifiers(text, threshold=CONFIDENCE_THRESHOLD):
+    """
+    Return {field: value} for the identifiers extract_identifiers is confident about.
+    """
+    return {field: value for field, (value, confidence) in extract_identifiers(text).items()
+            if confidence >= threshold}
@@ -0,0 +1,256 @@
+import hashlib
+import io
+import os
+import re
+
+from tiered_cache import TieredCache
+
+# ------------------ SETTINGS -------------------------
+# Bump whenever rendering changes so stale cached files are not served
+EXPORT_VERSION = "1"
+EXPORT_CACHE_ENTRIES = int(os.environ.get("APPEAL_EXPORT_CACHE_ENTRIES", "64"))
+
+DOCX_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+PDF_MIME = "application/pdf"
+
+# Rendered files by letter hash, so repeated downloads (and Streamlit reruns) are free
+export_cache = TieredCache(namespace="export", max_entries=EXPORT_CACHE_ENTRIES)
+
+
+# ------------------ LETTER STRUCTURE -----------------
+_HEADING = re.compile(r"^(#{1,3})\s+(.*)$")
+_BULLET = re.compile(r"^\s*(?:[-*•])\s+(.*)$")
+_NUMBERED = re.compile(r"^\s*\d+[.)]\s+(.*)$")
+_INLINE = re.compile(r"\*\*(.+?)\*\*|__(.+?)__|\*(.+?)\*|(?<!\w)_(.+?)_(?!\w)")
+
+
+def inline_runs(text):
+    """Split **bold** and *italic* markup into (text, bold, italic) runs."""
+    runs = []
+    position = 0
+    for match in _INLINE.finditer(text):
+        if match.start() > position:
+            runs.append((text[position:match.start()], False, False))
+        bold = match.group(1) or match.group(2)
+        runs.append((bold, True, False) if bold else (match.group(3) or match.group(4), False, True))
+        position = match.end()
+    if position < len(text):
+        runs.append((text[position:], False, False))
+    return runs
+
+
+def parse_letter(text):
+    """
+    Turn the Markdown-ish letter Gemini writes into blocks:
+    ("heading", level, runs), ("bullet", runs), ("numbered", runs) and
+    ("paragraph", lines), where lines is a list of runs. Consecutive lines form one
+    paragraph (an address block stays together); blank lines separate paragraphs.
+    """
+    blocks = []
+    lines = []
+
+    def flush():
+        if lines:
+            blocks.append(("paragraph", list(lines)))
+            lines.clear()
+
+    for raw in (text or "").splitlines():
+        line = raw.rstrip()
+        if not line.strip():
+            flush()
+            continue
+        heading = _HEADING.match(line)
+        bullet = _BULLET.match(line)
+        numbered = _NUMBERED.match(line)
+        if heading:
+            flush()
+            blocks.append(("heading", len(heading.group(1)), inline_runs(heading.group(2))))
+        elif bullet:
+            flush()
+            blocks.append(("bullet", inline_runs(bullet.group(1))))
+        elif numbered:
+            flush()
+            blocks.append(("numbered", inline_runs(numbered.group(1))))
+        else:
+            lines.append(inline_runs(line.strip()))
+    flush()
+    return blocks
+
+
+# ------------------ DOCX -----------------------------
+def render_docx(text):
+    """Render the letter to .docx bytes, entirely in memory."""
+    from docx import Document
+
+    doc = Document()
+    for block in parse_letter(text):
+        kind = block[0]
+        if kind == "heading":
+            paragraph = doc.add_heading("", level=block[1])
+            _add_runs(paragraph, block[2])
+        elif kind in ("bullet", "numbered"):
+            paragraph = doc.add_paragraph(style="List Bullet" if kind == "bullet" else "List Number")
+            _add_runs(paragraph, block[1])
+        else:
+            paragraph = doc.add_paragraph()
+            for index, runs in enumerate(block[1]):
+                if index:
+                    paragraph.add_run().add_break()
+                _add_runs(paragraph, runs)
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def _add_runs(paragraph, runs):
+    for text, bold, italic in runs:
+        run = paragraph.add_run(text)
+        run.bold = bold or None
+        run.italic = italic or None
+
+
+# ------------------ PDF ------------------------------
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792  # US Letter, points
+MARGIN = 72
+BODY_SIZE = 11
+HEADING_SIZES = {1: 16, 2: 14, 3: 12}
+# Approximate Helvetica advance widths (em fractions), close enough for line wrapping
+_NARROW = set("iljtfrI.,;:'!|()[] ")
+_WIDE = set("mwMW@%")
+
+
+def _text_width(text, size):
+    width = 0.0
+    for ch in text:
+        if ch in _NARROW:
+            width += 0.28
+        elif ch in _WIDE:
+            width += 0.86
+        elif ch.isupper():
+            width += 0.68
+        else:
+            width += 0.56
+    return width * size
+
+
+def _pdf_string(text):
+    data = text.encode("cp1252", errors="replace")
+    return "(" + data.decode("latin-1").replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ")"
+
+
+def _wrap(runs, size, width, bold=False):
+    """
+    Lay runs out as lines of (word, font, spaced) triples no wider than width; spaced
+    is False where a run continues the previous word ("**MRI**." has no space before ".").
+    """
+    lines = [[]]
+    used = 0.0
+    space = _text_width(" ", size)
+    joined = False  # the next word continues the previous run's last word
+    for text, run_bold, italic in runs:
+        font = "F2" if (bold or run_bold) and not italic else ("F3" if italic else "F1")
+        for index, word in enumerate(text.split()):
+            spaced = bool(lines[-1]) and not (index == 0 and joined and not text[0].isspace())
+            word_width = _text_width(word, size)
+            if lines[-1] and used + space + word_width > width:
+                lines.append([])
+                used = 0.0
+                spaced = False
+            used += (space if spaced else 0.0) + word_width
+            lines[-1].append((word, font, spaced))
+        joined = bool(text) and not text[-1].isspace()
+    return lines
+
+
+def render_pdf(text):
+    """
+    Render the letter to PDF bytes in memory, with the standard Helvetica fonts (no
+    font files or extra packages needed): headings, bullets, and bold/italic runs.
+    """
+    body_width = PAGE_WIDTH - 2 * MARGIN
+    pages = [[]]  # per page: (x, y, size, [(word, font, spaced), ...])
+    y = PAGE_HEIGHT - MARGIN
+
+    def place(lines, size, indent=0.0, marker=None, gap_after=0.5):
+        nonlocal y
+        leading = size * 1.35
+        for index, line in enumerate(lines):
+            if y - leading < MARGIN:
+                pages.append([])
+                y = PAGE_HEIGHT - MARGIN
+            y -= leading
+            if marker and index == 0:
+                pages[-1].append((MARGIN + indent - 16, y, size, [(marker, "F1", False)]))
+            pages[-1].append((MARGIN + indent, y, size, line))
+        y -= size * gap_after
+
+    number = 0
+    for block in parse_letter(text):
+        kind = block[0]
+        number = number + 1 if kind == "numbered" else 0
+        if kind == "heading":
+            size = HEADING_SIZES[block[1]]
+            y -= size * 0.4
+            place(_wrap(block[2], size, body_width, bold=True), size, gap_after=0.3)
+        elif kind in ("bullet", "numbered"):
+            place(_wrap(block[1], BODY_SIZE, body_width - 24), BODY_SIZE, indent=24,
+                  marker="•" if kind == "bullet" else f"{number}.", gap_after=0.2)
+        else:
+            lines = []
+            for runs in block[1]:
+                lines.extend(_wrap(runs, BODY_SIZE, body_width))
+            place(lines, BODY_SIZE)
+
+    fonts = {"F1": "Helvetica", "F2": "Helvetica-Bold", "F3": "Helvetica-Oblique"}
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None]
+    font_ids = {}
+    for name, base in fonts.items():
+        objects.append(f"<< /Type /Font /Subtype /Type1 /BaseFont /{base} /Encoding /WinAnsiEncoding >>")
+        font_ids[name] = len(objects)
+    font_resources = " ".join(f"/{name} {number} 0 R" for name, number in font_ids.items())
+    page_ids = []
+    for placed in pages:
+        commands = []
+        for x, line_y, size, words in placed:
+            commands.append(f"BT {x:.2f} {line_y:.2f} Td")
+            for word, font, spaced in words:
+                commands.append(f"/{font} {size} Tf {_pdf_string((' ' if spaced else '') + word)} Tj")
+            commands.append("ET")
+        stream = "\n".join(commands).encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+                       f"/Resources << /Font << {font_resources} >> >> /Contents {len(objects)} 0 R >>")
+        page_ids.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{n} 0 R' for n in page_ids)}] /Count {len(page_ids)} >>"
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(out.tell())
+        body = body if isinstance(body, bytes) else body.encode("latin-1")
+        out.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    out.write("".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1"))
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+# ------------------ EXPORT ---------------------------
+RENDERERS = {"docx": render_docx, "pdf": render_pdf}
+
+
+def export_letter(text, fmt="docx"):
+    """
+    Return the letter rendered as fmt ("docx" or "pdf") bytes, from the export cache
+    when the same letter was rendered before.
+    """
+    if fmt not in RENDERERS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    digest = hashlib.sha256(f"{EXPORT_VERSION}\0{fmt}\0{text}".encode("utf-8")).hexdigest()
+    data = export_cache.get(digest)
+    if data is None:
+        data = RENDERERS[fmt](text)
+        export_cache.set(digest, data)
+    return data
@@ -0,0 +1,92 @@
+import math
+import os
+import re
+from collections import Counter, namedtuple
+
+from identifiers import extract_identifiers
+
+# ------------------ SETTINGS -------------------------
+# Scores at or above ACCEPT are taken as genuine without asking Gemini, at or below
+# REJECT as not genuine; anything in between is left to the model
+SCREEN_ACCEPT = float(os.environ.get("APPEAL_SCREEN_ACCEPT", "0.7"))
+SCREEN_REJECT = float(os.environ.get("APPEAL_SCREEN_REJECT", "0.3"))
+# Fewer words than this cannot be a real letter
+MIN_WORDS = 20
+# Character entropy (bits) of English prose is around 4.1; keyboard mashing and
+# base64 run higher, repeated filler ("test test test") much lower
+MIN_ENTROPY = 2.5
+MAX_ENTROPY = 5.3
+
+# Words that are common in each kind of letter
+DENIAL_VOCABULARY = frozenset("""
+    insurance insurer plan member policy claim claims coverage covered benefit benefits denied denial deny
+    determination reviewed review appeal appeals authorization precertification provider network service
+    services necessity necessary medically criteria guidelines exclusion excluded eob explanation reimbursement
+    payment subscriber grievance reconsideration
+""".split())
+CLAIM_VOCABULARY = frozenset("""
+    patient diagnosis diagnosed treatment treated therapy physician doctor dr md clinical history symptoms
+    recommend recommended procedure surgery medication prescribed condition chronic acute pain examination
+    imaging mri ct scan lab results medically necessary necessity care follow prognosis failed trial mg
+""".split())
+_STOPWORDS = frozenset("a an and are as at be by for from has have i in is it of on or that the this to was we with you your".split())
+_WORD = re.compile(r"[A-Za-z]+")
+
+ScreenResult = namedtuple("ScreenResult", ["verdict", "score", "features"])
+
+
+# ------------------ FEATURES -------------------------
+def char_entropy(text):
+    """Shannon entropy of the lower-cased characters, in bits per character."""
+    counts = Counter(text.lower())
+    total = sum(counts.values())
+    if not total:
+        return 0.0
+    return -sum(n / total * math.log2(n / total) for n in counts.values())
+
+
+def letter_features(text, kind):
+    """
+    Length, character entropy, domain-vocabulary density, share of common English
+    words and number of labelled identifiers, for a "denial" or "claim" letter.
+    """
+    text = text or ""
+    words = [w.lower() for w in _WORD.findall(text)]
+    vocabulary = DENIAL_VOCABULARY if kind == "denial" else CLAIM_VOCABULARY
+    count = max(1, len(words))
+    return {
+        "words": len(words),
+        "entropy": char_entropy(text),
+        "vocabulary_density": sum(w in vocabulary for w in words) / count,
+        "stopword_ratio": sum(w in _STOPWORDS for w in words) / count,
+        "identifiers": len(extract_identifiers(text)),
+    }
+
+
+# ------------------ SCREEN ---------------------------
+def screen_letter(text, kind):
+    """
+    Score how much text looks like a genuine letter of kind ("denial" or "claim").
+    Returns a ScreenResult whose verdict is "accept" or "reject" for clear-cut
+    documents and "ambiguous" when the model should decide.
+    """
+    features = letter_features(text, kind)
+    if (features["words"] < MIN_WORDS
+            or not MIN_ENTROPY <= features["entropy"] <= MAX_ENTROPY
+            or (features["stopword_ratio"] < 0.05 and features["vocabulary_density"] == 0)):
+        return ScreenResult("reject", 0.0, features)
+
+    score = (
+        0.25 * min(1.0, features["words"] / 150)
+        + 0.35 * min(1.0, features["vocabulary_density"] / 0.15)
+        + 0.2 * min(1.0, features["stopword_ratio"] / 0.2)
+        # Denial letters carry member/claim numbers; a claim letter usually names the patient
+        + 0.2 * min(1.0, features["identifiers"] / (2 if kind == "denial" else 1))
+    )
+    if score >= SCREEN_ACCEPT:
+        verdict = "accept"
+    elif score <= SCREEN_REJECT:
+        verdict = "reject"
+    else:
+        verdict = "ambiguous"
+    return ScreenResult(verdict, score, features)
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+
+from metrics import record_cache, record_coalesced, record_usage
+from resilience import estimate_tokens, guarded_call
+from single_flight import SingleFlight
+from tiered_cache import TieredCache
+
+# ------------------ SETTINGS -------------------------
+# The disk cache holds patient data as plain, unencrypted JSON: responses (letters,
+# extracted names and IDs) for up to CACHE_TTL, and near-duplicate results until evicted
+# (see near_duplicates.NEAR_DUP_MAX_ENTRIES). Keep the directory on an access-controlled
+# disk, or set APPEAL_CACHE_DIR= (empty) to keep everything in memory only.
+CACHE_DIR = os.environ.get("APPEAL_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".appeal_cache"))
+# Responses older than this are regenerated (seconds; default one week)
+CACHE_TTL = float(os.environ.get("APPEAL_CACHE_TTL", str(7 * 24 * 3600)))
+CACHE_MAX_MB = float(os.environ.get("APPEAL_CACHE_MAX_MB", "256"))
+CACHE_MEMORY_ENTRIES = int(os.environ.get("APPEAL_CACHE_MEMORY_ENTRIES", "512"))
+# Seconds a caller waits on an identical in-flight call before making its own
+COALESCE_TIMEOUT = float(os.environ.get("APPEAL_COALESCE_TIMEOUT", "120"))
+
+
+class CachedResponse:
+    """Stand-in for a Gemini response: the generated text and token usage counts."""
+
+    def __init__(self, text, usage=None):
+        self.text = text
+        self.usage = usage or {}
+
+
+response_cache = TieredCache(
+    path=os.path.join(CACHE_DIR, "cache.sqlite3") if CACHE_DIR else None,
+    namespace="llm",
+    max_entries=CACHE_MEMORY_ENTRIES,
+    max_disk_bytes=int(CACHE_MAX_MB * 1024 * 1024),
+    ttl=CACHE_TTL,
+    encode=lambda response: {"text": response.text, "usage": response.usage},
+    decode=lambda data: CachedResponse(data["text"], data["usage"]),
+)
+
+# Identical calls already in flight, keyed like the response cache
+llm_flights = SingleFlight(timeout=COALESCE_TIMEOUT)
+
+
+def response_key(model_name, prompt, generation_config=None):
+    """
+    Content address for a call: SHA-256 over model name, prompt and generation config.
+    """
+    payload = json.dumps(
+        {"model": model_name, "prompt": prompt, "config": generation_config},
+        sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _usage_of(response):
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return {}
+    return {
+        "prompt_tokens": getattr(usage, "prompt_token_count", 0) or 0,
+        "output_tokens": getattr(usage, "candidates_token_count", 0) or 0,
+    }
+
+
+# ------------------ CACHED GENERATION ----------------
+def _lookup(key, accept):
+    """The cached response for key, unless accept rejects its text (then it is dropped)."""
+    cached = response_cache.get(key)
+    if cached is not None and accept is not None and not accept(cached.text):
+        response_cache.delete(key)
+        return None
+    return cached
+
+
+def cached_generate(model, prompt, generation_config=None, accept=None):
+    """
+    Call model.generate_content through the response cache.
+    Identical (model, prompt, config) triples are answered from memory or disk without
+    touching the API. Misses go through the shared rate limiter, retry policy and circuit
+    breaker (see resilience.guarded_call). Errors are not cached, so a failed call is
+    retried next time; neither are responses whose text accept (if given) returns False
+    for, so an unusable answer is asked for again rather than replayed for the whole TTL.
+    Concurrent misses for the same key share one API call.
+    """
+    key = response_key(getattr(model, "model_name", str(model)), prompt, generation_config)
+    cached = _lookup(key, accept)
+    record_cache(cached is not None)
+    if cached is not None:
+        return cached
+    return llm_flights.do(key, lambda: _generate(key, model, prompt, generation_config, accept),
+                          on_coalesced=record_coalesced)
+
+
+def _generate(key, model, prompt, generation_config, accept=None):
+    # A flight that just landed may have filled the cache since our lookup
+    cached = _lookup(key, accept)
+    if cached is not None:
+        return cached
+    if generation_config is None:
+        response = guarded_call(lambda: model.generate_content(prompt), estimate_tokens(prompt))
+    else:
+        response = guarded_call(
+            lambda: model.generate_content(prompt, generation_config=generation_config),
+            estimate_tokens(prompt)
+        )
+    result = CachedResponse(response.text, _usage_of(response))
+    record_usage(result.usage)
+    if accept is None or accept(result.text):
+        response_cache.set(key, result)
+    return result
+
+
+def stream_generate(model, prompt, generation_config=None):
+    """
+    Generator version of cached_generate: yields text chunks as Gemini produces them.
+    A cache hit yields the whole text at once. The assembled text is cached once the
+    stream completes, so a later cached_generate with the same arguments is a hit.
+    While the same call is already in flight, this waits for it and yields its text
+    at once instead of opening a second stream.
+    """
+    key = response_key(getattr(model, "model_name", str(model)), prompt, generation_config)
+    cached = response_cache.get(key)
+    record_cache(cached is not None)
+    if cached is not None:
+        yield cached.text
+        return
+    flight, leader = llm_flights.begin(key)
+    if not leader:
+        record_coalesced()
+        finished, result = llm_flights.wait(flight)
+        if finished:
+            yield result.text
+            return
+        flight = None  # the leader gave up; stream on our own
+    try:
+        result = yield from _stream(key, model, prompt, generation_config)
+    except Exception as e:
+        if flight is not None:
+            llm_flights.finish(key, flight, error=e)
+        raise
+    except BaseException:
+        # Closed mid-stream (e.g. a Streamlit rerun): let a waiting caller take over
+        if flight is not None:
+            llm_flights.finish(key, flight, abandoned=True)
+        raise
+    if flight is not None:
+        llm_flights.finish(key, flight, result=result)
+
+
+def _stream(key, model, prompt, generation_config):
+    kwargs = {"stream": True}
+    if generation_config is not None:
+        kwargs["generation_config"] = generation_config
+    # Only opening the stream is retried; a failure mid-stream propagates to the caller
+    response = guarded_call(lambda: model.generate_content(prompt, **kwargs), estimate_tokens(prompt))
+    chunks = []
+    for chunk in response:
+        text = chunk.text
+        chunks.append(text)
+        yield text
+    result = CachedResponse("".join(chunks), _usage_of(response))
+    record_usage(result.usage)
+    response_cache.set(key, result)
+    return result
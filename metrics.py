@@ -0,0 +1,319 @@
+import contextvars
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# ------------------ SETTINGS -------------------------
+# Append one JSON line per finished trace to this file (off when empty)
+TRACE_FILE = os.environ.get("APPEAL_TRACE_FILE", "")
+# USD per million tokens, for the cost estimate (gemini-2.0-flash list prices)
+PRICE_INPUT_PER_M = float(os.environ.get("APPEAL_PRICE_INPUT_PER_M", "0.10"))
+PRICE_OUTPUT_PER_M = float(os.environ.get("APPEAL_PRICE_OUTPUT_PER_M", "0.40"))
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_current_span = contextvars.ContextVar("appeal_span", default=None)
+_current_trace = contextvars.ContextVar("appeal_trace", default=None)
+
+
+# ------------------ SPANS AND TRACES -----------------
+class Span:
+    """One timed stage: wall time, tokens, cache outcome, retries and error."""
+
+    def __init__(self, stage, parent=None):
+        self.stage = stage
+        self.parent = parent
+        self.started = time.time()
+        self.seconds = 0.0
+        self.status = "ok"
+        self.error = None
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.retries = 0
+        self.coalesced = 0
+        self.prompt_tokens_original = 0
+        self.prompt_tokens_kept = 0
+
+    @property
+    def cost(self):
+        """Estimated USD spent on Gemini tokens in this stage."""
+        return (self.input_tokens * PRICE_INPUT_PER_M + self.output_tokens * PRICE_OUTPUT_PER_M) / 1e6
+
+    @property
+    def prompt_tokens_saved(self):
+        """Estimated input tokens cut from this stage's prompts by prompt_trimming."""
+        return self.prompt_tokens_original - self.prompt_tokens_kept
+
+    def as_dict(self):
+        return {
+            "stage": self.stage,
+            "parent": self.parent,
+            "started": self.started,
+            "seconds": round(self.seconds, 6),
+            "status": self.status,
+            "error": self.error,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "retries": self.retries,
+            "coalesced": self.coalesced,
+            "prompt_tokens_original": self.prompt_tokens_original,
+            "prompt_tokens_kept": self.prompt_tokens_kept,
+            "prompt_tokens_saved": self.prompt_tokens_saved,
+            "cost_usd": round(self.cost, 8),
+        }
+
+
+class Trace:
+    """
+    The spans recorded while handling one request (a Streamlit run, a batch case).
+    Spans from GraphRun tasks are included, as tasks inherit the caller's context.
+    """
+
+    def __init__(self, name):
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.started = time.time()
+        self.seconds = None
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def breakdown(self):
+        """One dict per span, in completion order."""
+        with self._lock:
+            return [span.as_dict() for span in self.spans]
+
+    def totals(self):
+        spans = self.breakdown()
+        return {
+            "input_tokens": sum(s["input_tokens"] for s in spans),
+            "output_tokens": sum(s["output_tokens"] for s in spans),
+            "cost_usd": round(sum(s["cost_usd"] for s in spans), 8),
+            "retries": sum(s["retries"] for s in spans),
+            "prompt_tokens_saved": sum(s["prompt_tokens_saved"] for s in spans),
+            "errors": sum(s["status"] == "error" for s in spans),
+        }
+
+    def as_dict(self):
+        return {"trace_id": self.trace_id, "name": self.name, "started": self.started,
+                "seconds": self.seconds, "totals": self.totals(), "spans": self.breakdown()}
+
+    def finish(self, path=None):
+        """Stop the clock and append the trace to path (default APPEAL_TRACE_FILE), if set."""
+        self.seconds = round(time.time() - self.started, 6)
+        path = path or TRACE_FILE
+        if path:
+            line = json.dumps(self.as_dict(), default=str) + "\n"
+            with _trace_file_lock, open(path, "a", encoding="utf-8") as f:
+                f.write(line)
+        return self
+
+
+_trace_file_lock = threading.Lock()
+
+
+def start_trace(name):
+    """Make a new Trace current for this context and return it."""
+    trace = Trace(name)
+    _current_trace.set(trace)
+    return trace
+
+
+@contextmanager
+def trace(name):
+    """Record the spans of the enclosed block as one Trace, finished on exit."""
+    current = Trace(name)
+    token = _current_trace.set(current)
+    try:
+        yield current
+    finally:
+        _current_trace.reset(token)
+        current.finish()
+
+
+# ------------------ REGISTRY -------------------------
+class Registry:
+    """Process-wide counters and latency histograms, keyed by stage."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.histograms = {}  # stage -> [bucket counts..., +Inf count, sum]
+            self.calls = {}  # (stage, status) -> count
+            self.tokens = {}  # (stage, direction) -> count
+            self.cache = {}  # (stage, result) -> count
+            self.retries = {}
+            self.coalesced = {}
+            self.tokens_saved = {}
+            self.cost = {}
+
+    def observe(self, span):
+        with self._lock:
+            histogram = self.histograms.setdefault(span.stage, [0] * (len(self.buckets) + 2))
+            histogram[bisect_left(self.buckets, span.seconds)] += 1
+            histogram[-1] += span.seconds
+            _add(self.calls, (span.stage, span.status), 1)
+            _add(self.tokens, (span.stage, "input"), span.input_tokens)
+            _add(self.tokens, (span.stage, "output"), span.output_tokens)
+            _add(self.cache, (span.stage, "hit"), span.cache_hits)
+            _add(self.cache, (span.stage, "miss"), span.cache_misses)
+            _add(self.retries, span.stage, span.retries)
+            _add(self.coalesced, span.stage, span.coalesced)
+            _add(self.tokens_saved, span.stage, span.prompt_tokens_saved)
+            _add(self.cost, span.stage, span.cost)
+
+    def prometheus_text(self):
+        """The registry in the Prometheus text exposition format."""
+        with self._lock:
+            lines = [
+                "# HELP appeal_stage_seconds Wall time of each pipeline stage.",
+                "# TYPE appeal_stage_seconds histogram",
+            ]
+            for stage, histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), histogram[:-1]):
+                    cumulative += count
+                    lines.append(f'appeal_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'appeal_stage_seconds_sum{{stage="{stage}"}} {histogram[-1]:.6f}')
+                lines.append(f'appeal_stage_seconds_count{{stage="{stage}"}} {cumulative}')
+            lines += _counter("appeal_stage_calls_total", "Stage runs by outcome.", self.calls, ("stage", "status"))
+            lines += _counter("appeal_tokens_total", "Gemini tokens by stage and direction.", self.tokens,
+                              ("stage", "direction"))
+            lines += _counter("appeal_cache_requests_total", "Response cache lookups by stage and result.",
+                              self.cache, ("stage", "result"))
+            lines += _counter("appeal_retries_total", "Gemini call retries by stage.", self.retries, ("stage",))
+            lines += _counter("appeal_coalesced_total", "Gemini calls saved by joining an identical call in flight.",
+                              self.coalesced, ("stage",))
+            lines += _counter("appeal_prompt_tokens_saved_total", "Input tokens cut from prompts by trimming.",
+                              self.tokens_saved, ("stage",))
+            lines += _counter("appeal_cost_usd_total", "Estimated Gemini spend by stage.", self.cost, ("stage",))
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Write prometheus_text() atomically, e.g. for node_exporter's textfile collector."""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+
+def _add(counts, key, value):
+    counts[key] = counts.get(key, 0) + value
+
+
+def _counter(name, help_text, counts, labels):
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+    for key, value in sorted(counts.items()):
+        key = key if isinstance(key, tuple) else (key,)
+        label_text = ",".join(f'{label}="{part}"' for label, part in zip(labels, key))
+        lines.append(f"{name}{{{label_text}}} {value:g}")
+    return lines
+
+
+registry = Registry()
+
+
+# ------------------ INSTRUMENTATION ------------------
+@contextmanager
+def stage(name):
+    """
+    Time the enclosed block as stage name. Tokens, cache lookups and retries reported
+    while it runs (see record_usage etc.) are attributed to it; an exception marks it
+    failed and propagates. The span is added to the registry and the current trace.
+    """
+    parent = _current_span.get()
+    span = Span(name, parent.stage if parent is not None else None)
+    token = _current_span.set(span)
+    started = time.perf_counter()
+    try:
+        yield span
+    except GeneratorExit:
+        # A stream closed early by its consumer (e.g. a Streamlit rerun) is not a failure
+        raise
+    except BaseException as e:
+        span.status = "error"
+        span.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        span.seconds = time.perf_counter() - started
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            pass  # a generator closed from another context
+        registry.observe(span)
+        current = _current_trace.get()
+        if current is not None:
+            current.add(span)
+
+
+def instrumented(name):
+    """Decorator form of stage(); generator functions are timed until exhausted."""
+    def decorate(func):
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def generator_wrapper(*args, **kwargs):
+                with stage(name):
+                    yield from func(*args, **kwargs)
+            return generator_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def record_usage(usage):
+    """Add a response's token usage ({"prompt_tokens", "output_tokens"}) to the current stage."""
+    span = _current_span.get()
+    if span is not None and usage:
+        span.input_tokens += usage.get("prompt_tokens", 0)
+        span.output_tokens += usage.get("output_tokens", 0)
+
+
+def record_cache(hit):
+    span = _current_span.get()
+    if span is not None:
+        if hit:
+            span.cache_hits += 1
+        else:
+            span.cache_misses += 1
+
+
+def record_retry():
+    span = _current_span.get()
+    if span is not None:
+        span.retries += 1
+
+
+def record_coalesced():
+    """Count a call answered by an identical call already in flight."""
+    span = _current_span.get()
+    if span is not None:
+        span.coalesced += 1
+
+
+def record_trim(original_tokens, kept_tokens):
+    """Add a prompt section's token count before and after trimming to the current stage."""
+    span = _current_span.get()
+    if span is not None:
+        span.prompt_tokens_original += original_tokens
+        span.prompt_tokens_kept += kept_tokens
@@ -0,0 +1,284 @@
+import hashlib
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+import numpy as np
+
+from identifiers import extract_identifiers
+from llm_cache import CACHE_DIR
+from tiered_cache import TieredCache
+
+# ------------------ SETTINGS -------------------------
+# Reuse a prior case's results when the estimated Jaccard similarity is at least this
+NEAR_DUP_THRESHOLD = float(os.environ.get("APPEAL_NEAR_DUP_THRESHOLD", "0.9"))
+# Fingerprints kept; the least recently matched are evicted first
+NEAR_DUP_MAX_ENTRIES = int(os.environ.get("APPEAL_NEAR_DUP_MAX_ENTRIES", "5000"))
+NEAR_DUP_ENABLED = os.environ.get("APPEAL_NEAR_DUP", "1") != "0"
+
+SHINGLE_WORDS = 4
+# 16 bands of 8 rows: pairs above ~0.7 similarity almost always share a band
+BANDS = 16
+ROWS = 8
+NUM_PERM = BANDS * ROWS
+_PRIME = (1 << 61) - 1
+_rng = random.Random(2024)  # fixed, so stored signatures stay comparable across runs
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(_PRIME)) for _ in range(NUM_PERM)]
+# The permutations as column vectors, a split into 32-bit halves for overflow-free products
+_A = np.array([a for a, _ in _PERMUTATIONS], dtype=np.uint64)[:, None]
+_B = np.array([b for _, b in _PERMUTATIONS], dtype=np.uint64)[:, None]
+_A_HI, _A_LO = _A >> np.uint64(32), _A & np.uint64(0xFFFFFFFF)
+# Signatures of recently seen letters, keyed by content digest
+_signatures = TieredCache(namespace="signatures", max_entries=64)
+
+
+# ------------------ FINGERPRINTS ---------------------
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def normalized_words(text):
+    """
+    Lower-cased words with the labelled identifiers (patient name, member ID ...)
+    removed wherever they occur and every digit run masked, so letters that differ
+    only in whom they are about, dates and amounts produce the same words.
+    """
+    text = text or ""
+    for value, _ in extract_identifiers(text).values():
+        text = text.replace(value, " ")
+    return [re.sub(r"\d+", "#", word) for word in _WORD.findall(text.lower())]
+
+
+def shingles(text):
+    """Overlapping SHINGLE_WORDS-word phrases of the normalized text."""
+    words = normalized_words(text)
+    if len(words) <= SHINGLE_WORDS:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+def _mod_prime(x):
+    """x mod _PRIME for uint64 x, using 2**61 == 1 (mod _PRIME)."""
+    prime = np.uint64(_PRIME)
+    x = (x & prime) + (x >> np.uint64(61))
+    return np.where(x >= prime, x - prime, x)
+
+
+def _permute(hashes):
+    """
+    (a * h + b) mod _PRIME for every permutation (rows) and shingle hash (columns),
+    exactly, in uint64: a and h are split into 32-bit halves so no product
+    overflows, and the high parts are folded back in with 2**61 == 1.
+    """
+    h = _mod_prime(hashes)[None, :]
+    h_hi, h_lo = h >> np.uint64(32), h & np.uint64(0xFFFFFFFF)
+    low = _A_LO * h_lo  # < 2**64
+    mid = _A_HI * h_lo + _A_LO * h_hi  # < 2**62, weight 2**32
+    high = _A_HI * h_hi  # < 2**58, weight 2**64 == 8
+    total = (_mod_prime(low)
+             + (mid >> np.uint64(29)) + ((mid & np.uint64((1 << 29) - 1)) << np.uint64(32))
+             + (high << np.uint64(3)))  # each term < 2**61
+    return _mod_prime(_mod_prime(total) + _B)
+
+
+def signature(text):
+    """
+    MinHash signature of text: NUM_PERM minima of universal hashes over its shingles.
+    The fraction of equal positions in two signatures estimates their Jaccard similarity.
+    """
+    text = text or ""
+    key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    sig = _signatures.get(key)
+    if sig is not None:
+        return sig
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big")
+              for s in shingles(text)]
+    if not hashes:
+        return None
+    sig = tuple(_permute(np.array(hashes, dtype=np.uint64)).min(axis=1).tolist())
+    _signatures.set(key, sig)
+    return sig
+
+
+def similarity(first, second):
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(x == y for x, y in zip(first, second)) / NUM_PERM
+
+
+def _bands(sig):
+    return [(band, hash(sig[band * ROWS:(band + 1) * ROWS])) for band in range(BANDS)]
+
+
+# ------------------ REUSED TEXT ----------------------
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?:])\s+")
+
+
+def quoted_in(quote, text):
+    """True when quote occurs in text, ignoring case and runs of whitespace."""
+    quote = " ".join((quote or "").split()).lower()
+    return bool(quote) and quote in " ".join((text or "").split()).lower()
+
+
+def grounded_in(value, text):
+    """
+    True when value, written for a near-duplicate letter, names nothing text does not:
+    every word with a digit, and every capitalized word after the first of its
+    sentence, must occur in text. Near-duplicates differ in exactly such words (names,
+    IDs, dates, amounts), so this keeps another member's details out of reused results.
+    """
+    for sentence in _SENTENCE_BREAK.split(value or ""):
+        for position, word in enumerate(sentence.split()):
+            word = word.strip(".,;:!?()[]\"'")
+            if not word or word in text:
+                continue
+            if any(ch.isdigit() for ch in word) or (position and word[0].isupper()):
+                return False
+    return True
+
+
+# ------------------ INDEX ----------------------------
+class NearDuplicateIndex:
+    """
+    MinHash/LSH index over processed denial letters. Each entry is a letter's
+    signature plus whatever results were worked out for it (denial reason,
+    explanation, XAI output); lookup() returns the results of the most similar
+    stored letter above threshold.
+
+    Candidates come from the LSH band buckets, so a lookup touches only a few
+    entries however large the index grows. Holds at most max_entries letters,
+    evicting the least recently matched; persisted to SQLite, as JSON, when path is given.
+    Safe to share between threads.
+    """
+
+    def __init__(self, path=None, max_entries=NEAR_DUP_MAX_ENTRIES, threshold=NEAR_DUP_THRESHOLD):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self._entries = OrderedDict()  # letter id -> (signature, fields), least recent first
+        self._buckets = {}  # (band, band hash) -> set of letter ids
+        self._lock = threading.Lock()
+        self._stats = {"lookups": 0, "hits": 0, "evictions": 0}
+        self._db = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS fingerprints ("
+                " id TEXT PRIMARY KEY, signature BLOB, fields BLOB, accessed REAL)"
+            )
+            for letter_id, sig, fields in self._db.execute(
+                    "SELECT id, signature, fields FROM fingerprints ORDER BY accessed").fetchall():
+                try:
+                    fields = json.loads(fields)
+                except ValueError:
+                    # Written in another format (e.g. pickled by an older version): never unpickled
+                    self._db.execute("DELETE FROM fingerprints WHERE id = ?", (letter_id,))
+                    continue
+                self._add(letter_id, tuple(array("Q", sig)), fields)
+            with self._lock:
+                self._evict()
+
+    def _add(self, letter_id, sig, fields):
+        self._entries[letter_id] = (sig, fields)
+        self._entries.move_to_end(letter_id)
+        for key in _bands(sig):
+            self._buckets.setdefault(key, set()).add(letter_id)
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            letter_id, (sig, _) = self._entries.popitem(last=False)
+            for key in _bands(sig):
+                bucket = self._buckets.get(key)
+                if bucket is not None:
+                    bucket.discard(letter_id)
+                    if not bucket:
+                        del self._buckets[key]
+            if self._db is not None:
+                self._db.execute("DELETE FROM fingerprints WHERE id = ?", (letter_id,))
+            self._stats["evictions"] += 1
+
+    def lookup(self, text):
+        """
+        Return (similarity, fields) for the closest stored letter at or above the
+        threshold, or None. An exact repeat of a stored letter has similarity 1.0.
+        """
+        sig = signature(text)
+        if sig is None:
+            return None
+        with self._lock:
+            self._stats["lookups"] += 1
+            candidates = set()
+            for key in _bands(sig):
+                candidates |= self._buckets.get(key, set())
+            best, best_score = None, 0.0
+            for letter_id in candidates:
+                score = similarity(sig, self._entries[letter_id][0])
+                if score > best_score:
+                    best, best_score = letter_id, score
+            if best is None or best_score < self.threshold:
+                return None
+            self._stats["hits"] += 1
+            self._entries.move_to_end(best)
+            if self._db is not None:
+                self._db.execute("UPDATE fingerprints SET accessed = ? WHERE id = ?", (time.time(), best))
+            return best_score, dict(self._entries[best][1])
+
+    def remember(self, text, **fields):
+        """
+        Store text's fingerprint with fields, merged into what is already stored for
+        the same text (so results from different stages accumulate on one entry).
+        """
+        sig = signature(text)
+        if sig is None:
+            return
+        letter_id = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        with self._lock:
+            entry = self._entries.get(letter_id)
+            merged = dict(entry[1]) if entry is not None else {}
+            merged.update(fields)
+            self._add(letter_id, sig, merged)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?, ?)",
+                    (letter_id, array("Q", sig).tobytes(),
+                     json.dumps(merged, separators=(",", ":")), time.time())
+                )
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM fingerprints")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        stats["hit_rate"] = stats["hits"] / stats["lookups"] if stats["lookups"] else 0.0
+        return stats
+
+
+duplicate_index = NearDuplicateIndex(
+    path=os.path.join(CACHE_DIR, "cache.sqlite3") if CACHE_DIR else None,
+)
+
+
+def find_prior(denial_text):
+    """The stored results of a near-duplicate denial letter, or {} (also when disabled)."""
+    if not NEAR_DUP_ENABLED:
+        return {}
+    match = duplicate_index.lookup(denial_text)
+    return match[1] if match else {}
+
+
+def remember_results(denial_text, **fields):
+    """Record results worked out for denial_text, for later near-duplicates to reuse."""
+    if NEAR_DUP_ENABLED:
+        duplicate_index.remember(denial_text, **fields)
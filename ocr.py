@@ -0,0 +1,168 @@
+import io
+import os
+from collections import namedtuple
+
+import numpy as np
+from PIL import Image
+
+# ------------------ SETTINGS -------------------------
+# Resolution text is OCR'd at; scans above it are downsampled first
+OCR_TARGET_DPI = int(os.environ.get("APPEAL_OCR_DPI", "150"))
+# Longest side allowed when the image carries no DPI information
+OCR_MAX_SIDE = int(os.environ.get("APPEAL_OCR_MAX_SIDE", "2000"))
+# Recognitions below this confidence are dropped as noise
+OCR_MIN_CONFIDENCE = float(os.environ.get("APPEAL_OCR_MIN_CONFIDENCE", "0.2"))
+MAX_SKEW_DEGREES = 5.0
+
+OcrResult = namedtuple("OcrResult", ["text", "boxes", "texts", "confidences"])
+
+
+# ------------------ PREPROCESSING --------------------
+def _open_image(source):
+    return Image.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+
+
+def _source_dpi(image):
+    dpi = image.info.get("dpi")
+    return float(dpi[0]) if dpi and dpi[0] else None
+
+
+def decode_image(source, target_dpi=OCR_TARGET_DPI, max_side=OCR_MAX_SIDE):
+    """
+    Decode an image (bytes or a binary file object) to a grayscale uint8 array.
+    Returns (array, dpi or None), the dpi adjusted for any reduction. JPEGs are
+    decoded straight at a reduced scale (1/2 to 1/8) when that stays at or above
+    the OCR resolution, so a large scan never exists in memory at full size.
+    """
+    with _open_image(source) as image:
+        dpi = _source_dpi(image)
+        width = image.size[0]
+        ratio = dpi / target_dpi if dpi else max(image.size) / max_side
+        if ratio >= 2:
+            image.draft("L", (int(image.size[0] / ratio), int(image.size[1] / ratio)))
+        gray = np.asarray(image.convert("L"))
+    if dpi and gray.shape[1] != width:
+        dpi = dpi * gray.shape[1] / width
+    return gray, dpi
+
+
+def decoded_bytes(source, target_dpi=OCR_TARGET_DPI, max_side=OCR_MAX_SIDE):
+    """
+    Memory decode_image will need for source, read from the image header alone:
+    one byte per pixel at the decoded scale, for a grayscale image.
+    """
+    with _open_image(source) as image:
+        width, height = image.size
+        dpi = _source_dpi(image)
+        if image.format == "JPEG":
+            ratio = dpi / target_dpi if dpi else max(width, height) / max_side
+            scale = 8 if ratio >= 8 else 4 if ratio >= 4 else 2 if ratio >= 2 else 1
+            width, height = -(-width // scale), -(-height // scale)
+    return width * height
+
+
+def downsample(gray, source_dpi=None, target_dpi=OCR_TARGET_DPI, max_side=OCR_MAX_SIDE):
+    """
+    Shrink by an integer factor using block means, to target_dpi when the source DPI is
+    known and to max_side pixels on the longest side otherwise.
+    """
+    ratio = source_dpi / target_dpi if source_dpi else max(gray.shape) / max_side
+    factor = int(ratio)
+    if factor <= 1:
+        return gray
+    height, width = (gray.shape[0] // factor) * factor, (gray.shape[1] // factor) * factor
+    blocks = gray[:height, :width].reshape(height // factor, factor, width // factor, factor)
+    return blocks.mean(axis=(1, 3)).astype(np.uint8)
+
+
+def estimate_skew(gray, max_degrees=MAX_SKEW_DEGREES, steps=41, max_points=20000):
+    """
+    Estimate text skew in degrees (counter-clockwise positive, as PIL rotates) by projection
+    profiles: the angle at which ink pixels project onto the sharpest row histogram is the
+    one that aligns the text lines.
+    """
+    ys, xs = np.nonzero(gray < min(128, gray.mean() - 2 * gray.std() / 3))
+    if len(ys) < 100:
+        return 0.0
+    if len(ys) > max_points:
+        pick = np.random.default_rng(0).choice(len(ys), max_points, replace=False)
+        ys, xs = ys[pick], xs[pick]
+    angles = np.deg2rad(np.linspace(-max_degrees, max_degrees, steps))
+    # Row coordinate of every ink pixel under every candidate rotation: (steps, points)
+    rows = np.rint(ys[None, :] * np.cos(angles)[:, None] - xs[None, :] * np.sin(angles)[:, None]).astype(np.int64)
+    rows -= rows.min(axis=1, keepdims=True)
+    offsets = (np.arange(steps) * (rows.max() + 1))[:, None]
+    counts = np.bincount((rows + offsets).ravel(), minlength=steps * (rows.max() + 1))
+    sharpness = (counts.reshape(steps, -1).astype(np.float64) ** 2).sum(axis=1)
+    return -float(np.rad2deg(angles[int(np.argmax(sharpness))]))
+
+
+def deskew(gray):
+    """Rotate the page so text lines are horizontal."""
+    angle = estimate_skew(gray)
+    if abs(angle) < 0.2:
+        return gray
+    rotated = Image.fromarray(gray).rotate(-angle, resample=Image.BILINEAR, expand=True, fillcolor=255)
+    return np.asarray(rotated)
+
+
+def preprocess(gray, source_dpi=None):
+    """Downsample to the OCR resolution, then deskew."""
+    return deskew(downsample(gray, source_dpi))
+
+
+# ------------------ LAYOUT ---------------------------
+def reading_order(boxes):
+    """
+    Return indices of boxes in reading order, plus the line number of each.
+    Boxes whose vertical centres are within half a median line height share a line.
+    """
+    if len(boxes) == 0:
+        return np.array([], dtype=int), np.array([], dtype=int)
+    tops, bottoms = boxes[:, :, 1].min(axis=1), boxes[:, :, 1].max(axis=1)
+    centres = (tops + bottoms) / 2
+    tolerance = max(1.0, float(np.median(bottoms - tops)) / 2)
+    by_centre = np.argsort(centres, kind="stable")
+    # A new line starts wherever the gap to the previous centre exceeds the tolerance
+    new_line = np.concatenate(([0], (np.diff(centres[by_centre]) > tolerance).astype(int)))
+    lines = np.empty(len(boxes), dtype=int)
+    lines[by_centre] = np.cumsum(new_line)
+    order = np.lexsort((boxes[:, :, 0].min(axis=1), lines))
+    return order, lines
+
+
+def layout_text(boxes, texts, confidences, min_confidence=OCR_MIN_CONFIDENCE):
+    """
+    Rebuild page text from OCR boxes: low-confidence recognitions are dropped, words on
+    the same line are joined with spaces and lines with newlines.
+    """
+    keep = confidences >= min_confidence
+    boxes, confidences = boxes[keep], confidences[keep]
+    texts = [text for text, kept in zip(texts, keep) if kept]
+    order, lines = reading_order(boxes)
+    output = []
+    previous_line = None
+    for index in order:
+        if previous_line is not None:
+            output.append("\n" if lines[index] != previous_line else " ")
+        output.append(texts[index])
+        previous_line = lines[index]
+    return OcrResult("".join(output), boxes[order], [texts[i] for i in order], confidences[order])
+
+
+# ------------------ OCR ------------------------------
+def ocr_array(reader, gray):
+    """OCR a preprocessed grayscale page."""
+    results = reader.readtext(gray)
+    if not results:
+        return OcrResult("", np.zeros((0, 4, 2)), [], np.zeros(0))
+    boxes = np.array([res[0] for res in results], dtype=np.float64)
+    texts = [res[1] for res in results]
+    confidences = np.array([res[2] for res in results], dtype=np.float64)
+    return layout_text(boxes, texts, confidences)
+
+
+def ocr_image_bytes(reader, data):
+    """Decode, preprocess and OCR an image file (bytes or a binary file object)."""
+    gray, dpi = decode_image(data)
+    return ocr_array(reader, preprocess(gray, dpi))
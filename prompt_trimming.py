@@ -0,0 +1,163 @@
+import os
+import re
+from collections import namedtuple
+
+from metrics import record_trim
+
+# ------------------ TASKS ----------------------------
+# Keywords that mark a segment as relevant to each prompt's task; a multi-word phrase
+# scores once per word, so specific phrases outweigh single common words
+TASK_KEYWORDS = {
+    "identifiers": [
+        "member", "subscriber", "id", "policy", "group", "claim", "number", "reference", "patient",
+        "name", "date", "insurance", "insurer", "plan", "address", "re:", "dear", "account",
+    ],
+    "denial_rationale": [
+        "denied", "denial", "deny", "reason", "because", "not medically necessary", "medical necessity",
+        "criteria", "guideline", "coverage", "covered", "exclusion", "excluded", "authorization",
+        "precertification", "investigational", "experimental", "network", "maximum", "limit",
+        "documentation", "records", "appeal", "determination", "reviewed",
+    ],
+    "clinical_justification": [
+        "diagnosis", "diagnosed", "treatment", "therapy", "symptoms", "history", "failed", "trial",
+        "recommend", "recommended", "necessary", "medically", "condition", "surgery", "procedure",
+        "medication", "imaging", "mri", "prognosis", "guideline", "evidence", "risk", "pain", "function",
+    ],
+}
+
+# Default per-task token budgets; override with e.g. APPEAL_TOKEN_BUDGET_IDENTIFIERS=800
+DEFAULT_BUDGETS = {
+    "identifiers": 1500,
+    "denial_rationale": 2500,
+    "clinical_justification": 3000,
+}
+# Segments longer than this many words are split into windows
+MAX_SEGMENT_WORDS = 120
+GAP_MARKER = "[...]"
+
+TrimResult = namedtuple("TrimResult", ["text", "original_tokens", "kept_tokens"])
+
+
+def task_budget(task):
+    """Token budget for task, from APPEAL_TOKEN_BUDGET_<TASK> or DEFAULT_BUDGETS."""
+    return int(os.environ.get(f"APPEAL_TOKEN_BUDGET_{task.upper()}", DEFAULT_BUDGETS[task]))
+
+
+def count_tokens(text):
+    """Rough token count (about four characters per token)."""
+    return (len(text) + 3) // 4
+
+
+# ------------------ SEGMENTATION ---------------------
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def _word_windows(text):
+    words = text.split()
+    return [" ".join(words[i:i + MAX_SEGMENT_WORDS]) for i in range(0, len(words), MAX_SEGMENT_WORDS)]
+
+
+def segment(text):
+    """
+    Split text into paragraphs, breaking very long ones at sentence boundaries, and
+    any stretch still over MAX_SEGMENT_WORDS (OCR or form text without punctuation)
+    into word windows, so no segment is too big to keep.
+    """
+    segments = []
+    for paragraph in _PARAGRAPH_BREAK.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph.split()) <= MAX_SEGMENT_WORDS:
+            segments.append(paragraph)
+            continue
+        window = []
+        for sentence in _SENTENCE_END.split(paragraph):
+            window.append(sentence)
+            if sum(len(s.split()) for s in window) >= MAX_SEGMENT_WORDS:
+                segments.extend(_word_windows(" ".join(window)))
+                window = []
+        if window:
+            segments.extend(_word_windows(" ".join(window)))
+    return segments
+
+
+def _keyword_pattern(tasks):
+    keywords = sorted({k for task in tasks for k in TASK_KEYWORDS[task]}, key=len, reverse=True)
+    return re.compile(r"(?<!\w)(?:" + "|".join(re.escape(k) for k in keywords) + r")(?!\w)", re.IGNORECASE)
+
+
+_patterns = {}
+
+
+def score_segments(segments, tasks):
+    """
+    Relevance of each segment to tasks: keyword hits per square-root word, with the
+    first segments boosted for identifiers (letterheads and reference blocks).
+    """
+    key = tuple(sorted(tasks))
+    pattern = _patterns.get(key)
+    if pattern is None:
+        pattern = _patterns[key] = _keyword_pattern(tasks)
+    scores = []
+    for position, seg in enumerate(segments):
+        hits = sum(len(match.group(0).split()) for match in pattern.finditer(seg))
+        score = hits / max(1.0, len(seg.split())) ** 0.5
+        if "identifiers" in tasks and position < 3:
+            score += 1.0 / (position + 1)
+        scores.append(score)
+    return scores
+
+
+# ------------------ TRIMMING -------------------------
+def trim_for_task(text, tasks, budget=None):
+    """
+    Keep only the segments of text most relevant to tasks (a task name or a list of
+    them), packed greedily by score into budget tokens and put back in document order
+    with GAP_MARKER where material was dropped. Text already within budget is
+    returned unchanged. Returns a TrimResult with the token counts before and after.
+    """
+    tasks = [tasks] if isinstance(tasks, str) else list(tasks)
+    budget = budget or max(task_budget(task) for task in tasks)
+    text = text or ""
+    original_tokens = count_tokens(text)
+    if original_tokens <= budget:
+        record_trim(original_tokens, original_tokens)
+        return TrimResult(text, original_tokens, original_tokens)
+
+    segments = segment(text)
+    scores = score_segments(segments, tasks)
+    kept = set()
+    used = 0
+    for index in sorted(range(len(segments)), key=lambda i: scores[i], reverse=True):
+        cost = count_tokens(segments[index]) + 1
+        if used + cost > budget:
+            continue
+        kept.add(index)
+        used += cost
+    if not kept and segments:
+        # Even one segment is over budget: keep as much of the best one as fits
+        best = max(range(len(segments)), key=lambda i: scores[i])
+        words = segments[best].split()
+        while len(words) > 1 and count_tokens(" ".join(words)) + 1 > budget:
+            words = words[:len(words) // 2]
+        segments[best] = " ".join(words)[:max(1, budget - 1) * 4]
+        kept.add(best)
+
+    parts = []
+    for index, seg in enumerate(segments):
+        if index in kept:
+            parts.append(seg)
+        elif not parts or parts[-1] != GAP_MARKER:
+            parts.append(GAP_MARKER)
+    trimmed = "\n\n".join(parts)
+    kept_tokens = count_tokens(trimmed)
+    record_trim(original_tokens, kept_tokens)
+    return TrimResult(trimmed, original_tokens, kept_tokens)
+
+
+def trim_text(text, tasks, budget=None):
+    """trim_for_task, returning just the text."""
+    return trim_for_task(text, tasks, budget).text
+
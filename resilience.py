@@ -0,0 +1,189 @@
+import os
+import random
+import threading
+import time
+
+from google.api_core import exceptions as google_exceptions
+
+from metrics import record_retry
+
+# ------------------ SETTINGS -------------------------
+# Defaults match the gemini-2.0-flash free tier; raise them for paid quotas
+REQUESTS_PER_MINUTE = float(os.environ.get("APPEAL_GEMINI_RPM", "15"))
+TOKENS_PER_MINUTE = float(os.environ.get("APPEAL_GEMINI_TPM", "1000000"))
+MAX_RETRIES = int(os.environ.get("APPEAL_GEMINI_MAX_RETRIES", "4"))
+BACKOFF_BASE = float(os.environ.get("APPEAL_GEMINI_BACKOFF_BASE", "1.0"))
+BACKOFF_MAX = float(os.environ.get("APPEAL_GEMINI_BACKOFF_MAX", "30.0"))
+BREAKER_THRESHOLD = int(os.environ.get("APPEAL_GEMINI_BREAKER_THRESHOLD", "5"))
+BREAKER_COOLDOWN = float(os.environ.get("APPEAL_GEMINI_BREAKER_COOLDOWN", "30.0"))
+# Budget reserved for the response when estimating a call's token cost
+OUTPUT_TOKEN_ESTIMATE = 1024
+
+RETRYABLE_ERRORS = (
+    google_exceptions.TooManyRequests,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.InternalServerError,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+    ConnectionError,
+    TimeoutError,
+)
+
+
+class GeminiUnavailable(Exception):
+    """The Gemini API could not produce a response (quota, outage, or open circuit)."""
+
+
+class CircuitOpenError(GeminiUnavailable):
+    """Raised without calling the API while the circuit breaker is open."""
+
+
+# ------------------ TOKEN BUCKET ---------------------
+class TokenBucket:
+    """
+    Classic token bucket: holds up to capacity tokens and refills at rate tokens per second.
+    """
+
+    def __init__(self, capacity, rate):
+        self.capacity = capacity
+        self.rate = rate
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount):
+        """
+        Take amount tokens (going into debt if needed) and return how long the caller
+        must wait before the reservation is covered.
+        """
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= amount
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute limits applied together.
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60.0)
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60.0)
+
+    def acquire(self, token_cost):
+        """Block until one request costing token_cost tokens fits in both quotas."""
+        delay = max(self.requests.reserve(1), self.tokens.reserve(token_cost))
+        if delay > 0:
+            time.sleep(delay)
+
+
+# ------------------ CIRCUIT BREAKER ------------------
+class CircuitBreaker:
+    """
+    Opens after threshold consecutive failures and fails fast for cooldown seconds.
+    After the cooldown one trial call is let through (half-open): success closes the
+    circuit, failure opens it again.
+    """
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at < self.cooldown:
+                return "open"
+            return "half-open"
+
+    def before_call(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at < self.cooldown or self._trial_in_flight:
+                raise CircuitOpenError("Gemini API circuit is open; failing fast")
+            self._trial_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """Free the half-open trial slot of a call that ended without an outcome."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+# Shared by every Gemini call in the process
+rate_limiter = RateLimiter(REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE)
+circuit_breaker = CircuitBreaker(BREAKER_THRESHOLD, BREAKER_COOLDOWN)
+
+
+def estimate_tokens(prompt):
+    """Rough token count for quota accounting (about four characters per token)."""
+    return len(str(prompt)) // 4 + OUTPUT_TOKEN_ESTIMATE
+
+
+def backoff_delay(attempt):
+    """Full-jitter exponential backoff for the given 0-based retry attempt."""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+
+# ------------------ GUARDED CALL ---------------------
+def guarded_call(func, token_cost, max_retries=None):
+    """
+    Run func() under the shared rate limiter and circuit breaker.
+
+    Retryable errors (429, 5xx, timeouts, dropped connections) are retried with jittered
+    exponential backoff and raise GeminiUnavailable once retries run out. Other errors
+    (bad request, permission denied, ...) are raised immediately and leave the breaker as it was.
+    """
+    max_retries = MAX_RETRIES if max_retries is None else max_retries
+    attempt = 0
+    while True:
+        circuit_breaker.before_call()
+        recorded = False
+        try:
+            rate_limiter.acquire(token_cost)
+            try:
+                result = func()
+            except RETRYABLE_ERRORS as e:
+                circuit_breaker.record_failure()
+                recorded = True
+                if attempt >= max_retries:
+                    raise GeminiUnavailable(f"Gemini API unavailable after {attempt + 1} attempts: {e}") from e
+                record_retry()
+                time.sleep(backoff_delay(attempt))
+                attempt += 1
+                continue
+            circuit_breaker.record_success()
+            recorded = True
+            return result
+        finally:
+            # A client-side error says nothing about API health, and neither does
+            # KeyboardInterrupt or a Streamlit rerun/stop: nothing is recorded, but a
+            # half-open trial must not hold the circuit open for good
+            if not recorded:
+                circuit_breaker.release_trial()
@@ -0,0 +1,110 @@
+import threading
+
+# ------------------ SINGLE FLIGHT --------------------
+class Flight:
+    """One in-flight call; followers wait on done and then read result or error."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.abandoned = False
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key: the first caller (the leader) runs
+    the call, later callers wait for it and share its result or its exception.
+
+    Cancellation-safe: a leader that is interrupted by anything other than an ordinary
+    exception (a closed generator, a Streamlit rerun, KeyboardInterrupt) abandons the
+    flight instead of handing followers its interruption, and a waiting follower then
+    takes over. A follower that waits longer than timeout stops waiting and makes
+    the call itself. Safe to share between threads.
+    """
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._stats = {"leaders": 0, "coalesced": 0, "abandoned": 0, "follower_timeouts": 0}
+
+    def begin(self, key):
+        """
+        Join the flight for key or start one. Returns (flight, is_leader); a leader
+        must end the flight with finish() on every path.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self._stats["coalesced"] += 1
+                return flight, False
+            flight = self._flights[key] = Flight()
+            self._stats["leaders"] += 1
+            return flight, True
+
+    def finish(self, key, flight, result=None, error=None, abandoned=False):
+        """Publish the leader's outcome and wake the followers."""
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            if abandoned:
+                self._stats["abandoned"] += 1
+        flight.result = result
+        flight.error = error
+        flight.abandoned = abandoned
+        flight.done.set()
+
+    def wait(self, flight, timeout=None):
+        """
+        Wait for a flight joined as a follower. Returns (True, result), raises the
+        leader's exception, or returns (False, None) if the leader abandoned the
+        flight or it outlasted timeout, in which case the caller should go on alone.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        if not flight.done.wait(timeout):
+            with self._lock:
+                self._stats["follower_timeouts"] += 1
+            return False, None
+        if flight.abandoned:
+            return False, None
+        if flight.error is not None:
+            raise flight.error
+        return True, flight.result
+
+    def do(self, key, func, on_coalesced=None):
+        """
+        Return func() for key, sharing one execution between concurrent callers.
+        on_coalesced is called in a follower before it starts waiting.
+        """
+        while True:
+            flight, leader = self.begin(key)
+            if leader:
+                return self._lead(key, flight, func)
+            if on_coalesced is not None:
+                on_coalesced()
+            finished, result = self.wait(flight)
+            if finished:
+                return result
+            if not flight.abandoned:
+                return func()  # timed out waiting; the leader may be stuck
+            # The leader was interrupted: try again, most likely as the new leader
+
+    def _lead(self, key, flight, func):
+        try:
+            result = func()
+        except Exception as e:
+            self.finish(key, flight, error=e)
+            raise
+        except BaseException:
+            self.finish(key, flight, abandoned=True)
+            raise
+        self.finish(key, flight, result=result)
+        return result
+
+    def stats(self):
+        """Counts for this process; coalesced is the number of calls saved."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._flights)
+        return stats
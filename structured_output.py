@@ -0,0 +1,153 @@
+import json
+import re
+from functools import partial
+
+from llm_cache import cached_generate
+from metrics import record_retry
+
+# ------------------ ERRORS ---------------------------
+class StructuredOutputError(ValueError):
+    """A response that stayed unusable as the requested JSON, even after a repair attempt."""
+
+    def __init__(self, message, problems=None, text=""):
+        super().__init__(message)
+        self.problems = problems or []
+        self.text = text
+
+
+# ------------------ TOLERANT PARSING -----------------
+_FENCE = re.compile(r"```(?:json|JSON)?\s*\n?(.*?)```", re.DOTALL)
+
+
+def parse_json_object(text):
+    """
+    Read a JSON object out of model output: the whole text, else the contents of a
+    ```json fence, else the first {...} object that decodes. Raises
+    StructuredOutputError when there is none.
+    """
+    text = (text or "").strip()
+    candidates = [text] + [match.group(1).strip() for match in _FENCE.finditer(text)]
+    for candidate in candidates:
+        try:
+            data = json.loads(candidate)
+        except ValueError:
+            continue
+        if isinstance(data, dict):
+            return data
+    decoder = json.JSONDecoder()
+    for match in re.finditer(r"\{", text):
+        try:
+            data, _ = decoder.raw_decode(text, match.start())
+        except ValueError:
+            continue
+        if isinstance(data, dict):
+            return data
+    raise StructuredOutputError("No JSON object in the response", ["response is not a JSON object"], text)
+
+
+# ------------------ VALIDATION -----------------------
+_TRUE = {"true", "yes", "1"}
+_FALSE = {"false", "no", "0"}
+
+
+def _coerce(value, field_schema):
+    """Return (value, problem): value converted to the schema type, or a description of why not."""
+    kind = field_schema.get("type", "STRING")
+    if kind == "BOOLEAN":
+        if isinstance(value, bool):
+            return value, None
+        if isinstance(value, str) and value.strip().lower() in _TRUE | _FALSE:
+            return value.strip().lower() in _TRUE, None
+        return None, f"expected true or false, got {value!r}"
+    if kind == "STRING":
+        if isinstance(value, (dict, list)):
+            return None, f"expected a string, got {type(value).__name__}"
+        value = "" if value is None else str(value).strip()
+        allowed = field_schema.get("enum")
+        if allowed and value not in allowed:
+            match = next((option for option in allowed if option.lower() == value.lower()), None)
+            if match is None:
+                return None, f"{value!r} is not one of {', '.join(allowed)}"
+            value = match
+        return value, None
+    if kind in ("INTEGER", "NUMBER"):
+        try:
+            return (int(value) if kind == "INTEGER" else float(value)), None
+        except (TypeError, ValueError):
+            return None, f"expected a number, got {value!r}"
+    return value, None
+
+
+def validate(data, schema):
+    """
+    Check a parsed object against an OBJECT response schema (the Gemini schema
+    dialect used for response_schema) and coerce near misses: "true" for a boolean,
+    a number for a string, an enum value in the wrong case. Returns the cleaned dict
+    with only the schema's properties; raises StructuredOutputError listing every
+    problem.
+    """
+    properties = schema.get("properties", {})
+    cleaned = {}
+    problems = []
+    for prop in schema.get("required", []):
+        if prop not in data:
+            problems.append(f"{prop}: missing")
+    for prop, field_schema in properties.items():
+        if prop not in data:
+            continue
+        value, problem = _coerce(data[prop], field_schema)
+        if problem:
+            problems.append(f"{prop}: {problem}")
+        else:
+            cleaned[prop] = value
+    if problems:
+        raise StructuredOutputError("Response does not match the schema", problems, json.dumps(data))
+    return cleaned
+
+
+def _usable(text, schema):
+    try:
+        validate(parse_json_object(text), schema)
+    except StructuredOutputError:
+        return False
+    return True
+
+
+# ------------------ GENERATION -----------------------
+def repair_prompt(prompt, text, problems, schema):
+    """Ask the model to fix its own output, naming exactly what was wrong with it."""
+    return (
+        f"{prompt}\n\n"
+        "Your previous answer could not be used:\n"
+        f"{text[:4000]}\n\n"
+        "Problems:\n" + "\n".join(f"- {problem}" for problem in problems) + "\n\n"
+        "Reply with only a corrected JSON object matching this schema, no other text:\n"
+        f"{json.dumps(schema)}"
+    )
+
+
+def generate_structured(model, prompt, schema):
+    """
+    Ask Gemini for a JSON object matching schema, in JSON mode with the schema
+    enforced, and return it parsed and validated (see validate). Output that still
+    cannot be used, e.g. fenced or with a missing field, gets one repair call that
+    shows the model its answer and the problems; if that fails too,
+    StructuredOutputError is raised. Responses go through the shared cache, but only
+    usable ones are kept, so a failure is not replayed from it.
+    """
+    config = {"response_mime_type": "application/json", "response_schema": schema}
+    accept = partial(_usable, schema=schema)
+    response = cached_generate(model, prompt, generation_config=config, accept=accept)
+    try:
+        return validate(parse_json_object(response.text), schema)
+    except StructuredOutputError as e:
+        problems = e.problems
+
+    record_retry()
+    response = cached_generate(model, repair_prompt(prompt, response.text, problems, schema),
+                               generation_config=config, accept=accept)
+    try:
+        data = validate(parse_json_object(response.text), schema)
+    except StructuredOutputError as e:
+        raise StructuredOutputError("Response unusable after one repair attempt", e.problems, response.text)
+    return data
@@ -0,0 +1,234 @@
+import contextvars
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# ------------------ SETTINGS -------------------------
+# Upper bound on graph tasks (Gemini calls) in flight across the whole process: every
+# GraphRun, i.e. every Streamlit session, batch case and service job, shares one pool
+MAX_CONCURRENCY = int(os.environ.get("APPEAL_MAX_CONCURRENCY", "4"))
+# Seconds a single call may take before its fallback is used instead
+CALL_TIMEOUT = float(os.environ.get("APPEAL_CALL_TIMEOUT", "60"))
+
+
+class TaskTimeout(Exception):
+    """Raised (recorded) when a task runs past its timeout."""
+
+
+class UpstreamFailed(Exception):
+    """Recorded for a task that was skipped because a dependency failed."""
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY, thread_name_prefix="appeal-task")
+    return _executor
+
+
+def _check_graph(tasks):
+    for name, (_, deps) in tasks.items():
+        missing = [dep for dep in deps if dep not in tasks]
+        if missing:
+            raise ValueError(f"Task '{name}' depends on unknown task(s): {', '.join(missing)}")
+    resolved = set()
+    remaining = dict(tasks)
+    while remaining:
+        ready = [n for n, (_, deps) in remaining.items() if all(d in resolved for d in deps)]
+        if not ready:
+            raise ValueError(f"Dependency cycle between tasks: {', '.join(remaining)}")
+        for name in ready:
+            resolved.add(name)
+            del remaining[name]
+
+
+# ------------------ GRAPH RUNNER ---------------------
+class GraphRun:
+    """
+    A dependency graph of calls running in the background on the process-wide task
+    pool (MAX_CONCURRENCY threads), or on executor if one is given.
+
+    tasks maps a name to (func, deps); func is called with the results of deps
+    as positional arguments, in order. Tasks start as soon as their dependencies
+    finish, so wall time follows the critical path rather than the sum of calls.
+    timeout may be a number or a {name: seconds} dict, counted from when the task
+    starts running rather than while it waits for a free worker. A task that raises or runs
+    past its timeout gets fallbacks[name] (None if absent; if callable, it is called with
+    the exception and its return value used); its dependents are not run and get their
+    own fallbacks, with UpstreamFailed recorded in errors. A timeout abandons the call
+    rather than cancelling it: its thread runs on, holding a pool slot, until the call
+    returns, and its result is discarded.
+    """
+
+    def __init__(self, tasks, fallbacks=None, executor=None, timeout=None):
+        _check_graph(tasks)
+        self.tasks = tasks
+        self.fallbacks = fallbacks or {}
+        self.executor = executor
+        self.timeout = CALL_TIMEOUT if timeout is None else timeout
+        self.results = {}
+        self.errors = {}
+        self._started = {}  # name -> monotonic time its worker picked it up
+        self._finished = {name: threading.Event() for name in tasks}
+        # Tasks run in a copy of the caller's context, so their stages join its trace
+        self._thread = threading.Thread(target=contextvars.copy_context().run, args=(self._schedule,),
+                                        name="appeal-graph", daemon=True)
+        self._thread.start()
+
+    def _task_timeout(self, name):
+        if isinstance(self.timeout, dict):
+            return self.timeout.get(name, CALL_TIMEOUT)
+        return self.timeout
+
+    def _run(self, name, func, *args):
+        self._started[name] = time.monotonic()
+        return func(*args)
+
+    def _deadline(self, name, now):
+        # A task still queued for a free worker has not used any of its timeout yet
+        return self._started.get(name, now) + self._task_timeout(name)
+
+    def _fail(self, name, error):
+        fallback = self.fallbacks.get(name)
+        self._finish(name, fallback(error) if callable(fallback) else fallback, error)
+
+    def _finish(self, name, value, error=None):
+        if error is not None:
+            self.errors[name] = error
+        self.results[name] = value
+        self._finished[name].set()
+
+    def _schedule(self):
+        pending = dict(self.tasks)
+        running = {}  # future -> name
+        executor = self.executor or _get_executor()
+        while pending or running:
+            # Submit everything whose dependencies are resolved; a failed dependency
+            # fails its dependents without running them, so fallbacks never feed a prompt
+            ready = [n for n, (_, deps) in pending.items() if all(d in self.results for d in deps)]
+            while ready:
+                for name in ready:
+                    func, deps = pending.pop(name)
+                    failed = [d for d in deps if d in self.errors]
+                    if failed:
+                        self._fail(name, UpstreamFailed(f"'{name}' skipped: {', '.join(failed)} failed"))
+                        continue
+                    args = [self.results[d] for d in deps]
+                    future = executor.submit(contextvars.copy_context().run, self._run, name, func, *args)
+                    running[future] = name
+                ready = [n for n, (_, deps) in pending.items() if all(d in self.results for d in deps)]
+
+            if not running:
+                break
+
+            now = time.monotonic()
+            next_deadline = min(self._deadline(name, now) for name in running.values())
+            done, _ = wait(running, timeout=max(0.0, next_deadline - now),
+                           return_when=FIRST_COMPLETED)
+
+            for future in done:
+                name = running.pop(future)
+                try:
+                    self._finish(name, future.result())
+                except Exception as e:
+                    self._fail(name, e)
+
+            now = time.monotonic()
+            for future, name in list(running.items()):
+                if self._deadline(name, now) <= now:
+                    # The worker thread cannot be interrupted; stop waiting on it
+                    running.pop(future)
+                    self._fail(name, TaskTimeout(f"'{name}' timed out after {self._task_timeout(name)}s"))
+
+    def result(self, name, timeout=None):
+        """
+        Block until task name is finished and return its result, re-raising its error if it failed.
+        """
+        if not self._finished[name].wait(timeout):
+            raise TaskTimeout(f"'{name}' not finished after {timeout}s")
+        if name in self.errors:
+            raise self.errors[name]
+        return self.results[name]
+
+    def wait(self):
+        """
+        Block until every task is finished. Returns (results, errors): two dicts keyed by task name.
+        """
+        self._thread.join()
+        return dict(self.results), dict(self.errors)
+
+
+# ------------------ STAGE MEMO -----------------------
+class StageMemo:
+    """
+    The latest result of each stage, keyed by a hash of the inputs it was computed
+    from. Kept in st.session_state, it lets a rerun or button click recompute only
+    the stages whose inputs changed. One entry per stage, so memory stays bounded
+    however many documents a session goes through.
+    """
+
+    def __init__(self):
+        self._entries = {}  # stage -> (input key, result)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def input_key(inputs):
+        payload = json.dumps(inputs, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def lookup(self, stage, inputs):
+        """Return (True, result) if stage was last computed from inputs, else (False, None)."""
+        key = self.input_key(inputs)
+        with self._lock:
+            entry = self._entries.get(stage)
+            if entry is not None and entry[0] == key:
+                self.hits += 1
+                return True, entry[1]
+            self.misses += 1
+        return False, None
+
+    def set(self, stage, inputs, result):
+        """Record result as stage's output for inputs, replacing any older one. Returns result."""
+        with self._lock:
+            self._entries[stage] = (self.input_key(inputs), result)
+        return result
+
+    def recorder(self, stage, inputs, func):
+        """Wrap func so a successful result is recorded; failures are not memoized."""
+        return lambda *args: self.set(stage, inputs, func(*args))
+
+    def invalidate(self, stage=None):
+        with self._lock:
+            if stage is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(stage, None)
+
+
+def memoize_tasks(tasks, memo, inputs):
+    """
+    Rewrite a task graph against a StageMemo: tasks whose inputs[name] are unchanged
+    return their recorded result at once without waiting on dependencies, the rest
+    run as before and record what they return. Tasks missing from inputs are kept as is.
+    """
+    wrapped = {}
+    for name, (func, deps) in tasks.items():
+        if name not in inputs:
+            wrapped[name] = (func, deps)
+            continue
+        hit, result = memo.lookup(name, inputs[name])
+        if hit:
+            wrapped[name] = (lambda result=result: result, [])
+        else:
+            wrapped[name] = (memo.recorder(name, inputs[name], func), deps)
+    return wrapped
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The modules live at the repository root, next to the apps
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Keep the response cache and near-duplicate index in memory, away from .appeal_cache
+os.environ["APPEAL_CACHE_DIR"] = ""
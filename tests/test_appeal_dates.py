@@ -0,0 +1,94 @@
+from datetime import date
+
+import pytest
+
+from appeal_dates import appeal_deadline, detect_plan, notice_date, parse_date, stated_window
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("2025-03-01", date(2025, 3, 1)),
+    ("03/01/2025", date(2025, 3, 1)),
+    ("25/03/2024", date(2024, 3, 25)),
+    ("3-1-25", date(2025, 3, 1)),
+    ("March 1, 2025", date(2025, 3, 1)),
+    ("Sept. 9 2024", date(2024, 9, 9)),
+    ("1st of March 2025", date(2025, 3, 1)),
+    ("02/30/2025", None),
+    ("not a date", None),
+])
+def test_parse_date(value, expected):
+    assert parse_date(value) == expected
+
+
+def test_notice_date_prefers_the_labelled_notice_over_service_and_birth_dates():
+    text = (
+        "Patient DOB: 04/12/1980\n"
+        "Date of service: 01/15/2025\n"
+        "Date of denial: February 3, 2025\n"
+    )
+    mention = notice_date(text)
+    assert mention.date == date(2025, 2, 3)
+    assert mention.label == "notice"
+
+
+def test_notice_date_none_when_only_negative_dates():
+    assert notice_date("Date of birth: 04/12/1980") is None
+
+
+@pytest.mark.parametrize("text, days", [
+    ("You may appeal within 180 days of this notice.", 180),
+    ("Your appeal must be filed no later than sixty (60) calendar days after this letter.", 60),
+    ("You may request a review within one hundred and eighty days.", 180),
+    # When the plan answers is not the member's window
+    ("We will respond to your appeal within 30 days.", None),
+    ("Call us within 10 days.", None),
+])
+def test_stated_window(text, days):
+    assert stated_window(text) == days
+
+
+def test_detect_plan_ignores_conditional_urgent_mentions():
+    assert detect_plan("Your employer-sponsored plan is governed by ERISA.") == ("employer", "standard")
+    assert detect_plan("If your claim is an urgent care claim, you may ask for a faster review.") == ("", "standard")
+    assert detect_plan("This is an expedited review determination.") == ("", "urgent")
+
+
+def test_default_deadline_is_thirty_days_from_the_notice():
+    deadline = appeal_deadline("Date of denial: March 1, 2025\nYour claim was denied.")
+    assert deadline.notice_date == date(2025, 3, 1)
+    assert deadline.days == 30
+    assert deadline.deadline == date(2025, 3, 31)
+
+
+def test_extracted_denial_date_wins_over_the_scanner():
+    deadline = appeal_deadline("Letter date: January 5, 2025", {"Denial Date": "2025-02-01"})
+    assert deadline.notice_date == date(2025, 2, 1)
+    assert deadline.denial_date == "2025-02-01"
+
+
+def test_urgent_letter_keeps_the_plan_filing_window():
+    text = ("Date of denial: March 1, 2025. Your employer-sponsored plan is governed by ERISA. "
+            "This is an expedited review determination.")
+    deadline = appeal_deadline(text)
+    assert deadline.days == 180
+    assert deadline.deadline == date(2025, 8, 28)
+    assert deadline.rule["urgency"] == "urgent"
+    assert "72 hours" in deadline.rule["note"]
+
+
+def test_urgent_rule_decides_the_days_only_without_a_plan_rule():
+    deadline = appeal_deadline("Date of denial: March 1, 2025. This is an expedited review determination.")
+    assert deadline.days == 30
+    assert deadline.rule["urgency"] == "urgent"
+
+
+def test_stated_window_overrides_the_rules():
+    text = "Date of denial: March 1, 2025. Medicare Advantage. You may appeal within 90 days."
+    deadline = appeal_deadline(text)
+    assert deadline.days == 90
+    assert deadline.deadline == date(2025, 5, 30)
+
+
+def test_no_notice_date_means_no_deadline():
+    deadline = appeal_deadline("Your claim was denied.")
+    assert deadline.deadline is None
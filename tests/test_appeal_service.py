@@ -0,0 +1,115 @@
+import base64
+import time
+
+import pytest
+from starlette.testclient import TestClient
+
+import appeal_service
+from appeal_service import AppealService, JobStore, create_app
+
+
+def fake_process_case(denial_text, claim_text):
+    if "not a letter" in denial_text:
+        return {"status": "rejected", "errors": {"screen": "not a denial letter"}}
+    return {"status": "ok", "final_letter": f"Appeal of: {denial_text}", "case_details": {"Claim Number": "CL-1"},
+            "errors": {}}
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setattr(appeal_service, "process_case", fake_process_case)
+    service = AppealService(JobStore(str(tmp_path / "jobs.sqlite3")), workers=1, queue_size=2)
+    yield service
+    service.stop(timeout=5)
+
+
+@pytest.fixture
+def client(service):
+    return TestClient(create_app(service, max_body_mb=0.01))
+
+
+def _wait_finished(client, job_id):
+    for _ in range(200):
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_submit_poll_and_download(service, client):
+    service.start()
+    claim = {"filename": "claim.txt", "content_type": "text/plain",
+             "data": base64.b64encode(b"claim form text").decode()}
+    response = client.post("/jobs", json={"denial_text": "denied for necessity", "claim": claim})
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    assert response.headers["location"] == f"/jobs/{job_id}"
+
+    job = _wait_finished(client, job_id)
+    assert job["status"] == "succeeded"
+    assert job["case_details"] == {"Claim Number": "CL-1"}
+    assert client.get(f"/jobs/{job_id}/letter").text == "Appeal of: denied for necessity"
+    pdf = client.get(f"/jobs/{job_id}/letter.pdf")
+    assert pdf.headers["content-type"] == "application/pdf" and pdf.content.startswith(b"%PDF")
+    assert client.get(f"/jobs/{job_id}/letter.txt").status_code == 404
+
+
+def test_rejected_job_has_no_letter(service, client):
+    service.start()
+    job_id = client.post("/jobs", json={"denial_text": "not a letter", "claim_text": "x"}).json()["job_id"]
+    assert _wait_finished(client, job_id)["status"] == "rejected"
+    assert client.get(f"/jobs/{job_id}/letter").status_code == 409
+
+
+def test_unfinished_job_answers_409_with_retry_after(client):
+    job_id = client.post("/jobs", json={"denial_text": "a", "claim_text": "b"}).json()["job_id"]
+    response = client.get(f"/jobs/{job_id}/result")
+    assert response.status_code == 409
+    assert int(response.headers["retry-after"]) >= 1
+
+
+def test_full_queue_answers_429(client):
+    for _ in range(2):
+        assert client.post("/jobs", json={"denial_text": "a", "claim_text": "b"}).status_code == 202
+    response = client.post("/jobs", json={"denial_text": "a", "claim_text": "b"})
+    assert response.status_code == 429
+    assert "retry-after" in response.headers
+
+
+@pytest.mark.parametrize("body, message", [
+    (b"not json", "must be JSON"),
+    (b"[1]", "JSON object"),
+    (b'{"denial_text": "a"}', "'claim_text'"),
+    (b'{"denial_text": "a", "claim": {"data": "***"}}', "not valid base64"),
+])
+def test_bad_submissions_answer_400(client, body, message):
+    response = client.post("/jobs", content=body, headers={"content-type": "application/json"})
+    assert response.status_code == 400
+    assert message in response.json()["error"]
+
+
+def test_oversized_body_answers_413(client):
+    response = client.post("/jobs", content=b"x" * 20000)
+    assert response.status_code == 413
+
+
+def test_unknown_job_and_route_answer_json_404(client):
+    assert client.get("/jobs/missing").json() == {"error": "No such job."}
+    assert client.get("/nowhere").status_code == 404
+
+
+def test_interrupted_jobs_are_requeued_on_start(service):
+    job_id = service.store.create({"denial": {"text": "a"}, "claim": {"text": "b"}})
+    assert service.store.claim_next()[0] == job_id
+    assert service.start() == 1
+    for _ in range(200):
+        if service.store.get(job_id)["status"] == "succeeded":
+            break
+        time.sleep(0.01)
+    assert service.store.get(job_id)["status"] == "succeeded"
+
+
+def test_health_and_metrics(client):
+    assert client.get("/health").json()["queue_size"] == 2
+    assert client.get("/metrics").text.startswith("# HELP appeal_stage_seconds")
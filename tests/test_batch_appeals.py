@@ -0,0 +1,66 @@
+import io
+import json
+
+import pytest
+
+import batch_appeals
+from batch_appeals import letter_filename, load_cases, load_checkpoint, run_batch
+
+
+def fake_process_case(denial_text, claim_text):
+    if "broken" in denial_text:
+        raise RuntimeError("extraction failed")
+    return {"status": "ok", "final_letter": f"Appeal: {denial_text}", "errors": {}}
+
+
+@pytest.fixture
+def case_dir(tmp_path):
+    cases = tmp_path / "cases"
+    for case_id, denial in (("A1", "denied"), ("B2", "broken"), ("C3", "denied again")):
+        folder = cases / case_id
+        folder.mkdir(parents=True)
+        (folder / "denial.txt").write_text(denial)
+        (folder / "claim.txt").write_text("claim")
+    (cases / "incomplete").mkdir()
+    (cases / "incomplete" / "denial.txt").write_text("no claim here")
+    return cases
+
+
+def test_letter_filenames_do_not_collide():
+    assert letter_filename("case-17.v2") == "case-17.v2.docx"
+    names = {letter_filename(case_id) for case_id in ("A/1", "A 1", "A_1", "A:1")}
+    assert len(names) == 4
+    assert all("/" not in name and " " not in name for name in names)
+
+
+def test_cases_from_a_directory_skip_incomplete_folders(case_dir):
+    assert [case["case_id"] for case in load_cases(str(case_dir))] == ["A1", "B2", "C3"]
+
+
+def test_cases_from_a_manifest(tmp_path):
+    manifest = tmp_path / "cases.jsonl"
+    manifest.write_text('{"case_id": "x", "denial": "d.pdf", "claim": "c.pdf"}\n\n{"denial": "d2", "claim": "c2"}\n')
+    cases = load_cases(str(manifest))
+    assert [case["case_id"] for case in cases] == ["x", "3"]
+    assert cases[0]["denial"] == str(tmp_path / "d.pdf")
+    manifest.write_text('{"case_id": "x", "denial": "d.pdf"}\n')
+    with pytest.raises(ValueError, match="missing claim"):
+        load_cases(str(manifest))
+
+
+def test_batch_resumes_and_retries_only_errors(case_dir, tmp_path, monkeypatch):
+    monkeypatch.setattr(batch_appeals, "process_case", fake_process_case)
+    out = tmp_path / "out"
+    summary = run_batch(load_cases(str(case_dir)), str(out), workers=2, log=io.StringIO())
+    assert (summary["ok"], summary["error"], summary["processed"]) == (2, 1, 3)
+    assert sorted(p.name for p in out.glob("*.docx")) == ["A1.docx", "C3.docx"]
+    assert (out / "metrics.prom").exists()
+    assert load_checkpoint(str(out)) == {"A1", "C3"}
+
+    with open(out / "results.jsonl", "a", encoding="utf-8") as f:
+        f.write('{"case_id": "torn')  # a crash mid-write
+    summary = run_batch(load_cases(str(case_dir)), str(out), workers=2, log=io.StringIO())
+    assert (summary["skipped"], summary["processed"], summary["error"]) == (2, 1, 1)
+    records = [json.loads(line) for line in (out / "results.jsonl").read_text().splitlines()
+               if not line.startswith('{"case_id": "torn')]
+    assert [r["case_id"] for r in records if r["status"] == "error"] == ["B2", "B2"]
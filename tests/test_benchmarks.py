@@ -0,0 +1,21 @@
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_pipeline_benchmark_runs_offline_against_the_fake(tmp_path):
+    command = [sys.executable, os.path.join(ROOT, "benchmarks", "pipeline.py"), "--cases", "2", "--pages", "1",
+               "--formats", "txt,pdf", "--sessions", "2", "--latency", "0.001", "--sigma", "0",
+               "--tokens-per-second", "1000000", "-o", str(tmp_path / "results")]
+    env = dict(os.environ, APPEAL_CACHE_DIR=str(tmp_path / "cache"), GOOGLE_API_KEY="")
+    subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True, check=True, timeout=120)
+
+    (result_file,) = (tmp_path / "results").glob("pipeline-*.json")
+    result = json.loads(result_file.read_text())
+    assert [case["status"] for case in result["cases"]] == ["ok"] * 4
+    assert result["summary"]["gemini"]["calls"] > 0
+    history = (tmp_path / "results" / "history.jsonl").read_text().splitlines()
+    assert len(history) == 1
@@ -0,0 +1,70 @@
+import pytest
+
+import case_extraction
+from case_extraction import extract_case_details
+from structured_output import StructuredOutputError
+
+DENIAL = """Dear Member,
+Member ID: ZXC90210
+Claim Number: CL-55120
+We have reviewed your claim for the knee arthroscopy performed on May 9, 2024. Your claim was denied because the
+surgery is not medically necessary under the criteria in your plan's coverage guidelines. You have the right to
+appeal this determination within 180 days. Please include any records from your provider with your appeal."""
+AMBIGUOUS_DENIAL = ("Thank you for contacting us about your recent visit. We looked at the bill and want to explain "
+                    "the amount you owe and how the payment was applied to your account this month.")
+CLAIM = ("Patient Name: Mary Jones\nThe patient has chronic knee pain and failed a trial of physical therapy. "
+         "Surgery is medically necessary per the physician's examination; diagnosis and treatment history are attached.")
+
+
+@pytest.fixture
+def unusable_response(monkeypatch):
+    def generate_structured(model, prompt, schema):
+        raise StructuredOutputError("Response unusable after one repair attempt", ["response is not a JSON object"])
+
+    monkeypatch.setattr(case_extraction, "require_model", object)
+    monkeypatch.setattr(case_extraction, "generate_structured", generate_structured)
+
+
+def test_unusable_response_falls_back_to_local_fields_for_accepted_letters(unusable_response):
+    details = extract_case_details(DENIAL, CLAIM)
+    assert details["Member ID"] == "ZXC90210"
+    assert details["Claim Number"] == "CL-55120"
+    assert details["Denial Reason"] == "Not Medically Necessary"
+    assert details["Denial Is Genuine"] is True and details["Claim Is Genuine"] is True
+    assert details["Insurance Company Name"] == ""
+
+
+def test_unusable_response_is_raised_when_the_model_had_to_judge(unusable_response):
+    with pytest.raises(StructuredOutputError):
+        extract_case_details(AMBIGUOUS_DENIAL, CLAIM)
+
+
+def test_one_call_asks_only_for_what_the_local_passes_missed(monkeypatch):
+    calls = []
+
+    def generate_structured(model, prompt, schema):
+        calls.append(schema)
+        return {"patient_name": "Mary Jones", "insurance_company_name": "Acme Health", "denial_reason": "bogus",
+                "denial_explanation": "The surgery was not considered necessary."}
+
+    monkeypatch.setattr(case_extraction, "require_model", object)
+    monkeypatch.setattr(case_extraction, "generate_structured", generate_structured)
+    details = extract_case_details(DENIAL, CLAIM)
+
+    assert len(calls) == 1
+    asked = set(calls[0]["properties"])
+    assert {"member_id", "claim_number", "denial_reason", "denial_is_genuine", "claim_is_genuine"}.isdisjoint(asked)
+    assert {"patient_name", "insurance_company_name", "denial_explanation"} <= asked
+    assert calls[0]["required"] == list(calls[0]["properties"])
+    # Local results win over anything the model returned for the same field
+    assert details["Denial Reason"] == "Not Medically Necessary"
+    assert (details["Member ID"], details["Patient Name"]) == ("ZXC90210", "Mary Jones")
+
+
+def test_parse_case_details_fills_gaps_and_maps_unknown_reasons():
+    details = case_extraction.parse_case_details({"denial_reason": "Made up", "denial_is_genuine": 1,
+                                                  "member_id": " A1 "})
+    assert details["Denial Reason"] == "Other"
+    assert details["Denial Is Genuine"] is True and details["Claim Is Genuine"] is False
+    assert details["Member ID"] == "A1"
+    assert details["Patient Name"] == ""
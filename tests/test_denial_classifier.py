@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from denial_classifier import DenialReasonClassifier, classify_denial, default_classifier, tokenize
+
+
+@pytest.mark.parametrize("letter, category", [
+    ("Dear member. Your claim was denied because the MRI was not medically necessary based on our "
+     "clinical criteria. You may appeal within 180 days.", "Not Medically Necessary"),
+    ("Dear member. We denied the claim because prior authorization was not obtained before the surgery.",
+     "Pre-Authorization Required"),
+])
+def test_clear_letters_are_decided_locally(letter, category):
+    assert classify_denial(letter)[0] == category
+
+
+def test_letters_without_a_reason_are_left_to_the_model():
+    category, probability = classify_denial("Hello there.")
+    assert category is None
+    assert probability < 0.5
+
+
+def test_statement_picks_the_reason_sentence_over_boilerplate():
+    letter = ("Claim number CL-1 was reviewed. Please send any additional records with your appeal. "
+              "The service was denied because it is experimental and investigational.")
+    assert default_classifier().statement(letter).startswith("The service was denied because")
+
+
+def test_probabilities_sum_to_one():
+    probabilities = default_classifier().predict_proba(["not covered", "records missing"])
+    assert probabilities.shape == (2, len(default_classifier().categories))
+    assert np.allclose(probabilities.sum(axis=1), 1.0)
+
+
+def test_tokenize_drops_stopwords_and_adds_bigrams():
+    assert tokenize("The claim was denied") == ["claim", "denied", "claim denied"]
+
+
+def test_save_and_load_round_trip(tmp_path):
+    classifier = default_classifier()
+    path = tmp_path / "model.npz"
+    classifier.save(str(path))
+    loaded = DenialReasonClassifier.load(str(path))
+    letter = "This procedure is excluded under your plan."
+    assert loaded.rank(letter) == pytest.approx(classifier.rank(letter))
+    assert loaded.categories == classifier.categories
+
+
+def test_training_rejects_unknown_categories():
+    with pytest.raises(ValueError, match="Unknown categories"):
+        DenialReasonClassifier.train([("text", "Made Up")])
@@ -0,0 +1,99 @@
+import io
+import uuid
+
+import pytest
+
+import document_text
+from document_text import extract_pdf_text, extract_text
+from letter_export import export_letter
+from upload_limits import MemoryBudget
+
+LINES = [f"Line {i} of the appeal letter body text." for i in range(200)]
+
+
+@pytest.fixture(scope="module")
+def pdf_bytes():
+    return export_letter("\n".join(LINES), "pdf")  # five pages
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_pages_come_back_in_order(pdf_bytes, tmp_path, monkeypatch, workers):
+    monkeypatch.setattr(document_text, "PDF_WORKERS", workers)
+    monkeypatch.setattr(document_text, "PDF_PAGES_PER_TASK", 2)
+    path = tmp_path / "letter.pdf"
+    path.write_bytes(pdf_bytes)
+    for source in (pdf_bytes, str(path)):
+        assert extract_pdf_text(source).split("\n") == LINES
+
+
+def test_bytes_are_sent_to_each_worker_once(monkeypatch):
+    monkeypatch.setattr(document_text, "PDF_WORKERS", 3)
+    monkeypatch.setattr(document_text, "PDF_PAGES_PER_TASK", 4)
+    pages = list(range(20))
+    assert len(document_text._page_chunks(pages, b"%PDF")) == 3
+    assert len(document_text._page_chunks(pages, "/tmp/upload.pdf")) == 5
+    assert [p for chunk in document_text._page_chunks(pages, b"%PDF") for p in chunk] == pages
+
+
+def test_only_pages_without_a_text_layer_are_ocrd(pdf_bytes, monkeypatch):
+    blank = {1, 3}
+    ocr_calls = []
+
+    def text_layer_pages(source, indices):
+        return ["" if i in blank else f"page {i} has plenty of text on it" for i in indices]
+
+    def ocr_pdf_pages(source, indices, parallel=1):
+        ocr_calls.append((list(indices), parallel))
+        return [f"ocr {i}" for i in indices]
+
+    monkeypatch.setattr(document_text, "PDF_WORKERS", 1)
+    monkeypatch.setattr(document_text, "OCR_WORKERS", 4)
+    monkeypatch.setattr(document_text, "_pdfium", lambda: object())
+    monkeypatch.setattr(document_text, "_text_layer_pages", text_layer_pages)
+    monkeypatch.setattr(document_text, "_ocr_pdf_pages", ocr_pdf_pages)
+    text = extract_pdf_text(pdf_bytes)
+    assert ocr_calls == [([1, 3], 2)]
+    assert text.split("\n")[:4] == ["page 0 has plenty of text on it", "ocr 1",
+                                    "page 2 has plenty of text on it", "ocr 3"]
+
+
+def test_ocr_parallelism_falls_back_to_one_page_when_memory_is_short(monkeypatch):
+    budget = MemoryBudget(session_bytes=document_text.PAGE_WORKING_BYTES * 1.5)
+    monkeypatch.setattr(document_text, "memory_budget", budget)
+    with document_text._reserve_renders(4, "session") as parallel:
+        assert parallel == 1
+        assert budget.stats()["used_bytes"] == document_text.PAGE_WORKING_BYTES
+    assert budget.stats()["used_bytes"] == 0
+
+
+def test_reuploads_are_served_from_the_text_cache(monkeypatch):
+    calls = []
+
+    def extract_uncached(upload, filename, file_type, session=None):
+        calls.append(filename)
+        return b"".join(upload.chunks()).decode()
+
+    monkeypatch.setattr(document_text, "_extract_uncached", extract_uncached)
+    # Unique content, so nothing cached by another test is hit
+    content = f"A denial letter, cached by content. {uuid.uuid4()}".encode()
+    assert extract_text(content, "denial.txt", "text/plain") == content.decode()
+    stream = io.BytesIO(content)
+    assert extract_text(stream, "renamed.txt", "text/plain") == content.decode()
+    assert calls == ["denial.txt"]
+    assert stream.tell() == 0  # hashed and rewound, never spooled
+
+    extract_text(content, "denial.pdf", "application/pdf")  # another extraction branch
+    assert calls == ["denial.txt", "denial.pdf"]
+
+
+def test_cache_key_follows_content_and_branch():
+    key = document_text.text_cache_key
+    assert key("abc", "a.txt", "text/plain") == key("abc", "b.TXT", "text/plain")
+    assert len({key("abc", "a.txt", "text/plain"), key("abd", "a.txt", "text/plain"),
+                key("abc", "a.pdf", "text/plain"), key("abc", "a.txt", "image/png")}) == 4
+
+
+def test_text_files_are_decoded_across_chunk_boundaries(monkeypatch):
+    monkeypatch.setattr("upload_limits.CHUNK_BYTES", 3)
+    text = f"Résumé — ünïcödé {uuid.uuid4()}"
+    assert extract_text(io.BytesIO(text.encode("utf-8")), "note.txt", "text/plain") == text
@@ -0,0 +1,85 @@
+import os
+import signal
+import threading
+
+import google.generativeai as genai
+import pytest
+
+import gemini_client
+from resilience import GeminiUnavailable
+
+
+@pytest.fixture
+def env_file(tmp_path, monkeypatch):
+    """A fresh client registry reading tmp_path/.env on every lookup; returns (path, configured keys)."""
+    path = tmp_path / ".env"
+    configured = []
+    monkeypatch.setenv("GOOGLE_API_KEY", "")
+    monkeypatch.setattr(gemini_client, "find_dotenv", lambda: str(path))
+    monkeypatch.setattr(gemini_client, "ENV_CHECK_INTERVAL", 0)
+    monkeypatch.setattr(genai, "configure", lambda api_key: configured.append(api_key))
+    for name, value in (("_loaded", False), ("_api_key", None), ("_models", {}), ("_env_path", ""),
+                        ("_env_mtime", None), ("_next_env_check", 0.0),
+                        ("_reload_requested", threading.Event())):
+        monkeypatch.setattr(gemini_client, name, value)
+    return path, configured
+
+
+def _write(path, key, mtime):
+    path.write_text(f"GOOGLE_API_KEY={key}\n")
+    os.utime(path, (mtime, mtime))
+
+
+def test_models_are_shared_until_the_env_file_changes(env_file):
+    path, configured = env_file
+    _write(path, "first-key", 1_000_000)
+    model = gemini_client.get_model("gemini-test")
+    assert gemini_client.get_model("gemini-test") is model
+    assert configured == ["first-key"]
+
+    _write(path, "second-key", 2_000_000)
+    assert gemini_client.get_api_key() == "second-key"
+    assert gemini_client.get_model("gemini-test") is not model
+    assert configured == ["first-key", "second-key"]
+
+
+def test_env_file_is_not_checked_between_intervals(env_file, monkeypatch):
+    path, configured = env_file
+    _write(path, "first-key", 1_000_000)
+    gemini_client.get_api_key()
+    monkeypatch.setattr(gemini_client, "_next_env_check", float("inf"))
+    _write(path, "second-key", 2_000_000)
+    assert gemini_client.get_api_key() == "first-key"
+
+
+def test_missing_key_raises_gemini_unavailable(env_file):
+    path, configured = env_file
+    assert gemini_client.get_model() is None
+    with pytest.raises(GeminiUnavailable):
+        gemini_client.require_model()
+    assert configured == []
+
+
+def test_reload_signal_only_flags_the_reload(env_file):
+    path, configured = env_file
+    _write(path, "first-key", 1_000_000)
+    gemini_client.get_api_key()
+    previous = signal.getsignal(signal.SIGHUP)
+    try:
+        assert gemini_client.install_reload_signal()
+        # Same mtime, so only the signal can trigger this reload
+        _write(path, "second-key", 1_000_000)
+        signal.raise_signal(signal.SIGHUP)
+        assert gemini_client._reload_requested.is_set()
+        assert configured == ["first-key"]
+        assert gemini_client.get_api_key() == "second-key"
+    finally:
+        signal.signal(signal.SIGHUP, previous)
+
+
+def test_reload_signal_is_not_installed_off_the_main_thread():
+    installed = []
+    thread = threading.Thread(target=lambda: installed.append(gemini_client.install_reload_signal()))
+    thread.start()
+    thread.join()
+    assert installed == [False]
@@ -0,0 +1,50 @@
+import pytest
+
+from identifiers import CONFIDENCE_THRESHOLD, confident_identifiers, extract_identifiers
+
+FORM = """Member ID: ABC12345
+Claim #: CL-99812
+Policy Number:
+POL778899
+Patient Name: John Smith DOB 01/02/1980
+Date of Denial: March 3, 2024
+"""
+
+
+def test_labelled_fields_are_found_in_one_pass():
+    assert confident_identifiers(FORM) == {
+        "Member ID": "ABC12345",
+        "Claim Number": "CL-99812",
+        "Policy Number": "POL778899",  # value on the line after the label
+        "Patient Name": "John Smith",  # stops at the next label
+        "Denial Date": "March 3, 2024",
+    }
+
+
+def test_an_empty_field_does_not_take_the_next_label():
+    assert extract_identifiers("Member ID:\nPatient Name: Jane Doe") == {"Patient Name": ("Jane Doe", 0.85)}
+
+
+@pytest.mark.parametrize("text", [
+    "Policy number: see enclosed",
+    "Claim Number: NUMBER",
+    "Patient Name: INFORMATION Below",
+])
+def test_labels_without_a_value_are_ignored(text):
+    assert confident_identifiers(text) == {}
+
+
+def test_subject_line_is_not_taken_as_a_name():
+    assert confident_identifiers("RE: Notice of Adverse Benefit Determination") == {}
+    assert extract_identifiers("RE: Jane Doe\nPatient: John Smith")["Patient Name"] == ("John Smith", 0.85)
+
+
+def test_conflicting_values_drop_below_the_threshold():
+    value, confidence = extract_identifiers("Member ID: ABC12345\nMember ID: XYZ98765")["Member ID"]
+    assert value == "ABC12345"
+    assert confidence < CONFIDENCE_THRESHOLD
+
+
+def test_repeated_value_keeps_its_confidence():
+    found = extract_identifiers("Claim No. CL-99812 ... claim number: cl-99812")
+    assert found["Claim Number"] == ("CL-99812", 0.95)
@@ -0,0 +1,97 @@
+import io
+import re
+
+import pytest
+
+from letter_export import export_cache, export_letter, inline_runs, parse_letter, render_pdf
+
+LETTER = """# Appeal of Claim Denial
+
+Jane Doe
+123 Main Street
+
+Dear Claims Reviewer,
+
+I am writing to appeal the denial of the **MRI** for my patient, which was *not* medically necessary per your review.
+
+- Physical therapy for six weeks
+- Two courses of NSAIDs
+1. Radiology report
+2. Clinical notes (attached)
+"""
+
+
+def _xref(pdf):
+    start = int(re.search(rb"startxref\n(\d+)\n%%EOF\n$", pdf).group(1))
+    header = re.match(rb"xref\n0 (\d+)\n", pdf[start:])
+    count = int(header.group(1))
+    table = pdf[start + header.end():].split(b"\n")[:count]
+    return start, count, table
+
+
+def test_inline_runs():
+    assert inline_runs("a **b** *c* d") == [("a ", False, False), ("b", True, False), (" ", False, False),
+                                            ("c", False, True), (" d", False, False)]
+
+
+def test_parse_letter_blocks():
+    kinds = [block[0] for block in parse_letter(LETTER)]
+    assert kinds == ["heading", "paragraph", "paragraph", "paragraph",
+                     "bullet", "bullet", "numbered", "numbered"]
+    address = parse_letter(LETTER)[1]
+    assert len(address[1]) == 2  # the address lines stay one paragraph
+
+
+def test_pdf_xref_offsets_point_at_their_objects():
+    pdf = render_pdf(LETTER)
+    assert pdf.startswith(b"%PDF-1.4\n")
+    start, count, table = _xref(pdf)
+    assert pdf[start:start + 4] == b"xref"
+    assert table[0] == b"0000000000 65535 f "
+    for number, entry in enumerate(table[1:], 1):
+        offset = int(entry[:10])
+        assert entry.endswith(b" 00000 n ")
+        assert pdf[offset:].startswith(b"%d 0 obj\n" % number)
+    assert re.search(rb"/Size %d " % count, pdf)
+
+
+def test_pdf_stream_lengths_match():
+    pdf = render_pdf(LETTER)
+    for match in re.finditer(rb"<< /Length (\d+) >>\nstream\n", pdf):
+        length = int(match.group(1))
+        assert pdf[match.end() + length:].startswith(b"\nendstream")
+
+
+def test_long_letter_spans_pages():
+    pdf = render_pdf("\n\n".join(f"Paragraph {i} " + "word " * 60 for i in range(40)))
+    pages = int(re.search(rb"/Type /Pages /Kids \[[^\]]*\] /Count (\d+)", pdf).group(1))
+    assert pages > 1
+    _, count, table = _xref(pdf)
+    assert len(table) == count
+
+
+def test_pdf_escapes_parentheses_and_backslashes():
+    pdf = render_pdf("Notes (see C:\\records)")
+    assert rb"\(see" in pdf and rb"C:\\records\)" in pdf
+
+
+def test_pdf_readable_by_a_pdf_library():
+    PyPDF2 = pytest.importorskip("PyPDF2")
+    reader = PyPDF2.PdfReader(io.BytesIO(render_pdf(LETTER)))
+    text = reader.pages[0].extract_text()
+    assert "Appeal" in text and "MRI" in text
+
+
+def test_docx_renders():
+    docx = pytest.importorskip("docx")
+    document = docx.Document(io.BytesIO(export_letter(LETTER, "docx")))
+    assert document.paragraphs[0].text == "Appeal of Claim Denial"
+    assert any(run.bold and run.text == "MRI" for p in document.paragraphs for run in p.runs)
+
+
+def test_export_is_cached_and_rejects_unknown_formats():
+    export_cache.clear()
+    first = export_letter("Hello", "pdf")
+    assert export_letter("Hello", "pdf") is first
+    with pytest.raises(ValueError):
+        export_letter("Hello", "rtf")
@@ -0,0 +1,54 @@
+import pytest
+
+from case_extraction import extract_case_details
+from letter_screen import char_entropy, screen_letter
+
+DENIAL = """Dear Member,
+Member ID: ABC12345
+Claim Number: CL-99812
+We have reviewed your claim for the MRI performed on March 3, 2024. Your claim was denied because the service
+is not medically necessary under the criteria in your plan's coverage guidelines. You have the right to appeal this
+determination within 180 days. Please include any records from your provider with your appeal."""
+
+CLAIM = ("Patient Name: John Smith\nThe patient has chronic back pain and failed a trial of physical therapy. "
+         "An MRI is medically necessary per the physician's examination; diagnosis and treatment history are attached.")
+
+
+def test_real_letters_are_accepted():
+    assert screen_letter(DENIAL, "denial").verdict == "accept"
+    assert screen_letter(CLAIM, "claim").verdict == "accept"
+
+
+@pytest.mark.parametrize("text", [
+    "Too short.",
+    "test " * 40,  # repeated filler: entropy too low
+    "asdkjh qwe9 zxmcn " * 10,  # no English, no domain words
+    "I went to the store yesterday and bought some apples and oranges for the party that we are "
+    "having at the house on the weekend with friends.",
+])
+def test_non_letters_are_rejected(text):
+    assert screen_letter(text, "denial").verdict == "reject"
+
+
+def test_borderline_letters_are_left_to_the_model():
+    text = ("Thank you for contacting us about your recent visit. We looked at the bill and want to explain "
+            "the amount you owe and how the payment was applied to your account this month.")
+    result = screen_letter(text, "denial")
+    assert result.verdict == "ambiguous"
+    assert 0.3 < result.score < 0.7
+
+
+def test_char_entropy():
+    assert char_entropy("") == 0.0
+    assert char_entropy("aaaa") == 0.0
+    assert char_entropy("abAB") == pytest.approx(1.0)
+
+
+def test_a_rejected_letter_never_reaches_gemini(monkeypatch):
+    def no_model():
+        raise AssertionError("Gemini was called")
+
+    monkeypatch.setattr("case_extraction.require_model", no_model)
+    details = extract_case_details("test " * 40, CLAIM)
+    assert details["Denial Is Genuine"] is False
+    assert details["Claim Is Genuine"] is True
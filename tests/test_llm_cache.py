@@ -0,0 +1,56 @@
+import itertools
+from types import SimpleNamespace
+
+import pytest
+
+from llm_cache import cached_generate, llm_flights, stream_generate
+
+_models = itertools.count()
+
+
+class StreamingModel:
+    """Streams chunks for stream=True calls and answers plain calls whole; counts both."""
+
+    def __init__(self, chunks):
+        self.model_name = f"streaming-{next(_models)}"
+        self.chunks = chunks
+        self.calls = 0
+
+    def generate_content(self, prompt, stream=False, generation_config=None):
+        self.calls += 1
+        if stream:
+            return [SimpleNamespace(text=chunk) for chunk in self.chunks]
+        return SimpleNamespace(text="".join(self.chunks), usage_metadata=None)
+
+
+def test_stream_yields_chunks_then_caches_the_whole_text():
+    model = StreamingModel(["Dear ", "Reviewer,", " please reconsider."])
+    assert list(stream_generate(model, "write")) == ["Dear ", "Reviewer,", " please reconsider."]
+    assert cached_generate(model, "write").text == "Dear Reviewer, please reconsider."
+    assert list(stream_generate(model, "write")) == ["Dear Reviewer, please reconsider."]
+    assert model.calls == 1
+
+
+def test_a_stream_closed_early_is_not_cached_and_releases_its_flight():
+    model = StreamingModel(["one ", "two ", "three"])
+    stream = stream_generate(model, "write")
+    assert next(stream) == "one "
+    stream.close()
+    assert llm_flights.stats()["in_flight"] == 0
+    assert list(stream_generate(model, "write")) == ["one ", "two ", "three"]
+    assert model.calls == 2
+
+
+def test_an_error_mid_stream_reaches_the_caller():
+    class BrokenStream(StreamingModel):
+        def generate_content(self, prompt, stream=False, generation_config=None):
+            def chunks():
+                yield SimpleNamespace(text="partial")
+                raise ConnectionResetError("stream dropped")
+            return chunks()
+
+    stream = stream_generate(BrokenStream([]), "write")
+    assert next(stream) == "partial"
+    with pytest.raises(ConnectionResetError):
+        next(stream)
+    assert llm_flights.stats()["in_flight"] == 0
@@ -0,0 +1,83 @@
+import json
+
+import pytest
+
+from metrics import (PRICE_INPUT_PER_M, PRICE_OUTPUT_PER_M, Registry, instrumented, record_cache, record_retry,
+                     record_trim, record_usage, registry, stage, trace)
+
+
+@pytest.fixture(autouse=True)
+def fresh_registry():
+    registry.reset()
+    yield
+    registry.reset()
+
+
+def test_stage_attributes_usage_to_the_innermost_span(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    with trace("request") as current:
+        with stage("letter"):
+            record_usage({"prompt_tokens": 1000, "output_tokens": 200})
+            record_cache(False)
+            with stage("extract"):
+                record_cache(True)
+                record_retry()
+                record_trim(500, 300)
+        current.finish(str(path))
+
+    spans = {span["stage"]: span for span in current.breakdown()}
+    assert spans["extract"]["parent"] == "letter"
+    assert (spans["extract"]["cache_hits"], spans["extract"]["retries"]) == (1, 1)
+    assert spans["extract"]["prompt_tokens_saved"] == 200
+    assert spans["letter"]["input_tokens"] == 1000 and spans["letter"]["cache_misses"] == 1
+    totals = current.totals()
+    assert totals["cost_usd"] == pytest.approx((1000 * PRICE_INPUT_PER_M + 200 * PRICE_OUTPUT_PER_M) / 1e6)
+    assert (totals["prompt_tokens_saved"], totals["errors"]) == (200, 0)
+    assert json.loads(path.read_text().splitlines()[0])["name"] == "request"
+
+
+def test_usage_outside_a_stage_is_ignored():
+    record_usage({"prompt_tokens": 5})
+    record_retry()
+    assert registry.tokens == {}
+
+
+def test_an_exception_marks_the_stage_failed():
+    with pytest.raises(ValueError):
+        with stage("extract"):
+            raise ValueError("bad input")
+    assert registry.calls == {("extract", "error"): 1}
+
+
+def test_a_stream_closed_early_is_not_a_failure():
+    @instrumented("stream")
+    def chunks():
+        yield "a"
+        yield "b"
+
+    stream = chunks()
+    assert next(stream) == "a"
+    stream.close()
+    assert registry.calls == {("stream", "ok"): 1}
+
+
+def test_prometheus_histogram_is_cumulative():
+    metrics = Registry(buckets=(0.1, 1.0))
+    for seconds in (0.05, 0.5, 5.0):
+        with stage("letter") as span:
+            pass
+        span.seconds = seconds
+        metrics.observe(span)
+    text = metrics.prometheus_text()
+    assert 'appeal_stage_seconds_bucket{stage="letter",le="0.1"} 1' in text
+    assert 'appeal_stage_seconds_bucket{stage="letter",le="1.0"} 2' in text
+    assert 'appeal_stage_seconds_bucket{stage="letter",le="+Inf"} 3' in text
+    assert 'appeal_stage_seconds_count{stage="letter"} 3' in text
+    assert 'appeal_stage_calls_total{stage="letter",status="ok"} 3' in text
+
+
+def test_write_prometheus_replaces_the_file(tmp_path):
+    path = tmp_path / "appeal.prom"
+    path.write_text("stale")
+    registry.write_prometheus(str(path))
+    assert path.read_text().startswith("# HELP appeal_stage_seconds")
@@ -0,0 +1,93 @@
+import hashlib
+
+import pytest
+
+import near_duplicates
+from near_duplicates import (NUM_PERM, NearDuplicateIndex, grounded_in, quoted_in, shingles, signature,
+                             similarity)
+
+LETTER = (
+    "Patient Name: {name}\n"
+    "Member ID: {member}\n"
+    "We reviewed the request for an MRI of the lumbar spine received on 01/12/2025. "
+    "The request is denied because it is not medically necessary. Our guidelines require "
+    "six weeks of conservative therapy, including physical therapy, before advanced imaging. "
+    "The records provided do not show that conservative treatment was tried and failed. "
+    "You or your doctor may appeal this decision within 180 days of this letter."
+)
+OTHER = (
+    "Dear Member, your claim for ambulance transport was denied because the provider is out of "
+    "network and your plan does not cover out-of-network services except in an emergency. "
+    "Please contact customer service with any questions about your benefits."
+)
+
+
+def reference_signature(text):
+    """Plain-Python MinHash: min over shingles of (a * h + b) mod p, for each permutation."""
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big")
+              for s in shingles(text)]
+    prime = near_duplicates._PRIME
+    return tuple(min((a * (h % prime) + b) % prime for h in hashes) for a, b in near_duplicates._PERMUTATIONS)
+
+
+@pytest.mark.parametrize("text", [LETTER.format(name="Jane Doe", member="ABC12345"), OTHER, "four words only here"])
+def test_vectorized_signature_matches_reference(text):
+    sig = signature(text)
+    assert len(sig) == NUM_PERM
+    assert sig == reference_signature(text)
+
+
+def test_signature_none_for_empty_text():
+    assert signature("") is None
+
+
+def test_identifiers_and_digits_do_not_change_the_signature():
+    first = signature(LETTER.format(name="Jane Doe", member="ABC12345"))
+    second = signature(LETTER.format(name="John Roe", member="XYZ98765").replace("01/12/2025", "03/04/2024"))
+    assert similarity(first, second) == 1.0
+
+
+def test_unrelated_letters_are_dissimilar():
+    assert similarity(signature(LETTER.format(name="Jane Doe", member="ABC12345")), signature(OTHER)) < 0.2
+
+
+def test_index_returns_fields_of_a_near_duplicate_only():
+    index = NearDuplicateIndex(threshold=0.9)
+    index.remember(LETTER.format(name="Jane Doe", member="ABC12345"), denial_reason="Medical Necessity")
+    score, fields = index.lookup(LETTER.format(name="John Roe", member="XYZ98765"))
+    assert score >= 0.9
+    assert fields == {"denial_reason": "Medical Necessity"}
+    assert index.lookup(OTHER) is None
+
+
+def test_index_merges_fields_and_evicts_least_recent():
+    index = NearDuplicateIndex(max_entries=1)
+    letter = LETTER.format(name="Jane Doe", member="ABC12345")
+    index.remember(letter, denial_reason="Medical Necessity")
+    index.remember(letter, xai_explanation={"explanation": "x"})
+    assert index.lookup(letter)[1] == {"denial_reason": "Medical Necessity", "xai_explanation": {"explanation": "x"}}
+    index.remember(OTHER, denial_reason="Out of Network")
+    assert index.lookup(letter) is None
+    assert index.stats()["evictions"] == 1
+
+
+def test_index_persists_as_json(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    letter = LETTER.format(name="Jane Doe", member="ABC12345")
+    NearDuplicateIndex(path=path).remember(letter, denial_reason="Medical Necessity")
+    reopened = NearDuplicateIndex(path=path)
+    assert reopened.lookup(letter)[1] == {"denial_reason": "Medical Necessity"}
+    raw = reopened._db.execute("SELECT fields FROM fingerprints").fetchone()[0]
+    assert raw == '{"denial_reason":"Medical Necessity"}'
+
+
+def test_quoted_in_ignores_case_and_whitespace():
+    assert quoted_in("NOT  medically\nnecessary", "The request is not medically necessary.")
+    assert not quoted_in("", "anything")
+
+
+def test_grounded_in_rejects_another_members_details():
+    text = LETTER.format(name="Jane Doe", member="ABC12345")
+    assert grounded_in("The MRI was denied. Conservative therapy is required first.", text)
+    assert not grounded_in("The MRI for John Roe was denied.", text)
+    assert not grounded_in("Member XYZ98765 must appeal.", text)
@@ -0,0 +1,66 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from ocr import decode_image, decoded_bytes, deskew, downsample, estimate_skew, layout_text, ocr_array
+
+
+def _box(x, y, width=40, height=10):
+    return [[x, y], [x + width, y], [x + width, y + height], [x, y + height]]
+
+
+def _lined_page(angle=0.0):
+    """A white page with dark text-like bars, rotated angle degrees counter-clockwise."""
+    page = np.full((400, 400), 255, dtype=np.uint8)
+    for top in range(40, 360, 30):
+        for left in range(40, 340, 60):
+            page[top:top + 8, left:left + 45] = 0
+    if angle:
+        page = np.asarray(Image.fromarray(page).rotate(angle, resample=Image.BILINEAR, fillcolor=255))
+    return page
+
+
+@pytest.mark.parametrize("angle", [-3.0, 0.0, 2.0])
+def test_estimate_skew_finds_the_rotation(angle):
+    assert estimate_skew(_lined_page(angle)) == pytest.approx(angle, abs=0.5)
+
+
+def test_deskew_leaves_a_straight_page_alone():
+    page = _lined_page()
+    assert deskew(page) is page
+    assert abs(estimate_skew(deskew(_lined_page(3.0)))) < 0.5
+
+
+def test_downsample_to_the_target_dpi_or_max_side():
+    page = np.zeros((1200, 900), dtype=np.uint8)
+    assert downsample(page, source_dpi=600, target_dpi=150).shape == (300, 225)
+    assert downsample(page, source_dpi=200, target_dpi=150) is page  # under 2x: left alone
+    assert downsample(page, max_side=400).shape == (400, 300)
+
+
+def test_large_jpeg_is_decoded_at_reduced_scale():
+    data = io.BytesIO()
+    Image.new("L", (2400, 1600), 255).save(data, "JPEG", dpi=(600, 600))
+    gray, dpi = decode_image(data.getvalue(), target_dpi=150)
+    assert gray.shape == (400, 600)
+    assert dpi == pytest.approx(150)
+    assert decoded_bytes(data.getvalue(), target_dpi=150) == gray.size
+
+
+def test_layout_text_restores_reading_order_and_drops_noise():
+    boxes = np.array([_box(100, 52), _box(10, 10), _box(10, 50), _box(60, 11), _box(200, 200)], dtype=float)
+    texts = ["third", "Member", "Claim", "ID", "smudge"]
+    confidences = np.array([0.9, 0.95, 0.9, 0.8, 0.05])
+    result = layout_text(boxes, texts, confidences)
+    assert result.text == "Member ID\nClaim third"
+    assert result.texts == ["Member", "ID", "Claim", "third"]
+
+
+def test_ocr_array_with_no_recognitions():
+    class EmptyReader:
+        def readtext(self, gray):
+            return []
+
+    assert ocr_array(EmptyReader(), np.zeros((10, 10), dtype=np.uint8)).text == ""
@@ -0,0 +1,49 @@
+from prompt_trimming import (GAP_MARKER, MAX_SEGMENT_WORDS, count_tokens, segment, task_budget,
+                             trim_for_task, trim_text)
+
+FILLER = "The weather in the region was mild and the office hours are unchanged this season."
+RATIONALE = "Your claim was denied because the service is not medically necessary under our coverage criteria."
+
+
+def _document(filler_paragraphs=40):
+    paragraphs = [FILLER] * filler_paragraphs
+    paragraphs.insert(filler_paragraphs // 2, RATIONALE)
+    return "\n\n".join(paragraphs)
+
+
+def test_text_within_budget_is_unchanged():
+    result = trim_for_task("short letter", "denial_rationale")
+    assert result.text == "short letter"
+    assert result.original_tokens == result.kept_tokens
+
+
+def test_relevant_segment_is_kept_and_gaps_are_marked():
+    text = _document()
+    result = trim_for_task(text, "denial_rationale", budget=60)
+    assert RATIONALE in result.text
+    assert GAP_MARKER in result.text
+    assert f"{GAP_MARKER}\n\n{GAP_MARKER}" not in result.text  # adjacent gaps collapse
+    assert result.kept_tokens <= 60 < result.original_tokens == count_tokens(text)
+
+
+def test_kept_segments_stay_in_document_order():
+    first = "Member ID: ABC12345 Claim number CL-1 for patient John Smith."
+    text = "\n\n".join([first] + [FILLER] * 30 + [RATIONALE])
+    trimmed = trim_text(text, ["identifiers", "denial_rationale"], budget=60)
+    assert trimmed.index(first) < trimmed.index(RATIONALE)
+
+
+def test_a_single_oversized_segment_is_cut_to_fit():
+    words = " ".join(["denied"] * 400)
+    result = trim_for_task(words, "denial_rationale", budget=20)
+    assert 0 < result.kept_tokens <= 20
+
+
+def test_long_unpunctuated_text_is_split_into_windows():
+    segments = segment(" ".join(["word"] * (MAX_SEGMENT_WORDS * 2 + 5)))
+    assert [len(s.split()) for s in segments] == [MAX_SEGMENT_WORDS, MAX_SEGMENT_WORDS, 5]
+
+
+def test_budget_can_be_overridden_from_the_environment(monkeypatch):
+    monkeypatch.setenv("APPEAL_TOKEN_BUDGET_IDENTIFIERS", "123")
+    assert task_budget("identifiers") == 123
@@ -0,0 +1,147 @@
+import time
+
+import pytest
+from google.api_core import exceptions as google_exceptions
+
+import resilience
+from resilience import CircuitBreaker, CircuitOpenError, GeminiUnavailable, RateLimiter, TokenBucket, guarded_call
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    """A fresh shared breaker and an unlimited rate limiter; backoff sleeps are skipped."""
+    breaker = CircuitBreaker(threshold=2, cooldown=0.05)
+    monkeypatch.setattr(resilience, "circuit_breaker", breaker)
+    monkeypatch.setattr(resilience, "rate_limiter", RateLimiter(1e9, 1e12))
+    monkeypatch.setattr(resilience, "backoff_delay", lambda attempt: 0.0)
+    return breaker
+
+
+def _open(breaker):
+    for _ in range(breaker.threshold):
+        breaker.before_call()
+        breaker.record_failure()
+
+
+def test_breaker_opens_after_threshold_failures():
+    breaker = CircuitBreaker(threshold=2, cooldown=60)
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker(threshold=2, cooldown=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+
+def test_half_open_lets_one_trial_through():
+    breaker = CircuitBreaker(threshold=1, cooldown=0.01)
+    _open(breaker)
+    time.sleep(0.02)
+    assert breaker.state == "half-open"
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()  # the trial is still in flight
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_failed_trial_reopens():
+    breaker = CircuitBreaker(threshold=3, cooldown=0.01)
+    _open(breaker)
+    time.sleep(0.02)
+    breaker.before_call()
+    breaker.record_failure()  # one failure is enough in half-open
+    assert breaker.state == "open"
+
+
+def test_release_trial_frees_the_slot_without_closing():
+    breaker = CircuitBreaker(threshold=1, cooldown=0.01)
+    _open(breaker)
+    time.sleep(0.02)
+    breaker.before_call()
+    breaker.release_trial()
+    assert breaker.state == "half-open"
+    breaker.before_call()
+
+
+def test_guarded_call_retries_then_succeeds(breaker):
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 2:
+            raise google_exceptions.ServiceUnavailable("down")
+        return "ok"
+
+    assert guarded_call(flaky, 10, max_retries=3) == "ok"
+    assert len(calls) == 2
+    assert breaker.state == "closed"
+
+
+def test_guarded_call_gives_up_and_opens_the_breaker(breaker):
+    def down():
+        raise google_exceptions.TooManyRequests("quota")
+
+    with pytest.raises(GeminiUnavailable):
+        guarded_call(down, 10, max_retries=1)
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        guarded_call(lambda: "never called", 10)
+
+
+def test_client_error_is_raised_at_once_and_leaves_the_breaker_alone(breaker):
+    breaker.record_failure()
+
+    def bad_request():
+        raise google_exceptions.InvalidArgument("bad prompt")
+
+    with pytest.raises(google_exceptions.InvalidArgument):
+        guarded_call(bad_request, 10)
+    breaker.record_failure()
+    assert breaker.state == "open"  # the earlier failure still counts
+
+
+def test_client_error_does_not_close_a_half_open_breaker(breaker):
+    _open(breaker)
+    time.sleep(0.06)
+
+    def bad_request():
+        raise google_exceptions.InvalidArgument("bad prompt")
+
+    with pytest.raises(google_exceptions.InvalidArgument):
+        guarded_call(bad_request, 10)
+    assert breaker.state == "half-open"
+    assert guarded_call(lambda: "ok", 10) == "ok"  # the trial slot was released
+    assert breaker.state == "closed"
+
+
+def test_interrupted_trial_releases_the_slot(breaker):
+    _open(breaker)
+    time.sleep(0.06)
+
+    def interrupted():
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        guarded_call(interrupted, 10)
+    assert guarded_call(lambda: "ok", 10) == "ok"
+
+
+def test_token_bucket_reports_the_wait_for_debt():
+    bucket = TokenBucket(capacity=2, rate=1.0)
+    assert bucket.reserve(1) == 0.0
+    assert bucket.reserve(1) == 0.0
+    assert bucket.reserve(1) == pytest.approx(1.0, abs=0.05)
+
+
+def test_backoff_delay_is_bounded():
+    for attempt in range(10):
+        assert 0 <= resilience.backoff_delay(attempt) <= resilience.BACKOFF_MAX
@@ -0,0 +1,94 @@
+import threading
+import time
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def _leader_in_flight(flights, key, release, result="shared"):
+    """Start a leader for key on another thread; it returns result once release is set."""
+    started = threading.Event()
+    box = {}
+
+    def lead():
+        started.set()
+        release.wait(5)
+        return result
+
+    thread = threading.Thread(target=lambda: box.setdefault("value", flights.do(key, lead)))
+    thread.start()
+    started.wait(5)
+    return thread, box
+
+
+def test_concurrent_callers_share_one_call():
+    flights = SingleFlight()
+    release = threading.Event()
+    leader, box = _leader_in_flight(flights, "k", release)
+    calls = []
+    followers = [threading.Thread(target=lambda: calls.append(flights.do("k", lambda: "own")))
+                 for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    while flights.stats()["coalesced"] < 3:
+        time.sleep(0.005)
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join(5)
+    assert box["value"] == "shared"
+    assert calls == ["shared"] * 3
+    assert flights.stats() == {"leaders": 1, "coalesced": 3, "abandoned": 0,
+                               "follower_timeouts": 0, "in_flight": 0}
+
+
+def test_followers_get_the_leaders_exception():
+    flights = SingleFlight()
+    flight, leader = flights.begin("k")
+    assert leader
+    joined, leader = flights.begin("k")
+    assert joined is flight and not leader
+    flights.finish("k", flight, error=ValueError("bad"))
+    with pytest.raises(ValueError, match="bad"):
+        flights.wait(joined)
+
+
+def test_abandoned_flight_hands_over_to_a_follower():
+    flights = SingleFlight()
+
+    def interrupted():
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        flights.do("k", interrupted)
+    assert flights.stats()["abandoned"] == 1
+    assert flights.stats()["in_flight"] == 0
+    assert flights.do("k", lambda: "retried") == "retried"
+
+
+def test_follower_waits_for_abandoned_leader_then_leads():
+    flights = SingleFlight()
+    flight, _ = flights.begin("k")
+    joined, _ = flights.begin("k")
+    flights.finish("k", flight, abandoned=True)
+    assert flights.wait(joined) == (False, None)
+    assert flights.do("k", lambda: "new leader") == "new leader"
+
+
+def test_follower_stops_waiting_after_timeout():
+    flights = SingleFlight(timeout=0.01)
+    release = threading.Event()
+    leader, _ = _leader_in_flight(flights, "k", release)
+    try:
+        assert flights.do("k", lambda: "own") == "own"
+    finally:
+        release.set()
+        leader.join(5)
+    assert flights.stats()["follower_timeouts"] == 1
+
+
+def test_different_keys_do_not_coalesce():
+    flights = SingleFlight()
+    assert flights.do("a", lambda: 1) == 1
+    assert flights.do("b", lambda: 2) == 2
+    assert flights.stats()["coalesced"] == 0
@@ -0,0 +1,31 @@
+import os
+import subprocess
+import sys
+
+import document_text
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Loaded on first use only (see benchmarks/startup.py for the timings)
+HEAVY = ("easyocr", "torch", "google.generativeai", "pypdfium2", "cv2")
+
+
+def test_importing_the_pipeline_loads_no_heavy_dependency():
+    script = ("import sys, appeal_pipeline, case_extraction, document_text, gemini_client; "
+              f"print(','.join(m for m in {HEAVY!r} if m in sys.modules))")
+    loaded = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert loaded.stdout.strip() == ""
+
+
+def test_ocr_warm_up_is_off_unless_asked_for(monkeypatch):
+    monkeypatch.setattr(document_text, "OCR_WARMUP", False)
+    assert document_text.warm_up_ocr() is None
+
+
+def test_ocr_warm_up_starts_one_thread(monkeypatch):
+    loads = []
+    monkeypatch.setattr(document_text, "_warmup_thread", None)
+    monkeypatch.setattr(document_text, "load_ocr_model", lambda: loads.append(1))
+    thread = document_text.warm_up_ocr(force=True)
+    assert document_text.warm_up_ocr(force=True) is thread
+    thread.join(5)
+    assert loads == [1]
@@ -0,0 +1,88 @@
+import itertools
+from types import SimpleNamespace
+
+import pytest
+
+from structured_output import StructuredOutputError, generate_structured, parse_json_object, validate
+
+SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "is_genuine": {"type": "BOOLEAN"},
+        "verdict": {"type": "STRING", "enum": ["genuine", "ambiguous", "not_a_letter"]},
+        "pages": {"type": "INTEGER"},
+        "member_id": {"type": "STRING"},
+    },
+    "required": ["is_genuine", "verdict"],
+}
+_models = itertools.count()
+
+
+class ScriptedModel:
+    """Answers each generate_content call with the next reply; a fresh name per instance keeps the cache out of it."""
+
+    def __init__(self, *replies):
+        self.model_name = f"scripted-{next(_models)}"
+        self.replies = list(replies)
+        self.prompts = []
+
+    def generate_content(self, prompt, generation_config=None):
+        self.prompts.append(prompt)
+        return SimpleNamespace(text=self.replies.pop(0), usage_metadata=None)
+
+
+@pytest.mark.parametrize("text", [
+    '{"a": 1}',
+    '```json\n{"a": 1}\n```',
+    'Sure! Here it is: {"a": 1} Let me know.',
+    '[1, 2] then {"a": 1}',
+])
+def test_parse_json_object_tolerates_wrapping(text):
+    assert parse_json_object(text) == {"a": 1}
+
+
+@pytest.mark.parametrize("text", ["", "no json here", "[1, 2]", "{broken"])
+def test_parse_json_object_raises_without_an_object(text):
+    with pytest.raises(StructuredOutputError):
+        parse_json_object(text)
+
+
+def test_validate_coerces_near_misses_and_drops_extras():
+    data = {"is_genuine": "Yes", "verdict": "Genuine", "pages": "3", "member_id": 12345, "extra": 1}
+    assert validate(data, SCHEMA) == {"is_genuine": True, "verdict": "genuine", "pages": 3, "member_id": "12345"}
+
+
+def test_validate_lists_every_problem():
+    with pytest.raises(StructuredOutputError) as info:
+        validate({"is_genuine": "maybe", "pages": "many"}, SCHEMA)
+    assert sorted(info.value.problems) == [
+        "is_genuine: expected true or false, got 'maybe'",
+        "pages: expected a number, got 'many'",
+        "verdict: missing",
+    ]
+
+
+def test_generate_structured_accepts_a_good_first_answer():
+    model = ScriptedModel('{"is_genuine": true, "verdict": "genuine"}')
+    assert generate_structured(model, "classify", SCHEMA) == {"is_genuine": True, "verdict": "genuine"}
+    assert len(model.prompts) == 1
+
+
+def test_generate_structured_repairs_once_naming_the_problems():
+    model = ScriptedModel('{"is_genuine": true}', '{"is_genuine": true, "verdict": "ambiguous"}')
+    assert generate_structured(model, "classify", SCHEMA)["verdict"] == "ambiguous"
+    assert "verdict: missing" in model.prompts[1]
+
+
+def test_generate_structured_gives_up_after_one_repair():
+    model = ScriptedModel("no idea", "still no idea")
+    with pytest.raises(StructuredOutputError, match="after one repair"):
+        generate_structured(model, "classify", SCHEMA)
+    assert len(model.prompts) == 2
+
+
+def test_unusable_answers_are_not_replayed_from_the_cache():
+    model = ScriptedModel("no idea", "still no idea", '{"is_genuine": false, "verdict": "not_a_letter"}')
+    with pytest.raises(StructuredOutputError):
+        generate_structured(model, "classify", SCHEMA)
+    assert generate_structured(model, "classify", SCHEMA)["verdict"] == "not_a_letter"
@@ -0,0 +1,134 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from task_graph import GraphRun, StageMemo, TaskTimeout, UpstreamFailed, memoize_tasks
+
+
+def test_dependencies_receive_upstream_results_in_order():
+    run = GraphRun({
+        "a": (lambda: 2, []),
+        "b": (lambda: 3, []),
+        "sum": (lambda a, b: a * 10 + b, ["a", "b"]),
+    })
+    results, errors = run.wait()
+    assert results == {"a": 2, "b": 3, "sum": 23}
+    assert errors == {}
+
+
+def test_independent_tasks_run_concurrently():
+    barrier = threading.Barrier(2, timeout=2)
+    executor = ThreadPoolExecutor(max_workers=2)
+    try:
+        run = GraphRun({"a": (barrier.wait, []), "b": (barrier.wait, [])}, executor=executor)
+        _, errors = run.wait()
+    finally:
+        executor.shutdown()
+    assert errors == {}  # neither side hit BrokenBarrierError
+
+
+def test_failure_uses_fallback_and_skips_dependents():
+    def boom():
+        raise RuntimeError("nope")
+
+    run = GraphRun(
+        {"a": (boom, []), "b": (lambda a: a + "!", ["a"]), "c": (lambda: "c", [])},
+        fallbacks={"a": "fallback-a", "b": lambda error: type(error).__name__},
+    )
+    results, errors = run.wait()
+    assert results == {"a": "fallback-a", "b": "UpstreamFailed", "c": "c"}
+    assert isinstance(errors["a"], RuntimeError)
+    assert isinstance(errors["b"], UpstreamFailed)
+    with pytest.raises(RuntimeError):
+        run.result("a")
+    assert run.result("c") == "c"
+
+
+def test_timeout_abandons_the_call():
+    release = threading.Event()
+    run = GraphRun({"slow": (lambda: release.wait(5), [])}, fallbacks={"slow": "late"}, timeout=0.05)
+    try:
+        results, errors = run.wait()
+    finally:
+        release.set()
+    assert results["slow"] == "late"
+    assert isinstance(errors["slow"], TaskTimeout)
+
+
+def test_timeout_starts_when_the_task_runs_not_when_queued():
+    # One worker: "second" waits behind "first" for longer than its own timeout
+    executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        run = GraphRun(
+            {"first": (lambda: time.sleep(0.2) or 1, []), "second": (lambda: 2, [])},
+            executor=executor,
+            timeout={"first": 1.0, "second": 0.1},
+        )
+        results, errors = run.wait()
+    finally:
+        executor.shutdown()
+    assert results == {"first": 1, "second": 2}
+    assert errors == {}
+
+
+def test_a_given_executor_is_left_running():
+    executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        GraphRun({"a": (lambda: 1, [])}, executor=executor).wait()
+        assert executor.submit(lambda: "still open").result() == "still open"
+    finally:
+        executor.shutdown()
+
+
+def test_result_times_out_while_running():
+    release = threading.Event()
+    run = GraphRun({"slow": (lambda: release.wait(5), [])}, timeout=10)
+    with pytest.raises(TaskTimeout):
+        run.result("slow", timeout=0.01)
+    release.set()
+    assert run.result("slow", timeout=5) is True
+
+
+@pytest.mark.parametrize("tasks, message", [
+    ({"a": (lambda x: x, ["missing"])}, "unknown task"),
+    ({"a": (lambda b: b, ["b"]), "b": (lambda a: a, ["a"])}, "cycle"),
+])
+def test_invalid_graphs_are_rejected(tasks, message):
+    with pytest.raises(ValueError, match=message):
+        GraphRun(tasks)
+
+
+def test_stage_memo_hits_only_on_identical_inputs():
+    memo = StageMemo()
+    assert memo.lookup("extract", {"text": "a"}) == (False, None)
+    memo.set("extract", {"text": "a"}, {"name": "x"})
+    assert memo.lookup("extract", {"text": "a"}) == (True, {"name": "x"})
+    assert memo.lookup("extract", {"text": "b"}) == (False, None)
+    memo.set("extract", {"text": "b"}, {"name": "y"})  # one entry per stage
+    assert memo.lookup("extract", {"text": "a"}) == (False, None)
+    assert (memo.hits, memo.misses) == (1, 3)
+
+
+def test_memoized_tasks_skip_unchanged_stages_but_not_failures():
+    memo = StageMemo()
+    calls = []
+
+    def extract():
+        calls.append("extract")
+        return "facts"
+
+    def letter(facts):
+        calls.append("letter")
+        raise RuntimeError("quota")
+
+    tasks = {"extract": (extract, []), "letter": (letter, ["extract"])}
+    inputs = {"extract": {"doc": 1}, "letter": {"doc": 1, "tone": "firm"}}
+    GraphRun(memoize_tasks(tasks, memo, inputs)).wait()
+    GraphRun(memoize_tasks(tasks, memo, inputs)).wait()
+    assert calls == ["extract", "letter", "letter"]  # the failed letter was not memoized
+
+    memo.invalidate("extract")
+    GraphRun(memoize_tasks(tasks, memo, inputs)).wait()
+    assert calls.count("extract") == 2
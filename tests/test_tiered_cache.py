@@ -0,0 +1,74 @@
+import pickle
+import sqlite3
+import time
+
+from llm_cache import CachedResponse
+from tiered_cache import TieredCache
+
+
+def _cache(tmp_path, **kwargs):
+    return TieredCache(str(tmp_path / "cache.sqlite"), namespace="test", **kwargs)
+
+
+def test_values_survive_a_restart_as_json(tmp_path):
+    _cache(tmp_path).set("k", {"text": "hello", "tokens": [1, 2]})
+    reopened = _cache(tmp_path)
+    assert reopened.get("k") == {"text": "hello", "tokens": [1, 2]}
+    assert reopened.stats()["disk_hits"] == 1
+    blob = sqlite3.connect(tmp_path / "cache.sqlite").execute("SELECT value FROM entries").fetchone()[0]
+    assert blob == b'{"text":"hello","tokens":[1,2]}'
+
+
+def test_encode_and_decode_round_trip_objects(tmp_path):
+    options = dict(encode=lambda r: {"text": r.text, "usage": r.usage},
+                   decode=lambda d: CachedResponse(d["text"], d["usage"]))
+    _cache(tmp_path, **options).set("k", CachedResponse("letter", {"prompt_tokens": 3}))
+    cached = _cache(tmp_path, **options).get("k")
+    assert (cached.text, cached.usage) == ("letter", {"prompt_tokens": 3})
+
+
+def test_pickled_rows_are_dropped_without_being_loaded(tmp_path):
+    cache = _cache(tmp_path)
+    blob = pickle.dumps({"legacy": True})
+    cache._db.execute("INSERT INTO entries VALUES ('test', 'old', ?, ?, ?, ?)",
+                      (blob, len(blob), time.time(), time.time()))
+    assert cache.get("old", "miss") == "miss"
+    assert cache._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0] == 0
+
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = _cache(tmp_path, ttl=0.01)
+    cache.set("k", "v")
+    time.sleep(0.02)
+    assert cache.get("k") is None
+    assert _cache(tmp_path, ttl=0.01).get("k") is None
+
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = TieredCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_disk_tier_is_trimmed_least_recently_used_first(tmp_path):
+    cache = _cache(tmp_path, max_entries=1, max_disk_bytes=25)
+    cache.set("a", "x" * 8)
+    cache.set("b", "y" * 8)
+    cache.get("a")  # from disk: "a" is now the most recently used
+    cache.set("c", "z" * 8)  # three 10-byte rows: one must go
+    reopened = _cache(tmp_path)
+    assert (reopened.get("a"), reopened.get("b"), reopened.get("c")) == ("x" * 8, None, "z" * 8)
+
+
+def test_namespaces_are_separate(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    TieredCache(path, namespace="one").set("k", 1)
+    other = TieredCache(path, namespace="other")
+    assert other.get("k") is None
+    other.set("k", 2)
+    other.clear()
+    assert TieredCache(path, namespace="one").get("k") == 1
@@ -0,0 +1,82 @@
+import hashlib
+import io
+import os
+
+import pytest
+
+from upload_limits import MB, MemoryBudget, SpooledUpload, UploadRejected, content_digest
+
+
+def test_budget_enforces_session_and_global_caps():
+    budget = MemoryBudget(session_bytes=10, global_bytes=15)
+    with budget.reserve(8, session="a"):
+        with pytest.raises(UploadRejected, match="other documents"):
+            with budget.reserve(3, session="a"):
+                pass
+        with pytest.raises(UploadRejected, match="server is busy"):
+            with budget.reserve(8, session="b"):
+                pass
+        with budget.reserve(7, session="b"):
+            assert budget.stats()["used_bytes"] == 15
+    stats = budget.stats()
+    assert (stats["used_bytes"], stats["sessions"], stats["peak_bytes"]) == (0, 0, 15)
+    assert (stats["reservations"], stats["rejected"]) == (2, 2)
+
+
+def test_budget_refuses_a_single_request_over_the_session_cap():
+    budget = MemoryBudget(session_bytes=10 * MB, global_bytes=100 * MB)
+    with pytest.raises(UploadRejected, match="allowed per session"):
+        with budget.reserve(11 * MB):
+            pass
+
+
+def test_budget_is_released_when_the_block_raises():
+    budget = MemoryBudget(session_bytes=10, global_bytes=10)
+    with pytest.raises(RuntimeError):
+        with budget.reserve(10, session="a"):
+            raise RuntimeError
+    assert budget.stats()["used_bytes"] == 0
+    with budget.reserve(10, session="a"):
+        pass
+
+
+def test_content_digest_matches_sha256_and_rewinds():
+    data = os.urandom(3 * MB + 17)
+    stream = io.BytesIO(data)
+    stream.seek(5)
+    assert content_digest(stream) == hashlib.sha256(data[5:]).hexdigest()
+    assert stream.tell() == 5
+    assert content_digest(data) == hashlib.sha256(data).hexdigest()
+
+
+def test_content_digest_rejects_oversized_input():
+    with pytest.raises(UploadRejected):
+        content_digest(io.BytesIO(b"x" * 11), max_bytes=10)
+
+
+def test_small_upload_stays_in_memory():
+    data = b"small upload"
+    with SpooledUpload(io.BytesIO(data), spool_bytes=1 * MB) as upload:
+        assert upload.path is None
+        assert upload.source() == data
+        assert upload.memory_bytes == len(data)
+        assert upload.digest == hashlib.sha256(data).hexdigest()
+
+
+def test_large_upload_is_spooled_and_cleaned_up():
+    data = os.urandom(2 * MB + 3)
+    with SpooledUpload(io.BytesIO(data), spool_bytes=MB) as upload:
+        path = upload.path
+        assert path is not None and os.path.exists(path)
+        assert upload.memory_bytes == 0
+        assert upload.open().read() == data
+        assert b"".join(upload.chunks()) == data
+        assert upload.digest == hashlib.sha256(data).hexdigest()
+    assert not os.path.exists(path)
+
+
+def test_oversized_upload_is_refused_without_leaving_a_spool_file(tmp_path, monkeypatch):
+    monkeypatch.setattr("upload_limits.SPOOL_DIR", str(tmp_path))
+    with pytest.raises(UploadRejected, match="upload limit"):
+        SpooledUpload(io.BytesIO(b"x" * (3 * MB)), max_bytes=2 * MB, spool_bytes=MB)
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,175 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+# ------------------ TWO-TIER CACHE -------------------
+class TieredCache:
+    """
+    Key/value cache with an in-process LRU tier in front of a SQLite tier on disk.
+
+    Entries expire after ttl seconds (None disables expiry). The memory tier keeps at
+    most max_entries values; the disk tier is trimmed, least recently used first,
+    whenever the namespace grows past max_disk_bytes (tracked as a running total, so a
+    write does not scan the table). Pass path=None for a memory-only cache.
+    The disk tier stores JSON, never pickle, so a shared cache file cannot run code when
+    read: values must be JSON-serializable, or turned into something that is by encode
+    (and back by decode). An entry that does not decode is dropped as a miss.
+    Safe to share between Streamlit sessions and worker threads.
+    """
+
+    def __init__(self, path=None, namespace="default", max_entries=512,
+                 max_disk_bytes=256 * 1024 * 1024, ttl=None, encode=None, decode=None):
+        self.namespace = namespace
+        self._encode = encode or (lambda value: value)
+        self._decode = decode or (lambda data: data)
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl = ttl
+        self._memory = OrderedDict()  # key -> (created, value)
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        self._db = None
+        self._disk_bytes = 0  # running SUM(size) of this namespace, resynced when trimming
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " namespace TEXT, key TEXT, value BLOB, size INTEGER, created REAL, accessed REAL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+            self._disk_bytes = self._disk_size()
+
+    def _expired(self, created, now):
+        return self.ttl is not None and now - created > self.ttl
+
+    def get(self, key, default=None):
+        """
+        Return the cached value for key, or default on a miss or expired entry.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if not self._expired(entry[0], now):
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return entry[1]
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, created, size FROM entries WHERE namespace = ? AND key = ?",
+                    (self.namespace, key)
+                ).fetchone()
+                if row is not None:
+                    value = self._load(row[0]) if not self._expired(row[1], now) else None
+                    if value is not None:
+                        self._db.execute(
+                            "UPDATE entries SET accessed = ? WHERE namespace = ? AND key = ?",
+                            (now, self.namespace, key)
+                        )
+                        self._remember(key, row[1], value)
+                        self._stats["disk_hits"] += 1
+                        return value
+                    self._db.execute("DELETE FROM entries WHERE namespace = ? AND key = ?",
+                                     (self.namespace, key))
+                    self._disk_bytes -= row[2]
+
+            self._stats["misses"] += 1
+            return default
+
+    def set(self, key, value):
+        """
+        Store value under key in both tiers.
+        """
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, value)
+            if self._db is not None:
+                blob = json.dumps(self._encode(value), separators=(",", ":")).encode("utf-8")
+                self._disk_bytes += len(blob) - self._entry_size(key)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                    (self.namespace, key, blob, len(blob), now, now)
+                )
+                self._trim_disk()
+
+    def _load(self, blob):
+        # None for an entry written in another format (e.g. by an older version)
+        try:
+            return self._decode(json.loads(blob))
+        except (ValueError, TypeError, KeyError):
+            return None
+
+    def _remember(self, key, created, value):
+        self._memory[key] = (created, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def _disk_size(self):
+        return self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries WHERE namespace = ?",
+                                (self.namespace,)).fetchone()[0]
+
+    def _entry_size(self, key):
+        row = self._db.execute("SELECT size FROM entries WHERE namespace = ? AND key = ?",
+                               (self.namespace, key)).fetchone()
+        return row[0] if row else 0
+
+    def _trim_disk(self):
+        if self._disk_bytes <= self.max_disk_bytes:
+            return
+        # Other processes may share the file, so count again before deleting anything
+        total = self._disk_size()
+        if total > self.max_disk_bytes and self.ttl is not None:
+            self._db.execute("DELETE FROM entries WHERE namespace = ? AND created < ?",
+                             (self.namespace, time.time() - self.ttl))
+            total = self._disk_size()
+        for key, size in self._db.execute(
+                "SELECT key, size FROM entries WHERE namespace = ? ORDER BY accessed",
+                (self.namespace,)).fetchall():
+            if total <= self.max_disk_bytes:
+                break
+            self._db.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (self.namespace, key))
+            total -= size
+            self._stats["evictions"] += 1
+        self._disk_bytes = total
+
+    def delete(self, key):
+        """
+        Drop key from both tiers, if present.
+        """
+        with self._lock:
+            self._memory.pop(key, None)
+            if self._db is not None:
+                self._disk_bytes -= self._entry_size(key)
+                self._db.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (self.namespace, key))
+
+    def clear(self):
+        """
+        Drop every entry in this cache's namespace from both tiers.
+        """
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM entries WHERE namespace = ?", (self.namespace,))
+                self._disk_bytes = 0
+
+    def stats(self):
+        """
+        Return hit/miss/eviction counters plus the current memory tier size.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,240 @@
+import hashlib
+import io
+import mmap
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+# ------------------ SETTINGS -------------------------
+MB = 1024 * 1024
+# Largest upload accepted, per file (keep .streamlit/config.toml maxUploadSize in step)
+UPLOAD_MAX_MB = float(os.environ.get("APPEAL_UPLOAD_MAX_MB", "50"))
+# Uploads larger than this are spooled to a temporary file instead of held in memory
+SPOOL_MEMORY_MB = float(os.environ.get("APPEAL_SPOOL_MEMORY_MB", "2"))
+# Where spooled uploads go (default: the system temporary directory)
+SPOOL_DIR = os.environ.get("APPEAL_SPOOL_DIR") or None
+# Extraction working memory allowed per session and for the whole process
+SESSION_MEMORY_MB = float(os.environ.get("APPEAL_SESSION_MEMORY_MB", "256"))
+GLOBAL_MEMORY_MB = float(os.environ.get("APPEAL_GLOBAL_MEMORY_MB", "1024"))
+# Uploads are copied and hashed in chunks of this size
+CHUNK_BYTES = 1 * MB
+
+
+class UploadRejected(ValueError):
+    """An upload refused for its size, or because the memory budget is used up."""
+
+
+# ------------------ MEMORY BUDGET --------------------
+class MemoryBudget:
+    """
+    Byte counts reserved for extraction work, per session and in total. A reservation
+    that would go past either cap is refused at once with UploadRejected (with a
+    message fit to show the user) rather than queued, so an overloaded server says
+    so instead of running out of memory. Safe to share between threads.
+    """
+
+    def __init__(self, session_bytes=SESSION_MEMORY_MB * MB, global_bytes=GLOBAL_MEMORY_MB * MB):
+        self.session_bytes = int(session_bytes)
+        self.global_bytes = int(global_bytes)
+        self._used = 0
+        self._sessions = {}  # session -> bytes reserved
+        self._lock = threading.Lock()
+        self._stats = {"reservations": 0, "rejected": 0, "peak_bytes": 0}
+
+    @contextmanager
+    def reserve(self, nbytes, session=None):
+        """Hold nbytes of the budget (charged to session, if given) for the enclosed block."""
+        nbytes = int(nbytes)
+        with self._lock:
+            session_used = self._sessions.get(session, 0) if session is not None else 0
+            if nbytes > self.session_bytes:
+                self._stats["rejected"] += 1
+                raise UploadRejected(
+                    f"This document needs about {nbytes / MB:.0f} MB to process, over the "
+                    f"{self.session_bytes / MB:.0f} MB allowed per session. Try a smaller file or fewer pages."
+                )
+            if session_used + nbytes > self.session_bytes:
+                self._stats["rejected"] += 1
+                raise UploadRejected("Your other documents are still being processed. Please wait for them to finish.")
+            if self._used + nbytes > self.global_bytes:
+                self._stats["rejected"] += 1
+                raise UploadRejected("The server is busy processing other documents. Please try again shortly.")
+            self._used += nbytes
+            if session is not None:
+                self._sessions[session] = session_used + nbytes
+            self._stats["reservations"] += 1
+            self._stats["peak_bytes"] = max(self._stats["peak_bytes"], self._used)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._used -= nbytes
+                if session is not None:
+                    remaining = self._sessions.get(session, 0) - nbytes
+                    if remaining > 0:
+                        self._sessions[session] = remaining
+                    else:
+                        self._sessions.pop(session, None)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["used_bytes"] = self._used
+            stats["sessions"] = len(self._sessions)
+        return stats
+
+
+memory_budget = MemoryBudget()
+
+
+# ------------------ SPOOLED UPLOADS ------------------
+def _too_large(max_bytes):
+    return UploadRejected(f"The file is larger than the {max_bytes / MB:.0f} MB upload limit.")
+
+
+def content_digest(source, max_bytes=UPLOAD_MAX_MB * MB):
+    """
+    SHA-256 hex digest of bytes or a seekable binary file object, read in chunks
+    and rewound afterwards, so a cache can be checked before anything is copied.
+    Returns None for a stream that cannot be rewound (hash it while spooling
+    instead). Raises UploadRejected past max_bytes.
+    """
+    digest = hashlib.sha256()
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        if len(source) > max_bytes:
+            raise _too_large(max_bytes)
+        digest.update(source)
+        return digest.hexdigest()
+    try:
+        start = source.tell()
+    except (AttributeError, OSError):
+        return None
+    size = 0
+    try:
+        while True:
+            chunk = source.read(CHUNK_BYTES)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise _too_large(max_bytes)
+            digest.update(chunk)
+    finally:
+        source.seek(start)
+    return digest.hexdigest()
+
+
+class SpooledUpload:
+    """
+    An upload copied in CHUNK_BYTES pieces, hashed on the way, and kept in memory
+    only while small: past spool_bytes it moves to a temporary file, which is
+    memory-mapped for reading. Uploads over max_bytes are refused as soon as the
+    limit is reached, without reading the rest.
+
+    source is bytes (used in place, not copied) or a binary file object. Pass
+    digest when it is already known (see content_digest) to skip hashing.
+    Use as a context manager; the temporary file is deleted on exit.
+    """
+
+    def __init__(self, source, max_bytes=UPLOAD_MAX_MB * MB, spool_bytes=SPOOL_MEMORY_MB * MB, digest=None):
+        self.path = None
+        self._data = None
+        self._file = None
+        self._map = None
+        known_digest = digest
+        digest = hashlib.sha256()
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            self.size = len(source)
+            self._check_size(max_bytes)
+            if known_digest is None:
+                digest.update(source)
+            self._data = bytes(source)
+        else:
+            self.size = 0
+            buffer = io.BytesIO()
+            try:
+                while True:
+                    chunk = source.read(CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    self.size += len(chunk)
+                    self._check_size(max_bytes)
+                    if known_digest is None:
+                        digest.update(chunk)
+                    if self._file is None and self.size > spool_bytes:
+                        self._file = tempfile.NamedTemporaryFile(prefix="appeal-upload-", dir=SPOOL_DIR, delete=False)
+                        self.path = self._file.name
+                        self._file.write(buffer.getbuffer())
+                        buffer = None
+                    if self._file is not None:
+                        self._file.write(chunk)
+                    else:
+                        buffer.write(chunk)
+            except BaseException:
+                self.close()
+                raise
+            if self._file is not None:
+                self._file.flush()
+            else:
+                self._data = buffer.getvalue()
+        self.digest = known_digest or digest.hexdigest()
+
+    def _check_size(self, max_bytes):
+        if self.size > max_bytes:
+            self.close()
+            raise _too_large(max_bytes)
+
+    @property
+    def memory_bytes(self):
+        """Bytes of the upload held in process memory (0 once spooled to disk)."""
+        return len(self._data) if self._data is not None else 0
+
+    def source(self):
+        """A path when spooled to disk, else the bytes: the forms PyPDF2 and pypdfium2 accept."""
+        return self.path if self.path is not None else self._data
+
+    def view(self):
+        """The contents as a read-only buffer: the bytes, or a memory map of the spooled file."""
+        if self._data is not None:
+            return self._data
+        if self._map is None:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+        return self._map
+
+    def open(self):
+        """
+        A seekable binary file object over the contents, rewound to the start and
+        without copying them. Read from one at a time: a spooled upload's memory map
+        is shared.
+        """
+        view = self.view()
+        if isinstance(view, bytes):
+            return io.BytesIO(view)
+        view.seek(0)
+        return view
+
+    def chunks(self):
+        """The contents in CHUNK_BYTES pieces."""
+        view = self.view()
+        for start in range(0, self.size, CHUNK_BYTES):
+            yield view[start:start + CHUNK_BYTES]
+
+    def close(self):
+        if self._map is not None and not isinstance(self._map, bytes):
+            self._map.close()
+        self._map = None
+        if self._file is not None:
+            self._file.close()
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+            self._file = None
+        self._data = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()